@@ -160,6 +160,10 @@ class Literal(Node):
         super().__init__(lineno)
         self.value = value
 
+    def __deepcopy__(self, memo):
+        # Values are immutable (folded arrays are read-only), so copies share them
+        return Literal(self.value, lineno=self.lineno)
+
 class Identifier(Node):
     def __init__(self, name, lineno=0):
         super().__init__(lineno)
@@ -187,4 +191,57 @@ class RecordAccess(Node):
 class ArrayLiteral(Node):
     def __init__(self, elements, lineno=0):
         super().__init__(lineno)
-        self.elements = elements
\ No newline at end of file
+        self.elements = elements
+
+# --- Static Types ---
+class StaticType:
+    """Type and shape SemanticAnalyzer inferred for an expression, cached on the node as 'node.static'."""
+    __slots__ = ('dtype', 'shape')  # No __dict__, so tree walkers never descend into it
+
+    def __init__(self, dtype, shape):
+        self.dtype = dtype  # 'int32', 'float32', 'bool', 'string', ... or 'unknown'
+        self.shape = shape  # None=unknown, []=scalar, [n]=vector, [n,m]=matrix
+
+    def __repr__(self):
+        return f"{self.dtype}{self.shape}"
+
+# --- Structural Equality ---
+def structural_key(node, memo=None):
+    """
+    Hashable key shared by structurally identical expressions (same operators,
+    names, fields and literal values). Returns None for anything that is not a
+    plain expression, e.g. calls and array literals. 'memo' caches keys by id.
+    """
+    if memo is not None and id(node) in memo:
+        return memo[id(node)]
+
+    cls = node.__class__.__name__
+    if node is None or isinstance(node, (int, float, str, bool)):
+        key = ('raw', type(node).__name__, node)
+    elif isinstance(node, list):
+        parts = tuple(structural_key(item, memo) for item in node)
+        key = None if None in parts else ('list',) + parts
+    elif cls == 'Literal':
+        value = node.value
+        key = ('Literal', type(value).__name__, value) if isinstance(value, (int, float, str, bool)) else None
+    elif cls == 'Identifier':
+        key = ('Identifier', node.name)
+    elif cls in ('BinOp', 'CompareOp'):
+        left, right = structural_key(node.left, memo), structural_key(node.right, memo)
+        key = None if left is None or right is None else (cls, node.op, left, right)
+    elif cls == 'UnaryOp':
+        operand = structural_key(node.operand, memo)
+        key = None if operand is None else (cls, node.op, operand)
+    elif cls == 'RecordAccess':
+        record = structural_key(node.record, memo)
+        key = None if record is None else (cls, record, node.field)
+    elif cls in ('ArrayAccess', 'Slice'):
+        first, second = (node.name, node.index) if cls == 'ArrayAccess' else (node.start, node.end)
+        first, second = structural_key(first, memo), structural_key(second, memo)
+        key = None if first is None or second is None else (cls, first, second)
+    else:
+        key = None
+
+    if memo is not None and isinstance(node, Node):
+        memo[id(node)] = key
+    return key
@@ -0,0 +1,198 @@
+import contextlib
+import io
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine.interpreter import QuantelInterpreter
+from engine.probe import ProbeStream, SUMMARY_THRESHOLD
+
+
+def read_inputs(path):
+    """Reads one JSON object of global bindings per line; blank lines are skipped."""
+    inputs = []
+    with open(path, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                binding = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON ({e})")
+            if not isinstance(binding, dict):
+                raise ValueError(f"{path}:{lineno}: expected an object of global bindings")
+            inputs.append(binding)
+    return inputs
+
+
+class BindingError(ValueError):
+    """A batch binding does not match any global declaration."""
+
+
+# Declared dtypes a binding can be converted to
+BINDABLE_DTYPES = ('float16', 'float32', 'float64', 'int32', 'int64', 'bool')
+
+
+def bound_names(inputs):
+    names = set()
+    for binding in inputs:
+        names.update(binding)
+    return names
+
+
+def to_jsonable(val):
+    if isinstance(val, np.ndarray):
+        if val.size > SUMMARY_THRESHOLD:
+            return {"shape": list(val.shape), "dtype": str(val.dtype)}
+        return val.tolist()
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (bool, int, float, str)) or val is None:
+        return val
+    return str(val)
+
+
+def global_declarations(tree):
+    """Top-level variable declarations: name -> (dtype, dims), dims None when not declared."""
+    declarations = {}
+    for stmt in tree.statements:
+        if stmt.__class__.__name__ == 'VarDecl':
+            declarations[stmt.name] = (stmt.dtype, getattr(stmt.shape, 'dims', None))
+    return declarations
+
+
+def bind_globals(binding, declarations):
+    """Converts one line of JSON bindings to the values their declarations describe."""
+    bindings = {}
+    for name, value in binding.items():
+        if name not in declarations:
+            raise BindingError(f"'{name}' is not a declared global.")
+        bindings[name] = _to_runtime(name, value, *declarations[name])
+    return bindings
+
+
+def _to_runtime(name, value, dtype, dims):
+    if dtype == 'auto' or dims is None:
+        return np.array(value) if isinstance(value, list) else value  # Nothing declared to check against
+    if dtype not in BINDABLE_DTYPES:
+        raise BindingError(f"'{name}' is a {dtype} and cannot be bound.")
+    if isinstance(value, list):
+        try:
+            value = np.array(value, dtype=dtype)
+        except (TypeError, ValueError) as e:
+            raise BindingError(f"'{name}' is declared {dtype}: {e}")
+        if list(value.shape) != list(dims):
+            declared = list(dims) if dims else "scalar"
+            raise BindingError(f"'{name}' is declared {dtype} {declared}, but the value has shape "
+                               f"{list(value.shape)}.")
+        return value
+    if dims:
+        raise BindingError(f"'{name}' is declared {dtype} {list(dims)}, but the value is a scalar.")
+    if not isinstance(value, (bool, int, float)):
+        raise BindingError(f"'{name}' is declared {dtype}, but the value is {type(value).__name__}.")
+    return value
+
+
+# ==========================================
+#             WORKER SIDE
+# ==========================================
+
+_worker_tree = None
+_worker_globals = None
+
+
+def _init_worker(tree_bytes):
+    # Each worker unpickles the optimized AST exactly once
+    global _worker_tree, _worker_globals
+    _worker_tree = pickle.loads(tree_bytes)
+    _worker_globals = global_declarations(_worker_tree)
+
+
+def _run_one(job):
+    index, binding = job
+    probes = ProbeStream()
+    interpreter = None
+    out = io.StringIO()
+
+    start = time.perf_counter()
+    error = None
+    try:
+        # A binding that does not fit its declaration fails the run instead of being ignored or kept as is
+        interpreter = QuantelInterpreter(probes=probes, bindings=bind_globals(binding, _worker_globals))
+        with contextlib.redirect_stdout(out):
+            interpreter.visit(_worker_tree)
+    except Exception as e:
+        error = str(e)
+    latency = time.perf_counter() - start
+
+    env = interpreter.global_env if interpreter is not None else {}
+    result = {
+        "index": index,
+        "ok": error is None,
+        "latency_ms": round(latency * 1000.0, 3),
+        "probes": [event.to_dict() for event in probes.drain()],
+        "globals": {name: to_jsonable(val) for name, val in env.items()
+                    if not hasattr(val, '__dict__') and not str(name).startswith('$')
+                    and not (isinstance(val, dict) and val.get('type') == 'RECORD_DEF')},
+    }
+    if out.getvalue():
+        result["stdout"] = out.getvalue()
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+# ==========================================
+#             DRIVER SIDE
+# ==========================================
+
+def run_batch(tree, inputs, out, workers=None):
+    """
+    Runs an already-compiled program once per input binding on a process pool,
+    writing one JSON result per line to 'out' in input order. Returns the
+    throughput/latency statistics.
+    """
+    workers = workers or os.cpu_count() or 1
+    tree_bytes = pickle.dumps(tree)
+    latencies = []
+    failures = 0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tree_bytes,)) as pool:
+        chunksize = max(1, len(inputs) // (workers * 4))
+        for result in pool.map(_run_one, enumerate(inputs), chunksize=chunksize):
+            latencies.append(result["latency_ms"])
+            if not result["ok"]:
+                failures += 1
+            out.write(json.dumps(result) + "\n")
+    elapsed = time.perf_counter() - start
+
+    return batch_stats(latencies, failures, elapsed, workers)
+
+
+def batch_stats(latencies, failures, elapsed, workers):
+    runs = len(latencies)
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered: return 0.0
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    return {
+        "runs": runs,
+        "failures": failures,
+        "workers": workers,
+        "wall_s": round(elapsed, 3),
+        "throughput_per_s": round(runs / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ordered) / runs, 3) if runs else 0.0,
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "max": ordered[-1] if ordered else 0.0,
+        },
+    }
@@ -0,0 +1,56 @@
+from engine import tensor_io
+
+
+class Builtin:
+    def __init__(self, name, fn, min_args, max_args, ret_type):
+        self.name = name
+        self.fn = fn
+        self.min_args = min_args
+        self.max_args = max_args  # None = variadic
+        self.ret_type = ret_type
+
+    def accepts(self, count):
+        return count >= self.min_args and (self.max_args is None or count <= self.max_args)
+
+    def arity_hint(self):
+        if self.max_args is None: return f"at least {self.min_args}"
+        if self.min_args == self.max_args: return str(self.min_args)
+        return f"{self.min_args} to {self.max_args}"
+
+
+BUILTINS = {}
+
+
+def builtin(name, min_args, max_args=None, ret_type="unknown"):
+    def register(fn):
+        BUILTINS[name] = Builtin(name, fn, min_args, max_args, ret_type)
+        return fn
+    return register
+
+
+# ==========================================
+#             BUILTIN FUNCTIONS
+# ==========================================
+
+@builtin('print', 0, None, ret_type="void")
+def _print(*args):
+    print(" ".join(str(a) for a in args))
+
+
+@builtin('load', 1, 2)
+def _load(path, key=None, dtype=None, shape=None):
+    return tensor_io.load(path, key, dtype=dtype, shape=shape)
+
+
+@builtin('save', 2, 3, ret_type="void")
+def _save(path, value, key=None):
+    return tensor_io.save(path, value, key)
+
+
+@builtin('batches', 2, 2)
+def _batches(data, size):
+    """Lazily yields consecutive slices along the first axis; views, so memory maps stay zero-copy."""
+    size = int(size)
+    if size <= 0:
+        raise ValueError(f"batch size must be positive, got {size}")
+    return (data[i:i + size] for i in range(0, len(data), size))
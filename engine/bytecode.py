@@ -0,0 +1,349 @@
+import mmap
+import struct
+
+import numpy as np
+
+from engine import ast
+from engine.ast import FuncDecl, Node, StaticType
+
+BYTECODE_MAGIC = b"QTLB"
+BYTECODE_VERSION = 1
+# magic, version, then (offset, count) of the string, constant and function tables, then the main section
+HEADER = struct.Struct("<4sH2xQIQIQIQQ")
+HEADER_SIZE = 64
+ARRAY_ALIGN = 64  # Array data starts on this boundary so np.frombuffer can map it in place
+
+STRING_ENTRY = struct.Struct("<Q")        # offset of (u32 length, utf-8 bytes)
+CONST_ENTRY = struct.Struct("<BxxxIQQ")   # tag, dtype string id, payload offset, payload size
+FUNC_ENTRY = struct.Struct("<IQQ")        # name string id, code offset, code size
+NODE = struct.Struct("<IiB")              # class name string id, lineno, field count
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+
+# Value tags in code sections
+T_NODE, T_LIST, T_TUPLE, T_STR, T_INT, T_FLOAT, T_TRUE, T_FALSE, T_NONE, T_CONST, T_STATIC, T_FUNC = b"NLUSif10_CKD"
+# Constant pool tags
+C_ARRAY, C_SCALAR, C_BIGINT = b"agI"
+
+
+class BytecodeError(Exception):
+    """The file is not a compiled Quantel program this version can load."""
+
+
+# ==========================================
+#             WRITING
+# ==========================================
+
+class BytecodeWriter:
+    """
+    Serializes an optimized Program. Top-level functions get code sections of
+    their own, listed in the function table, so a loader can decode each one
+    when it is first called; the main section refers to them by index. Arrays
+    go to the constant pool with their data aligned for zero-copy mapping.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.consts = []     # (tag, dtype string id, payload bytes, aligned)
+        self.functions = []  # (name string id, code bytes)
+
+    def dump(self, program):
+        for stmt in program.statements:
+            if stmt.__class__.__name__ == 'FuncDecl':
+                self.functions.append((self._string(stmt.name), self._encode(stmt)))
+        main = self._encode(program, top_level=True)
+        return self._layout(main)
+
+    def _string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        return index
+
+    def _encode(self, root, top_level=False):
+        out = bytearray()
+        functions = iter(range(len(self.functions)))
+        self._value(out, root, functions if top_level else None)
+        return bytes(out)
+
+    def _value(self, out, value, functions):
+        if isinstance(value, Node):
+            if functions is not None and value.__class__.__name__ == 'FuncDecl':
+                # The statement loop reads 'release' after every statement; keep it out of the lazy part
+                out += bytes((T_FUNC,)) + U32.pack(next(functions))
+                self._value(out, getattr(value, 'release', None), None)
+                return
+            # An integer line goes in the node header; anything else ('??', None) is kept as a field
+            lineno = value.lineno if type(value.lineno) is int else 0
+            fields = [(k, v) for k, v in vars(value).items() if k != 'lineno' or v is not lineno]
+            out.append(T_NODE)
+            out += NODE.pack(self._string(value.__class__.__name__), lineno, len(fields))
+            # Functions only get sections of their own at the top level
+            inner = functions if value.__class__.__name__ == 'Program' else None
+            for key, item in fields:
+                out += U32.pack(self._string(key))
+                self._value(out, item, inner if key == 'statements' else None)
+        elif isinstance(value, (list, tuple)):
+            out.append(T_LIST if isinstance(value, list) else T_TUPLE)
+            out += U32.pack(len(value))
+            for item in value:
+                self._value(out, item, functions)
+        elif isinstance(value, StaticType):
+            out.append(T_STATIC)
+            self._value(out, value.dtype, None)
+            self._value(out, value.shape, None)
+        elif value is None:
+            out.append(T_NONE)
+        elif value is True or value is False:
+            out.append(T_TRUE if value else T_FALSE)
+        elif type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            out.append(T_INT)
+            out += I64.pack(value)
+        elif type(value) is float:
+            out.append(T_FLOAT)
+            out += F64.pack(value)
+        elif type(value) is str:
+            out.append(T_STR)
+            out += U32.pack(self._string(value))
+        else:
+            out.append(T_CONST)
+            out += U32.pack(self._const(value))
+
+    def _const(self, value):
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            if value.dtype.hasobject:
+                raise BytecodeError("Object arrays cannot be compiled.")
+            shape = struct.pack(f"<B{value.ndim}Q", value.ndim, *value.shape)
+            entry = (C_ARRAY, self._string(value.dtype.str), shape, value.tobytes())
+        elif isinstance(value, np.generic):
+            entry = (C_SCALAR, self._string(value.dtype.str), b"", value.tobytes())
+        elif isinstance(value, int):
+            entry = (C_BIGINT, 0, b"", str(value).encode())  # Folded integers may exceed 64 bits
+        else:
+            raise BytecodeError(f"Constants of type {type(value).__name__} cannot be compiled.")
+        self.consts.append(entry)
+        return len(self.consts) - 1
+
+    def _layout(self, main):
+        body = bytearray(HEADER_SIZE)
+
+        def align(boundary):
+            body.extend(bytes(-len(body) % boundary))
+
+        strings = []
+        for text in self.strings:
+            strings.append(len(body))
+            data = text.encode()
+            body += U32.pack(len(data)) + data
+        align(8)
+        strings_off = len(body)
+        for offset in strings:
+            body += STRING_ENTRY.pack(offset)
+
+        # Array data first, each block aligned; the descriptor table follows
+        entries = []
+        for tag, dtype, shape, data in self.consts:
+            if tag == C_ARRAY:
+                align(ARRAY_ALIGN)
+            start = len(body)
+            body += data
+            meta = len(body)
+            body += shape
+            entries.append(CONST_ENTRY.pack(tag, dtype, start, len(data)) + U32.pack(meta))
+        align(8)
+        consts_off = len(body)
+        for entry in entries:
+            body += entry
+
+        sections = []
+        for name, code in self.functions:
+            sections.append((name, len(body), len(code)))
+            body += code
+        align(8)
+        funcs_off = len(body)
+        for name, offset, size in sections:
+            body += FUNC_ENTRY.pack(name, offset, size)
+
+        main_off = len(body)
+        body += main
+        body[:HEADER.size] = HEADER.pack(BYTECODE_MAGIC, BYTECODE_VERSION, strings_off, len(self.strings),
+                                         consts_off, len(entries), funcs_off, len(sections), main_off, len(main))
+        return bytes(body)
+
+
+def dump(program):
+    return BytecodeWriter().dump(program)
+
+
+def save(program, path):
+    with open(path, "wb") as f:
+        f.write(dump(program))
+
+
+# ==========================================
+#             LOADING
+# ==========================================
+
+class LazyFuncDecl(FuncDecl):
+    """
+    A top-level function whose parameters and body stay in the file until
+    something first reads them (normally its first call).
+    """
+
+    def __init__(self, loader, index, name, lineno, release):
+        Node.__init__(self, lineno)
+        self.name = name
+        self.release = release
+        self._loader = loader
+        self._index = index
+
+    def __getattr__(self, attr):
+        # Only reached while the declaration is still undecoded
+        if attr.startswith('_') or '_loader' not in self.__dict__:
+            raise AttributeError(attr)
+        decl = self._loader.function(self._index)
+        del self._loader, self._index
+        for key, value in vars(decl).items():
+            self.__dict__.setdefault(key, value)
+        return getattr(self, attr)
+
+
+class BytecodeLoader:
+    """
+    Maps a compiled program and decodes only what is asked for: the main
+    section at load, each function on first use, each string and constant
+    the first time a decoded node refers to it. Arrays are read-only views
+    of the mapped file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size or self.data[:4] != BYTECODE_MAGIC:
+            raise BytecodeError(f"'{path}' is not a compiled Quantel program.")
+        (_, version, self.strings_off, self.string_count, self.consts_off, self.const_count,
+         self.funcs_off, self.func_count, self.main_off, self.main_size) = HEADER.unpack_from(self.data, 0)
+        if version != BYTECODE_VERSION:
+            raise BytecodeError(f"Bytecode version {version} is not supported (expected {BYTECODE_VERSION}).")
+        ends = (self.strings_off + self.string_count * STRING_ENTRY.size,
+                self.consts_off + self.const_count * (CONST_ENTRY.size + U32.size),
+                self.funcs_off + self.func_count * FUNC_ENTRY.size, self.main_off + self.main_size)
+        if max(ends) > len(self.data):
+            raise BytecodeError(f"'{path}' is truncated.")
+        self.strings = {}
+        self.consts = {}
+        self.decoded = set()  # Indices of the functions decoded so far
+        self.classes = {}
+
+    def program(self):
+        value, _ = self._value(self.main_off)
+        return value
+
+    def function(self, index):
+        _, offset, _ = FUNC_ENTRY.unpack_from(self.data, self.funcs_off + index * FUNC_ENTRY.size)
+        self.decoded.add(index)
+        value, _ = self._value(offset)
+        return value
+
+    def string(self, index):
+        text = self.strings.get(index)
+        if text is None:
+            offset, = STRING_ENTRY.unpack_from(self.data, self.strings_off + index * STRING_ENTRY.size)
+            size, = U32.unpack_from(self.data, offset)
+            text = self.strings[index] = self.data[offset + 4:offset + 4 + size].decode()
+        return text
+
+    def const(self, index):
+        if index in self.consts:
+            return self.consts[index]
+        entry = self.consts_off + index * (CONST_ENTRY.size + U32.size)
+        tag, dtype, offset, size = CONST_ENTRY.unpack_from(self.data, entry)
+        if tag == C_BIGINT:
+            value = int(self.data[offset:offset + size].decode())
+        else:
+            dtype = np.dtype(self.string(dtype))
+            if tag == C_SCALAR:
+                value = np.frombuffer(self.data, dtype, 1, offset)[0]
+            else:
+                meta, = U32.unpack_from(self.data, entry + CONST_ENTRY.size)
+                ndim = self.data[meta]
+                shape = struct.unpack_from(f"<{ndim}Q", self.data, meta + 1)
+                value = np.frombuffer(self.data, dtype, size // dtype.itemsize, offset).reshape(shape)
+        self.consts[index] = value
+        return value
+
+    def _node_class(self, name):
+        # Only AST node classes may be built from names stored in the file
+        cls = getattr(ast, name, None)
+        if not (isinstance(cls, type) and issubclass(cls, Node)):
+            raise BytecodeError(f"Corrupt code section: '{name}' is not an AST node.")
+        return cls
+
+    def _value(self, offset):
+        data = self.data
+        tag = data[offset]
+        offset += 1
+        if tag == T_NODE:
+            name_id, lineno, count = NODE.unpack_from(data, offset)
+            offset += NODE.size
+            cls = self.classes.get(name_id)
+            if cls is None:
+                cls = self.classes[name_id] = self._node_class(self.string(name_id))
+            node = cls.__new__(cls)
+            node.lineno = lineno
+            for _ in range(count):
+                key, = U32.unpack_from(data, offset)
+                value, offset = self._value(offset + 4)
+                field = self.string(key)
+                if field.startswith('__'):
+                    raise BytecodeError(f"Corrupt code section: invalid field name '{field}'.")
+                setattr(node, field, value)
+            return node, offset
+        if tag == T_LIST or tag == T_TUPLE:
+            count, = U32.unpack_from(data, offset)
+            offset += 4
+            items = []
+            for _ in range(count):
+                item, offset = self._value(offset)
+                items.append(item)
+            return (items if tag == T_LIST else tuple(items)), offset
+        if tag == T_STR:
+            return self.string(U32.unpack_from(data, offset)[0]), offset + 4
+        if tag == T_INT:
+            return I64.unpack_from(data, offset)[0], offset + 8
+        if tag == T_FLOAT:
+            return F64.unpack_from(data, offset)[0], offset + 8
+        if tag == T_TRUE or tag == T_FALSE:
+            return tag == T_TRUE, offset
+        if tag == T_NONE:
+            return None, offset
+        if tag == T_CONST:
+            return self.const(U32.unpack_from(data, offset)[0]), offset + 4
+        if tag == T_STATIC:
+            dtype, offset = self._value(offset)
+            shape, offset = self._value(offset)
+            return StaticType(dtype, shape), offset
+        if tag == T_FUNC:
+            index, = U32.unpack_from(data, offset)
+            name, code, _ = FUNC_ENTRY.unpack_from(self.data, self.funcs_off + index * FUNC_ENTRY.size)
+            # The declaration's line is the first thing in its section
+            _, lineno, _ = NODE.unpack_from(data, code + 1)
+            release, offset = self._value(offset + 4)
+            return LazyFuncDecl(self, index, self.string(name), lineno, release), offset
+        raise BytecodeError(f"Corrupt code section: unknown tag {tag} at offset {offset - 1}.")
+
+
+def load(path):
+    """The Program compiled into 'path', with its functions still undecoded, and the loader behind it."""
+    loader = BytecodeLoader(path)
+    return loader.program(), loader
+
+
+def is_bytecode(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == BYTECODE_MAGIC
+    except OSError:
+        return False
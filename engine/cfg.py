@@ -0,0 +1,411 @@
+from engine.ast import Node
+
+
+# ==========================================
+#             CFG DATA MODEL
+# ==========================================
+
+class Instr:
+    """
+    One straight-line step inside a basic block.
+
+      def   name gets the value of 'expr' (combined with 'prev' for op= forms)
+      kill  name gets a value the compiler cannot know (pointers, x[i] = ..., loop vars)
+      eval  'expr' is evaluated for its effects or output only
+    """
+    __slots__ = ('kind', 'name', 'expr', 'op', 'uses', 'prev', 'block', 'node')
+
+    def __init__(self, kind, name=None, expr=None, op='=', node=None):
+        self.kind = kind
+        self.name = name
+        self.expr = expr
+        self.op = op
+        self.node = node    # Statement the instruction was lowered from
+        self.uses = []      # Identifier nodes read by 'expr'
+        self.prev = None    # SSA value read by compound assignments
+        self.block = None
+
+
+class Phi:
+    __slots__ = ('name', 'block', 'args')
+
+    def __init__(self, name, block):
+        self.name = name
+        self.block = block
+        self.args = {}      # predecessor index -> SSA value
+
+
+class BasicBlock:
+    """
+    succs[0] is taken when 'cond' is true, succs[1] when it is false. A block
+    with two successors and no 'cond' branches on something unknown (for loops).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.phis = {}
+        self.instrs = []
+        self.cond = None
+        self.cond_uses = []
+        self.succs = []
+        self.preds = []
+
+    def __repr__(self):
+        return f"<BB{self.index} -> {[b.index for b in self.succs]}>"
+
+
+class CFG:
+    def __init__(self, name):
+        self.name = name
+        self.blocks = []
+        self.entry = self.new_block()
+        self.exit = None
+        self.use_version = {}   # id(Identifier) -> SSA value it reads
+        self.users = {}         # SSA value -> [Instr | Phi | BasicBlock]
+        self.entry_values = {}  # name -> Instr standing for the value on entry
+
+    def new_block(self):
+        block = BasicBlock(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def link(self, src, dst):
+        src.succs.append(dst)
+        dst.preds.append(src)
+
+
+def expression_uses(expr):
+    """Identifier nodes an expression reads. '&x' does not read x's value."""
+    found = []
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, Node):
+            continue
+        cls = node.__class__.__name__
+        if cls == 'Identifier':
+            found.append(node)
+        elif cls == 'UnaryOp' and node.op == '&':
+            continue
+        else:
+            stack.extend(v for v in vars(node).values() if isinstance(v, (list, Node)))
+    return found
+
+
+# ==========================================
+#             CFG CONSTRUCTION
+# ==========================================
+
+class CFGBuilder:
+    """
+    Lowers the statements of the program (and, separately, of every function
+    body) into basic blocks. Blocks do not open scopes in Quantel, so each
+    graph has one flat namespace.
+    """
+
+    def __init__(self, external=()):
+        self.external = set(external)
+
+    def build(self, program):
+        graphs = [self._build_graph("<program>", program.statements, params=())]
+        for stmt in program.statements:
+            if stmt.__class__.__name__ == 'FuncDecl':
+                graphs.append(self._build_graph(stmt.name, stmt.body, params=stmt.params))
+        return graphs
+
+    def _build_graph(self, name, body, params):
+        self.cfg = CFG(name)
+        self.loops = []  # (continue target, break target)
+        self.cfg.exit = BasicBlock(-1)
+
+        current = self.cfg.entry
+        for param in params:
+            self._emit(current, Instr('kill', param.name))
+        current = self._lower(body, current)
+        if current is not None:
+            self.cfg.link(current, self.cfg.exit)
+
+        self.cfg.exit.index = len(self.cfg.blocks)
+        self.cfg.blocks.append(self.cfg.exit)
+        return self.cfg
+
+    def _emit(self, block, instr):
+        instr.block = block
+        if instr.expr is not None:
+            instr.uses = expression_uses(instr.expr)
+        block.instrs.append(instr)
+
+    def _lower(self, node, current):
+        """Appends 'node' to the graph; returns the block control falls into, or None."""
+        if isinstance(node, list):
+            for stmt in node:
+                if current is None:
+                    # Statements after return/break/continue are unreachable
+                    current = self.cfg.new_block()
+                current = self._lower(stmt, current)
+            return current
+        if node is None:
+            return current
+
+        method = getattr(self, '_lower_' + node.__class__.__name__, None)
+        if method:
+            return method(node, current)
+        self._emit(current, Instr('eval', expr=node, node=node))
+        return current
+
+    def _lower_Block(self, node, current):
+        return self._lower(node.statements, current)
+
+    def _lower_FuncDecl(self, node, current):
+        return current  # Bodies get their own graph
+
+    def _lower_RecordDecl(self, node, current):
+        return current
+
+    def _lower_Import(self, node, current):
+        return current
+
+    def _lower_VarDecl(self, node, current):
+        if node.name in self.external or node.value is None:
+            # Run-time bindings override the initializer, which is still evaluated
+            if node.value is not None:
+                self._emit(current, Instr('eval', expr=node.value, node=node))
+            self._emit(current, Instr('kill', node.name, node=node))
+        else:
+            self._emit(current, Instr('def', node.name, node.value, node=node))
+        return current
+
+    def _lower_PointerDecl(self, node, current):
+        self._emit(current, Instr('kill', node.name, node=node))
+        return current
+
+    def _lower_Assignment(self, node, current):
+        if node.target.__class__.__name__ == 'Identifier':
+            self._emit(current, Instr('def', node.target.name, node.value, node.op, node=node))
+            return current
+
+        # x[i] = v and x.f = v: read the index, then x holds something unknown
+        self._emit(current, Instr('eval', expr=[node.value, node.target], node=node))
+        base = node.target
+        while base.__class__.__name__ in ('ArrayAccess', 'RecordAccess'):
+            base = base.name if base.__class__.__name__ == 'ArrayAccess' else base.record
+        if isinstance(getattr(base, 'name', None), str):
+            self._emit(current, Instr('kill', base.name, node=node))
+        return current
+
+    def _branch(self, block, cond, if_true, if_false):
+        block.cond = cond
+        block.cond_uses = expression_uses(cond) if cond is not None else []
+        self.cfg.link(block, if_true)
+        self.cfg.link(block, if_false)
+
+    def _lower_IfStmt(self, node, current):
+        then_entry = self.cfg.new_block()
+        else_entry = self.cfg.new_block()
+        join = self.cfg.new_block()
+        self._branch(current, node.condition, then_entry, else_entry)
+
+        for entry, body in ((then_entry, node.then_block), (else_entry, node.else_block)):
+            end = self._lower(body, entry)
+            if end is not None:
+                self.cfg.link(end, join)
+        return join if join.preds else None
+
+    def _lower_WhileStmt(self, node, current):
+        header = self.cfg.new_block()
+        body = self.cfg.new_block()
+        after = self.cfg.new_block()
+        self.cfg.link(current, header)
+        self._branch(header, node.condition, body, after)
+        self._lower_loop_body(node.body, body, header, after, header)
+        return after
+
+    def _lower_RepeatUntilStmt(self, node, current):
+        body = self.cfg.new_block()
+        test = self.cfg.new_block()
+        after = self.cfg.new_block()
+        self.cfg.link(current, body)
+        self._lower_loop_body(node.body, body, test, after, test)
+        # 'until' leaves the loop when the condition holds
+        self._branch(test, node.condition, after, body)
+        return after
+
+    def _lower_ForStmt(self, node, current):
+        rng = node.range
+        if rng.__class__.__name__ == 'Range':
+            self._emit(current, Instr('eval', expr=[rng.start, rng.end, rng.step], node=node))
+        else:
+            self._emit(current, Instr('eval', expr=rng, node=node))
+
+        header = self.cfg.new_block()
+        body = self.cfg.new_block()
+        after = self.cfg.new_block()
+        self.cfg.link(current, header)
+        self._branch(header, None, body, after)
+        self._emit(body, Instr('kill', node.loop_var, node=node))
+        self._lower_loop_body(node.body, body, header, after, header)
+        return after
+
+    def _lower_loop_body(self, stmts, entry, continue_to, break_to, back_edge_to):
+        self.loops.append((continue_to, break_to))
+        end = self._lower(stmts, entry)
+        self.loops.pop()
+        if end is not None:
+            self.cfg.link(end, back_edge_to)
+
+    def _lower_Break(self, node, current):
+        if self.loops:
+            self.cfg.link(current, self.loops[-1][1])
+        return None
+
+    def _lower_Continue(self, node, current):
+        if self.loops:
+            self.cfg.link(current, self.loops[-1][0])
+        return None
+
+    def _lower_Return(self, node, current):
+        if node.value is not None:
+            self._emit(current, Instr('eval', expr=node.value, node=node))
+        self.cfg.link(current, self.cfg.exit)
+        return None
+
+
+# ==========================================
+#               SSA FORM
+# ==========================================
+
+def reverse_postorder(cfg):
+    order, seen = [], {cfg.entry.index}
+    stack = [(cfg.entry, iter(cfg.entry.succs))]
+    while stack:
+        block, succs = stack[-1]
+        for succ in succs:
+            if succ.index not in seen:
+                seen.add(succ.index)
+                stack.append((succ, iter(succ.succs)))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+    order.reverse()
+    return order
+
+
+def dominators(cfg):
+    """Immediate dominators of the reachable blocks (Cooper, Harvey & Kennedy)."""
+    order = reverse_postorder(cfg)
+    rank = {block.index: i for i, block in enumerate(order)}
+    idom = {cfg.entry.index: cfg.entry}
+
+    def intersect(a, b):
+        while a is not b:
+            while rank[a.index] > rank[b.index]: a = idom[a.index]
+            while rank[b.index] > rank[a.index]: b = idom[b.index]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            new_idom = None
+            for pred in block.preds:
+                if pred.index in idom:
+                    new_idom = pred if new_idom is None else intersect(pred, new_idom)
+            if idom.get(block.index) is not new_idom:
+                idom[block.index] = new_idom
+                changed = True
+    return order, idom
+
+
+def dominance_frontiers(order, idom):
+    frontier = {block.index: set() for block in order}
+    for block in order:
+        preds = [p for p in block.preds if p.index in idom]
+        if len(preds) < 2:
+            continue
+        for pred in preds:
+            runner = pred
+            while runner is not idom[block.index]:
+                frontier[runner.index].add(block)
+                runner = idom[runner.index]
+    return frontier
+
+
+def to_ssa(cfg):
+    """
+    Places phi nodes at iterated dominance frontiers and renames every read
+    so cfg.use_version maps each Identifier to the single definition it sees.
+    """
+    order, idom = dominators(cfg)
+    frontier = dominance_frontiers(order, idom)
+
+    def_blocks = {}
+    for block in order:
+        for instr in block.instrs:
+            if instr.kind in ('def', 'kill'):
+                def_blocks.setdefault(instr.name, set()).add(block)
+
+    for name, blocks in def_blocks.items():
+        work = list(blocks)
+        while work:
+            block = work.pop()
+            for target in frontier[block.index]:
+                if name not in target.phis:
+                    target.phis[name] = Phi(name, target)
+                    if target not in blocks:
+                        blocks.add(target)
+                        work.append(target)
+
+    children = {}
+    for block in order[1:]:
+        children.setdefault(idom[block.index].index, []).append(block)
+
+    stacks = {}
+
+    def current(name):
+        versions = stacks.get(name)
+        if versions:
+            return versions[-1]
+        if name not in cfg.entry_values:
+            cfg.entry_values[name] = Instr('kill', name)
+        return cfg.entry_values[name]
+
+    def read(value, user):
+        cfg.users.setdefault(value, []).append(user)
+        return value
+
+    # Iterative dominator-tree walk; long chains of ifs would overflow recursion
+    work = [(cfg.entry, False)]
+    pushed = {}
+    while work:
+        block, leaving = work.pop()
+        if leaving:
+            for name in pushed.pop(block.index):
+                stacks[name].pop()
+            continue
+
+        names = []
+        for name, phi in block.phis.items():
+            stacks.setdefault(name, []).append(phi)
+            names.append(name)
+        for instr in block.instrs:
+            for ident in instr.uses:
+                cfg.use_version[id(ident)] = read(current(ident.name), instr)
+            if instr.kind == 'def' and instr.op != '=':
+                instr.prev = read(current(instr.name), instr)
+            if instr.kind in ('def', 'kill'):
+                stacks.setdefault(instr.name, []).append(instr)
+                names.append(instr.name)
+        for ident in block.cond_uses:
+            cfg.use_version[id(ident)] = read(current(ident.name), block)
+        for succ in block.succs:
+            for name, phi in succ.phis.items():
+                phi.args[block.index] = read(current(name), phi)
+
+        pushed[block.index] = names
+        work.append((block, True))
+        work.extend((child, False) for child in children.get(block.index, []))
+    return cfg
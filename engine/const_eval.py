@@ -0,0 +1,105 @@
+import warnings
+
+import numpy as np
+
+# Folded arrays larger than this stay as run-time expressions, so the AST never
+# holds a second copy of a big tensor next to the operands it came from.
+CONST_ARRAY_LIMIT = 4096
+# Strings and integer powers are capped the same way
+CONST_STRING_LIMIT = 4096
+CONST_POWER_LIMIT = 64
+
+
+class ConstantFoldError(Exception):
+    """The expression is left for the interpreter (unknown operator, error, or too large)."""
+
+
+# Mirrors QuantelInterpreter.visit_BinOp / visit_UnaryOp exactly
+BINARY_OPS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+    '%': lambda a, b: a % b,
+    '^': lambda a, b: a ** b,
+    '@': lambda a, b: np.matmul(a, b),
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '>': lambda a, b: a > b,
+    '<=': lambda a, b: a <= b,
+    '>=': lambda a, b: a >= b,
+    '&&': lambda a, b: a and b,
+    '||': lambda a, b: a or b,
+}
+
+UNARY_OPS = {
+    '-': lambda a: -a,
+    '!': lambda a: not a,
+}
+
+
+# What a Literal may hold: Python and numpy scalars, strings and arrays
+CONSTANT_TYPES = (bool, int, float, str, np.generic, np.ndarray)
+
+
+def freeze(value):
+    """Constant arrays are shared by every use, so they are made read-only."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    return value
+
+
+def is_array(value):
+    return isinstance(value, np.ndarray)
+
+
+def evaluate_binop(op, left, right):
+    if op not in BINARY_OPS:
+        raise ConstantFoldError(f"unknown operator '{op}'")
+    _check_cost(op, left, right)
+    return _checked(BINARY_OPS[op], left, right)
+
+
+def evaluate_unary(op, operand):
+    if op not in UNARY_OPS:
+        raise ConstantFoldError(f"unknown operator '{op}'")
+    return _checked(UNARY_OPS[op], operand)
+
+
+def array_literal(elements):
+    """np.array of already-constant elements, as visit_ArrayLiteral would build it."""
+    return _checked(np.array, list(elements))
+
+
+def _checked(fn, *args):
+    # Anything numpy would only warn about at run time (1/0, bad shapes) is not folded
+    try:
+        with warnings.catch_warnings(), np.errstate(all='raise'):
+            warnings.simplefilter('error')
+            result = fn(*args)
+    except Exception as e:
+        raise ConstantFoldError(str(e))
+    return check_constant(result)
+
+
+def check_constant(result):
+    """Applies the fold limits to a value about to become a Literal, and freezes it."""
+    if is_array(result) and result.size > CONST_ARRAY_LIMIT:
+        raise ConstantFoldError(f"constant of {result.size} elements exceeds the fold limit")
+    if isinstance(result, str) and len(result) > CONST_STRING_LIMIT:
+        raise ConstantFoldError("constant string exceeds the fold limit")
+    return freeze(result)
+
+
+def _check_cost(op, left, right):
+    """Rejects folds whose evaluation itself would be huge (2 ^ 10000000, "a" * 10^9)."""
+    if op == '^' and isinstance(left, int) and isinstance(right, int) \
+            and abs(left) > 1 and abs(right) > CONST_POWER_LIMIT:
+        raise ConstantFoldError("integer power exceeds the fold limit")
+    if op == '*' and isinstance(left, (str, int)) and isinstance(right, (str, int)) \
+            and isinstance(left, str) != isinstance(right, str):
+        count = right if isinstance(left, str) else left
+        text = left if isinstance(left, str) else right
+        if len(text) * count > CONST_STRING_LIMIT:
+            raise ConstantFoldError("constant string exceeds the fold limit")
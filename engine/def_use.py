@@ -0,0 +1,84 @@
+from engine.ast import Node
+
+
+class DefUseIndex:
+    """
+    One-pass index over an AST: the slot every node lives in, and for each
+    variable name the nodes that define it and the Identifier nodes that read it.
+
+    Slots are (parent, attribute, list index or None), which is enough to swap
+    a node for its replacement without walking the tree again.
+    """
+
+    def __init__(self, tree):
+        self.parents = {}   # id(node) -> (parent, attr, index)
+        self.defs = {}      # name -> [defining nodes]
+        self.uses = {}      # name -> [Identifier nodes]
+        self.nodes = 0
+        self._index(tree, None, None, None)
+
+    def _index(self, node, parent, attr, index):
+        if isinstance(node, list):
+            for i, item in enumerate(node):
+                self._index(item, parent, attr, i)
+            return
+        if not isinstance(node, Node):
+            return
+
+        self.nodes += 1
+        self.parents[id(node)] = (parent, attr, index)
+        cls = node.__class__.__name__
+
+        if cls in ('VarDecl', 'PointerDecl', 'FuncParam'):
+            self.defs.setdefault(node.name, []).append(node)
+        elif cls == 'ForStmt':
+            self.defs.setdefault(node.loop_var, []).append(node)
+        elif cls == 'Assignment':
+            base = assignment_base(node.target)
+            if base is not None:
+                self.defs.setdefault(base, []).append(node)
+            # Only the index expressions of an indexed target are reads
+            self._index_target(node.target, node)
+            self._index(node.value, node, 'value', None)
+            return
+        elif cls == 'Identifier':
+            self.uses.setdefault(node.name, []).append(node)
+
+        for key, value in vars(node).items():
+            if isinstance(value, (list, Node)):
+                self._index(value, node, key, None)
+
+    def _index_target(self, target, parent):
+        self.parents[id(target)] = (parent, 'target', None)
+        cls = target.__class__.__name__
+        if cls == 'ArrayAccess':
+            self._index_target(target.name, target)
+            self._index(target.index, target, 'index', None)
+        elif cls == 'RecordAccess':
+            self._index_target(target.record, target)
+
+    def slot(self, node):
+        return self.parents.get(id(node))
+
+    def replace(self, node, new):
+        """Puts 'new' in the slot 'node' occupies and indexes it there."""
+        parent, attr, index = self.parents[id(node)]
+        if parent is not None:
+            if index is None:
+                setattr(parent, attr, new)
+            else:
+                getattr(parent, attr)[index] = new
+        self.parents[id(new)] = (parent, attr, index)
+        return new
+
+    def single_def(self, name):
+        defs = self.defs.get(name, [])
+        return defs[0] if len(defs) == 1 else None
+
+
+def assignment_base(target):
+    """Name of the variable an assignment target writes (x, x[i] and x.f all write x)."""
+    while target.__class__.__name__ in ('ArrayAccess', 'RecordAccess'):
+        target = target.name if target.__class__.__name__ == 'ArrayAccess' else target.record
+    name = getattr(target, 'name', None)
+    return name if isinstance(name, str) else None
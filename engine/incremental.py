@@ -0,0 +1,243 @@
+import os
+
+from engine.ast import Node
+from engine.semantic_analyzer import SemanticAnalyzer, format_error
+
+MISSING = object()
+NESTED = (Node, list)
+# Attributes that never change what the analyzer concludes about a statement
+IGNORED_ATTRS = frozenset(('lineno', 'static', 'release'))
+# Nodes whose 'name' is a symbol the statement uses or declares
+REFERENCING = frozenset(('Identifier', 'FuncCall', 'VarDecl', 'PointerDecl', 'FuncDecl', 'RecordDecl', 'FuncParam'))
+TYPED = ('VarDecl', 'PointerDecl', 'FuncDecl', 'FuncParam')
+
+
+class AnalyzedUnit:
+    """
+    What analyzing one top-level statement produced, with every line stored
+    relative to the statement's first line so it can be replayed wherever the
+    same code moves to.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment  # Signatures of the outside symbols it referenced
+        self.diagnostics = []  # (relative line, message, hint)
+        self.scopes = []       # (parent index or None for the global scope, label, first, last)
+        self.declarations = []  # (scope index or None for global, name, symbol, relative line)
+        self.annotations = []  # (StaticType or None, load header or MISSING), in scan order
+        self.extent = 0        # Last relative line the statement spans
+
+
+class IncrementalAnalyzer:
+    """
+    Re-runs semantic analysis after an edit on the top-level statements that
+    need it. A statement's result is reused when its code is unchanged
+    (compared structurally, lines relative to its start) and so is every
+    global symbol it references, as visible at its position: its type,
+    shape, category and arity, and the records it reaches. These references are
+    the dependencies between declarations, so changing a global re-analyzes
+    exactly the statements that use it. load() calls also depend on their
+    file. Reused statements get their diagnostics, declarations and type
+    annotations replayed at their new lines.
+    """
+
+    def __init__(self):
+        self.units = {}  # Fingerprint -> [AnalyzedUnit] from the previous run
+        self.stats = {"statements": 0, "analyzed": 0, "reused": 0}
+
+    def analyze(self, tree):
+        """Returns a SemanticAnalyzer in the state a full analysis of 'tree' would leave it in."""
+        analyzer = SemanticAnalyzer()
+        self.stats = {"statements": 0, "analyzed": 0, "reused": 0}
+        units = {}
+        if tree is None:
+            return analyzer
+        analyzer.visit(tree.imports)
+
+        for stmt in tree.statements:
+            scan = _Scan(stmt)
+            environment = self._environment(analyzer, scan)
+            unit = next((u for u in self.units.get(scan.fingerprint, ()) if u.environment == environment), None)
+            if unit is not None:
+                self._replay(analyzer, unit, scan)
+                self.stats["reused"] += 1
+            else:
+                unit = self._analyze(analyzer, stmt, scan, environment)
+                self.stats["analyzed"] += 1
+            units.setdefault(scan.fingerprint, []).append(unit)
+            self.stats["statements"] += 1
+
+        self.units = units
+        return analyzer
+
+    # ==========================================
+    #             DEPENDENCIES
+    # ==========================================
+
+    def _environment(self, analyzer, scan):
+        signature = []
+        records = set()
+        for name in sorted(scan.references):
+            symbol = analyzer.lookup(name)
+            signature.append((name, _symbol_key(symbol), _symbol_key(analyzer.history.get(name))))
+            if symbol is not None:
+                records.add(symbol.symbol_type)
+        # Record types reached through variables and fields, down to nested records
+        seen = set()
+        while records:
+            name = records.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            record = analyzer.history.get(name)
+            signature.append((name, _symbol_key(record)))
+            if record is not None and record.category == 'record':
+                records.update(record.params_count.values())
+        for path in sorted(scan.files):
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    # ==========================================
+    #             ANALYSIS AND REPLAY
+    # ==========================================
+
+    def _analyze(self, analyzer, stmt, scan, environment):
+        table = analyzer.symbols
+        errors, scopes, declarations = len(analyzer.diagnostics), len(table.scopes), len(table.log)
+        analyzer.visit(stmt)
+
+        unit = AnalyzedUnit(environment)
+        unit.extent = scan.extent
+        base = scan.base
+        unit.diagnostics = [(_relative(lineno, base), message, hint)
+                            for lineno, message, hint in analyzer.diagnostics[errors:]]
+        index = {}
+        for scope in table.scopes[scopes:]:
+            index[scope.id] = len(unit.scopes)
+            unit.scopes.append((index.get(scope.parent.id), scope.label,
+                                _relative(scope.first_line, base), _relative(scope.last_line, base)))
+        unit.declarations = [(index.get(decl.scope.id), decl.name, decl.symbol, _relative(decl.lineno, base))
+                             for decl in table.log[declarations:]]
+        unit.annotations = [(getattr(node, 'static', None), analyzer.load_headers.get(id(node), MISSING))
+                            for node in scan.nodes]
+        return unit
+
+    def _replay(self, analyzer, unit, scan):
+        table = analyzer.symbols
+        base = scan.base
+        for lineno, message, hint in unit.diagnostics:
+            lineno = _absolute(lineno, base)
+            analyzer.diagnostics.append((lineno, message, hint))
+            analyzer.errors.append(format_error(lineno, message, hint))
+
+        if base:
+            table.note_line(base)
+            table.note_line(base + unit.extent)
+        scopes = []
+        for parent, label, first, last in unit.scopes:
+            parent = table.current if parent is None else scopes[parent]
+            scopes.append(table.restore_scope(parent, label, _absolute(first, base), _absolute(last, base)))
+        for scope, name, symbol, lineno in unit.declarations:
+            lineno = _absolute(lineno, base)
+            if scope is None:
+                table.define(name, symbol, lineno)
+            else:
+                table.restore_declaration(scopes[scope], name, symbol, lineno)
+            analyzer.history[name] = symbol
+
+        for node, (static, header) in zip(scan.nodes, unit.annotations):
+            if static is not None:
+                node.static = analyzer.static[id(node)] = static
+            if header is not MISSING:
+                analyzer.load_headers[id(node)] = header
+
+
+class _Scan:
+    """
+    One walk over a statement: its structural fingerprint, the outside names it
+    may reference, the files its load() calls read, and its nodes in order.
+    """
+
+    def __init__(self, stmt):
+        self.base = getattr(stmt, 'lineno', 0)  # Error recovery may leave None in the list
+        self.references = set()
+        self.files = set()
+        self.nodes = []
+        self.extent = 0
+        self.flat = []
+        self._walk([stmt])
+        self.fingerprint = tuple(self.flat)
+
+    def _walk(self, node):
+        # Pre-order and flat: attributes come in constructor order, lists carry their length
+        flat = self.flat
+        if isinstance(node, list):
+            flat.append(len(node))
+            for item in node:
+                if isinstance(item, NESTED):
+                    self._walk(item)
+                else:
+                    flat.append(item.__class__)
+                    flat.append(item)
+            return
+
+        self.nodes.append(node)
+        cls = node.__class__.__name__
+        lineno = node.lineno
+        if lineno.__class__ is int and lineno and self.base:
+            lineno -= self.base
+            if lineno > self.extent:
+                self.extent = lineno
+        else:
+            lineno = (lineno,)
+        flat.append(cls)
+        flat.append(lineno)
+
+        if cls in REFERENCING:
+            self.references.add(node.name)
+            if cls == 'PointerDecl':
+                self.references.add(node.target)
+            elif cls == 'FuncCall' and node.name == 'load' and node.args:
+                path = getattr(node.args[0], 'value', None)
+                if isinstance(path, str):
+                    self.files.add(path)
+            # Record types are referenced by name
+            if cls in TYPED:
+                self.references.add(node.ret_type if cls == 'FuncDecl' else node.dtype)
+
+        for attr, value in vars(node).items():
+            if attr in IGNORED_ATTRS:
+                continue
+            if isinstance(value, NESTED):
+                self._walk(value)
+            else:
+                flat.append(value.__class__)  # Keeps 1, 1.0 and True apart
+                flat.append(value)
+
+
+def _relative(lineno, base):
+    if isinstance(lineno, int) and lineno and base:
+        return lineno - base
+    return (lineno,)  # No usable line (0 or '??'): kept as is wherever the statement moves
+
+
+def _absolute(lineno, base):
+    return lineno[0] if isinstance(lineno, tuple) else base + lineno
+
+
+def _symbol_key(symbol):
+    if symbol is None:
+        return None
+    params = symbol.params_count
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    shape = symbol.shape
+    if isinstance(shape, dict):  # A record's field shapes
+        shape = tuple(sorted((field, dims if dims is None else tuple(dims)) for field, dims in shape.items()))
+    elif isinstance(shape, list):
+        shape = tuple(shape)
+    return (symbol.symbol_type, symbol.category, shape, symbol.is_initialized, params)
@@ -1,6 +1,19 @@
 import numpy as np
 import sys
 
+from engine.probe import ProbeEvent
+from engine.builtins import BUILTINS
+from engine.const_eval import BINARY_OPS
+from engine.jit import TieredJIT, JIT_THRESHOLD
+
+# Arithmetic operators that can write into an existing array
+ARRAY_UFUNCS = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide,
+                '%': np.remainder, '^': np.power, '@': np.matmul}
+# Operators whose result never is one of their operands ('&&' and '||' return one)
+CONSUMING_OPS = set(ARRAY_UFUNCS) | {'==', '!=', '<', '>', '<=', '>='}
+# Intermediate results smaller than this are not worth keeping a buffer for
+BUFFER_MIN_ELEMENTS = 1024
+
 
 # --- Custom Exceptions for Control Flow ---
 class ReturnValue(Exception):
@@ -18,9 +31,18 @@ class ContinueException(Exception):
 
 # --- Main Interpreter Class ---
 class QuantelInterpreter:
-    def __init__(self):
+    def __init__(self, tracer=None, probes=None, memory=None, bindings=None, jit_threshold=JIT_THRESHOLD):
         self.global_env = {}
         self.local_env = None
+        self.tracer = tracer
+        self.probes = probes  # ProbeStream; probes are printed directly when None
+        self.memory = memory  # MemoryTracker; accounting is skipped when None
+        self.bindings = bindings or {}  # Global name -> value overriding its declared initializer
+        self.visitors = {}  # Node class -> visit method, so dispatch is one dict lookup
+        self.plans = {}     # BinOp -> (operator function, buffer left operand, buffer right operand)
+        self.buffers = {}   # BinOp -> (operand dtypes and shapes, the array its last result was written to)
+        # Compiled functions keep locals out of the environments, so memory accounting needs every call interpreted
+        self.jit = TieredJIT(self, jit_threshold) if jit_threshold and memory is None else None
 
     def interpret(self, tree):
         if not tree:
@@ -28,10 +50,15 @@ class QuantelInterpreter:
         try:
             return self.visit(tree)
         except Exception as e:
+            if self.probes is not None:
+                self.probes.sync()  # The probes that ran before the error come first
             print(f"\n--- Runtime Error ---\n{e}")
             raise e # debug Python trace
 
     def visit(self, node):
+        visitor = self.visitors.get(node.__class__)
+        if visitor is not None:
+            return visitor(node)
         if node is None:
             return None
 
@@ -43,12 +70,29 @@ class QuantelInterpreter:
             last_result = None
             for stmt in node:
                 last_result = self.visit(stmt)
+                if getattr(stmt, 'release', None):
+                    self._release(stmt.release)
             return last_result
 
         method_name = 'visit_' + node.__class__.__name__
-        visitor = getattr(self, method_name, self.generic_visit)
+        visitor = self.visitors[node.__class__] = getattr(self, method_name, self.generic_visit)
         return visitor(node)
 
+    def _store(self, env, name, val, lineno=None):
+        if self.memory is not None:
+            scope = 'global' if env is self.global_env else id(env)
+            self.memory.store(scope, name, val, lineno)
+        env[name] = val
+
+    def _release(self, names):
+        # The optimizer's liveness pass marked these as never read again; freeing them lowers peak memory
+        env = self.local_env if self.local_env is not None else self.global_env
+        for name in names:
+            if name in env:
+                del env[name]
+                if self.memory is not None:
+                    self.memory.release('global' if env is self.global_env else id(env), name)
+
     def generic_visit(self, node):
         # Report Line Number
         lineno = getattr(node, 'lineno', 'Unknown')
@@ -71,6 +115,8 @@ class QuantelInterpreter:
         result = None
         for stmt in node.statements:
             result = self.visit(stmt)
+            if getattr(stmt, 'release', None):
+                self._release(stmt.release)
         return result
 
     # ==========================================
@@ -79,16 +125,23 @@ class QuantelInterpreter:
 
     def visit_VarDecl(self, node):
         val = None
-        if hasattr(node, 'value') and node.value is not None:
-            val = self.visit(node.value)
+        if self.local_env is None and node.name in self.bindings:
+            val = self.bindings[node.name]
+        elif hasattr(node, 'value') and node.value is not None:
+            if node.value.__class__.__name__ == 'FuncCall' and node.value.name == 'load':
+                # Raw binary files take their layout from the declaration
+                dims = getattr(node.shape, 'dims', None)
+                val = self.visit_FuncCall(node.value, dtype=node.dtype, shape=dims)
+            else:
+                val = self.visit(node.value)
 
         env = self.local_env if self.local_env is not None else self.global_env
-        env[node.name] = val
+        self._store(env, node.name, val, node.lineno)
         return val
 
     def visit_RecordDecl(self, node):
         env = self.local_env if self.local_env is not None else self.global_env
-        env[node.name] = {'type': 'RECORD_DEF', 'fields': node.fields}
+        self._store(env, node.name, {'type': 'RECORD_DEF', 'fields': node.fields}, node.lineno)
         return None
 
     def visit_PointerDecl(self, node):
@@ -99,7 +152,7 @@ class QuantelInterpreter:
             target_val = self.global_env.get(node.target)
 
         ptr_val = f"0x{id(target_val):x}" if target_val is not None else "0x0"
-        env[node.name] = ptr_val
+        self._store(env, node.name, ptr_val, node.lineno)
         return ptr_val
 
     # ==========================================
@@ -148,12 +201,18 @@ class QuantelInterpreter:
                 step = int(self.visit(iterable_node.step))
             iterator = range(start, end, step)
         else:
-            iterator = self.visit(iterable_node)
+            # Any iterable is pulled lazily: ndarray rows (views), memory maps, generators
+            iterable = self.visit(iterable_node)
+            try:
+                iterator = iter(iterable)
+            except TypeError:
+                raise Exception(f"Runtime Error (Line {node.lineno}): Cannot iterate over "
+                                f"'{type(iterable).__name__}' in for loop.")
 
         env = self.local_env if self.local_env is not None else self.global_env
 
         for i in iterator:
-            env[node.loop_var] = i
+            self._store(env, node.loop_var, i, node.lineno)
             try:
                 self.visit(node.body)
             except BreakException:
@@ -175,26 +234,47 @@ class QuantelInterpreter:
         self.global_env[node.name] = node
         return None
 
+    # Functions loaded from bytecode decode their body on first call
+    visit_LazyFuncDecl = visit_FuncDecl
+
     def visit_Return(self, node):
         val = self.visit(node.value) if node.value else None
         raise ReturnValue(val)
 
-    def visit_FuncCall(self, node):
-        if node.name == 'print':
-            args = [str(self.visit(a)) for a in node.args]
-            print(" ".join(args))
-            return None
+    def visit_FuncCall(self, node, **hints):
+        func_node = self.resolve(node)
+        if func_node is None:
+            return self._call_builtin(node, [self.visit(a) for a in node.args], hints)
+        # Arguments are evaluated in the caller's environment
+        args = [self.visit(arg_expr) for _, arg_expr in zip(func_node.params, node.args)]
+        return self._invoke(node, func_node, args)
 
+    def resolve(self, node):
+        """The FuncDecl a call refers to, or None for a builtin."""
         func_node = self.global_env.get(node.name)
         if not func_node:
+            if node.name in BUILTINS:
+                return None
             raise Exception(f"Function '{node.name}' not defined.")
+        return func_node
+
+    def _invoke(self, node, func_node, args):
+        # Hot functions run compiled for their argument types once the JIT has seen enough calls
+        compiled = self.jit.lookup(func_node, args) if self.jit is not None else None
+        if compiled is not None:
+            return self._call_compiled(node, compiled, args)
+
+        new_env = {param_node.name: val for param_node, val in zip(func_node.params, args)}
+        if self.memory is not None:
+            for name, val in new_env.items():
+                self.memory.store(id(new_env), name, val, node.lineno)
 
         prev_env = self.local_env
-        self.local_env = {}
+        self.local_env = new_env
 
-        for param_node, arg_expr in zip(func_node.params, node.args):
-            arg_value = self.visit(arg_expr)
-            self.local_env[param_node.name] = arg_value
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.begin(node.name, "call", line=node.lineno)
 
         result = None
         try:
@@ -203,39 +283,108 @@ class QuantelInterpreter:
             result = r.value
         finally:
             self.local_env = prev_env
+            if self.memory is not None:
+                self.memory.release_scope(id(new_env))
+            if tracer is not None:
+                tracer.end(node.name, "call")
 
         return result
 
+    def _call_compiled(self, node, compiled, args):
+        tracer = self.tracer
+        if tracer is None:
+            return compiled(*args)
+        tracer.begin(node.name, "call", line=node.lineno)
+        try:
+            return compiled(*args)
+        finally:
+            tracer.end(node.name, "call")
+
+    def _call_builtin(self, node, args, hints):
+        if node.name == 'print' and self.probes is not None:
+            self.probes.sync()  # Keep printed lines after the probes that ran before them
+        try:
+            return BUILTINS[node.name].fn(*args, **hints)
+        except TypeError as e:
+            raise Exception(f"Runtime Error (Line {node.lineno}): Bad call to builtin '{node.name}': {e}")
+        except Exception as e:
+            raise Exception(f"Runtime Error (Line {node.lineno}): {e}")
+
     # ==========================================
     #           Math & Operations
     # ==========================================
 
-    def visit_BinOp(self, node):
-        left = self.visit(node.left)
-        right = self.visit(node.right)
-        op = node.op
+    def visit_BinOp(self, node, into_buffer=False):
+        plan = self.plans.get(node)
+        if plan is None:
+            plan = self.plans[node] = self._plan_binop(node)
+        fn, buffer_left, buffer_right = plan
+        left = self.visit_BinOp(node.left, True) if buffer_left else self.visit(node.left)
+        right = self.visit_BinOp(node.right, True) if buffer_right else self.visit(node.right)
 
+        if fn is None:
+            raise Exception(f"Runtime Error: Unknown operator '{node.op}'")
         try:
-            if op == '+': return left + right
-            if op == '-': return left - right
-            if op == '*': return left * right
-            if op == '/': return left / right
-            if op == '%': return left % right
-            if op == '^': return left ** right
-            if op == '@': return np.matmul(left, right)
-            if op == '==': return left == right
-            if op == '!=': return left != right
-            if op == '<': return left < right
-            if op == '>': return left > right
-            if op == '<=': return left <= right
-            if op == '>=': return left >= right
-            if op == '&&': return left and right
-            if op == '||': return left or right
+            if into_buffer:
+                return self._into_buffer(node, fn, left, right)
+            return fn(left, right)
         except Exception as e:
             lineno = getattr(node, 'lineno', '?')
-            raise Exception(f"Math Error at Line {lineno} ({op}): {e}")
+            raise Exception(f"Math Error at Line {lineno} ({node.op}): {e}")
+
+    def _plan_binop(self, node):
+        """
+        Picks how to evaluate a BinOp from the types SemanticAnalyzer cached on
+        the tree. Scalars just call the operator. An operand that is itself array
+        arithmetic of a known, large shape is written into a buffer kept from its
+        previous evaluation, since this operator consumes it and nothing else can
+        hold it. A left operand is only buffered when the right one calls no
+        function, which could evaluate the same node again before it is consumed.
+        """
+        fn = BINARY_OPS.get(node.op)
+        if node.op not in CONSUMING_OPS:
+            return fn, False, False
+        buffer_left = self._bufferable(node.left) and not self._contains_call(node.right)
+        return fn, buffer_left, self._bufferable(node.right)
+
+    def _bufferable(self, node):
+        static = getattr(node, 'static', None)
+        if node.__class__.__name__ != 'BinOp' or node.op not in ARRAY_UFUNCS or static is None:
+            return False
+        shape = static.shape
+        if not shape or not all(isinstance(d, int) for d in shape):
+            return False
+        return int(np.prod(shape)) >= BUFFER_MIN_ELEMENTS
+
+    def _contains_call(self, node):
+        if isinstance(node, list):
+            return any(self._contains_call(item) for item in node)
+        if not hasattr(node, '__dict__'):
+            return False
+        if node.__class__.__name__ == 'FuncCall':
+            return True
+        return any(self._contains_call(v) for v in vars(node).values() if isinstance(v, list) or hasattr(v, '__dict__'))
+
+    def _into_buffer(self, node, fn, left, right):
+        # Declared types are not enforced, so the buffer is only reused when the operands match the last ones
+        signature = (self._operand_signature(left), self._operand_signature(right))
+        if None in signature:
+            return fn(left, right)
+        buffer = self.buffers.get(node)
+        if buffer is not None and buffer[0] == signature:
+            return ARRAY_UFUNCS[node.op](left, right, out=buffer[1])
+        result = fn(left, right)
+        if type(result) is np.ndarray:
+            self.buffers[node] = (signature, result)
+        return result
 
-        raise Exception(f"Runtime Error: Unknown operator '{op}'")
+    def _operand_signature(self, value):
+        """What decides the result dtype and shape: numpy values by dtype and shape, Python scalars by type."""
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.dtype, value.shape
+        if type(value) in (bool, int, float):
+            return type(value)
+        return None
 
     def visit_CompareOp(self, node):
         return self.visit_BinOp(node)
@@ -255,20 +404,20 @@ class QuantelInterpreter:
 
         if target_name:
             if node.op == '=':
-                env[target_name] = val
+                self._store(env, target_name, val, node.lineno)
             else:
                 current = env.get(target_name)
                 if current is None:
                     raise Exception(f"Variable '{target_name}' not defined.")
 
                 if node.op == '+=':
-                    env[target_name] = current + val
+                    self._store(env, target_name, current + val, node.lineno)
                 elif node.op == '-=':
-                    env[target_name] = current - val
+                    self._store(env, target_name, current - val, node.lineno)
                 elif node.op == '*=':
-                    env[target_name] = current * val
+                    self._store(env, target_name, current * val, node.lineno)
                 elif node.op == '/=':
-                    env[target_name] = current / val
+                    self._store(env, target_name, current / val, node.lineno)
         return val
 
     # ==========================================
@@ -325,18 +474,11 @@ class QuantelInterpreter:
 
     def visit_Probe(self, node):
         val = self.visit(node.target)
-        lineno = getattr(node, 'lineno', '?')
-
-        print(f"\n   [PROBE TOOL @ Line {lineno}]")
-        print(f"   Value: {val}")
+        self._emit_probe(getattr(node, 'lineno', '?'), val)
+        return val
 
-        if isinstance(val, np.ndarray):
-            print(f"   Shape: {val.shape}")
-            print(f"   Dtype: {val.dtype}")
-        elif isinstance(val, str):
-            print(f"   Type:  String")
+    def _emit_probe(self, lineno, val):
+        if self.probes is not None:
+            self.probes.emit(lineno, val)
         else:
-            print(f"   Type:  {type(val).__name__}")
-        print("")
-
-        return val
\ No newline at end of file
+            print(ProbeEvent(0, lineno, val).format())
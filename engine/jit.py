@@ -0,0 +1,662 @@
+import re
+import warnings
+
+import numpy as np
+
+from engine import shapes
+from engine.const_eval import BINARY_OPS
+
+JIT_THRESHOLD = 100     # Calls with the same argument types before a function is compiled for them
+JIT_MAX_VERSIONS = 4    # Argument signatures compiled per function before it stays interpreted
+MAX_PROFILED_SIGNATURES = 64  # A function called with more distinct signatures than this is not worth profiling
+MAX_INFERENCE_PASSES = 8
+
+SCALAR_TYPES = (bool, int, float, str)
+# Python operators for Quantel ones that need no error wrapping once the operand kinds are known
+PY_OPS = {'+': '+', '-': '-', '*': '*', '/': '/', '%': '%', '^': '**', '@': '@',
+          '==': '==', '!=': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+# On Python scalars these can raise (division by zero, overflow, complex results)
+RAISING_SCALAR_OPS = ('/', '%', '^')
+BOTTOM = object()  # Kind of a local before any assignment to it has been seen
+
+
+class Unsupported(Exception):
+    """The function uses something the compiler does not translate; it stays interpreted."""
+
+
+# ==========================================
+#             KINDS
+# ==========================================
+
+# A kind is what specialization knows about a value: a Python scalar type,
+# (numpy class, dtype, shape) for arrays and numpy scalars, or None if unknown.
+
+def kind_of(value):
+    cls = type(value)
+    if cls is np.ndarray:
+        return cls, value.dtype, value.shape
+    if isinstance(value, np.generic):
+        return cls, value.dtype, ()
+    if cls in SCALAR_TYPES:
+        return cls
+    return None
+
+
+def signature(args):
+    return tuple(map(kind_of, args))
+
+
+def _sample(kind):
+    # A small value of the kind, so operators can be tried on it at compile time
+    if isinstance(kind, tuple):
+        cls, dtype, shape = kind
+        if cls is np.ndarray:
+            return np.ones((1,) * len(shape), dtype)
+        return dtype.type(1)
+    return kind(1) if kind is not str else "a"
+
+
+def _shape(kind):
+    return list(kind[2]) if isinstance(kind, tuple) else []
+
+
+def _is_numpy(kind):
+    return isinstance(kind, tuple)
+
+
+def binary_kind(op, left, right):
+    """
+    The kind of 'left op right', found by applying the operator to samples of
+    the operand kinds and NumPy's shape rules to their shapes. None when it
+    depends on the values or the operation fails.
+    """
+    if left is None or right is None or op not in BINARY_OPS:
+        return None
+    if op in ('&&', '||'):
+        return left if left == right else None
+    if op == '^' and not _is_numpy(left) and not _is_numpy(right):
+        return None  # 2 ^ -1 is a float
+    try:
+        with warnings.catch_warnings(), np.errstate(all='ignore'):
+            warnings.simplefilter('ignore')
+            result = BINARY_OPS[op](_sample(left), _sample(right))
+        kind = kind_of(result)
+        if isinstance(kind, tuple) and kind[0] is np.ndarray:
+            combine = shapes.matmul if op == '@' else shapes.broadcast
+            kind = (np.ndarray, kind[1], tuple(combine(_shape(left), _shape(right))))
+        return kind
+    except Exception:
+        return None
+
+
+def unary_kind(op, operand):
+    if op == '&':
+        return str
+    if op == '!':
+        # 'not' raises on arrays of more than one element
+        return bool if operand is not None and not (_is_numpy(operand) and operand[0] is np.ndarray) else None
+    if op != '-' or operand is None:
+        return operand
+    try:
+        with warnings.catch_warnings(), np.errstate(all='ignore'):
+            warnings.simplefilter('ignore')
+            kind = kind_of(-_sample(operand))
+        return (np.ndarray, kind[1], operand[2]) if isinstance(kind, tuple) and kind[0] is np.ndarray else kind
+    except Exception:
+        return None
+
+
+def _inline(op, left, right, result):
+    """Whether 'left op right' can run as a plain Python operator: it cannot raise for these kinds."""
+    if result is None or op not in PY_OPS:
+        return False
+    if not _is_numpy(left) and not _is_numpy(right):
+        # float + int converts the int, which overflows past 1e308
+        mixed = {left, right} == {int, float} and op in ('+', '-', '*')
+        return op not in RAISING_SCALAR_OPS and not mixed
+    # A Python int outside the numpy operand's range raises (NEP 50)
+    if int in (left, right):
+        return False
+    # Integers to negative powers raise
+    return op != '^' or all(_is_numpy(k) and k[1].kind in 'fc' for k in (left, right))
+
+
+def _join(a, b):
+    if a is BOTTOM:
+        return b
+    return a if a == b else None
+
+
+# ==========================================
+#             TIERS
+# ==========================================
+
+class TieredJIT:
+    """
+    The second execution tier. Calls are counted per function and argument
+    signature; once one passes the threshold, the function is compiled to
+    Python for exactly those argument types. A compiled version only runs for
+    calls that match its signature, so a call with other types deoptimizes to
+    the interpreter (and may get a version of its own). A function that keeps
+    seeing new signatures goes back to the interpreter for good.
+    """
+
+    def __init__(self, interpreter, threshold=JIT_THRESHOLD):
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.counts = {}     # FuncDecl -> {signature: calls}
+        self.versions = {}   # FuncDecl -> {signature: compiled function}
+        self.rejected = set()
+        self.stats = {"compiled": 0, "deopts": 0, "rejected": 0}
+
+    def lookup(self, func_node, args):
+        """The compiled version to run this call with, or None to interpret it."""
+        if func_node in self.rejected:
+            return None
+        key = signature(args)
+        versions = self.versions.get(func_node)
+        if versions:
+            compiled = versions.get(key)
+            if compiled is not None:
+                return compiled
+            self.stats["deopts"] += 1
+        counts = self.counts.setdefault(func_node, {})
+        if key not in counts and len(counts) >= MAX_PROFILED_SIGNATURES:
+            return self._reject(func_node)
+        calls = counts[key] = counts.get(key, 0) + 1
+        if calls < self.threshold:
+            return None
+        del counts[key]
+        return self._compile(func_node, key)
+
+    def _compile(self, func_node, key):
+        versions = self.versions.setdefault(func_node, {})
+        if len(versions) >= JIT_MAX_VERSIONS:
+            return self._reject(func_node)
+        try:
+            compiled = FunctionCompiler(self.interpreter, func_node, key).build()
+        except (Unsupported, SyntaxError, RecursionError):
+            return self._reject(func_node)
+        versions[key] = compiled
+        self.stats["compiled"] += 1
+        return compiled
+
+    def _reject(self, func_node):
+        self.rejected.add(func_node)
+        self.versions.pop(func_node, None)
+        self.counts.pop(func_node, None)
+        self.stats["rejected"] += 1
+        return None
+
+
+# ==========================================
+#             RUNTIME SUPPORT
+# ==========================================
+
+# What compiled code calls where it cannot use a Python operator directly.
+# Each raises the error the interpreter would for the same node.
+
+def _undefined(name, lineno):
+    raise Exception(f"Runtime Error (Line {lineno}): Variable '{name}' is not defined.")
+
+
+def _unassigned(name):
+    raise Exception(f"Variable '{name}' not defined.")
+
+
+def _addr(value):
+    return f"0x{id(value):x}"
+
+
+def _iterate(iterable, lineno):
+    try:
+        return iter(iterable)
+    except TypeError:
+        raise Exception(f"Runtime Error (Line {lineno}): Cannot iterate over "
+                        f"'{type(iterable).__name__}' in for loop.")
+
+
+def _index(node, target, index):
+    try:
+        return target[index]
+    except Exception as e:
+        raise Exception(f"Array Access Error (Line {getattr(node, 'lineno', '?')}): {e}")
+
+
+def _runtime(interpreter):
+    def apply(node, fn, left, right, into_buffer=False):
+        if fn is None:
+            raise Exception(f"Runtime Error: Unknown operator '{node.op}'")
+        try:
+            if into_buffer:
+                return interpreter._into_buffer(node, fn, left, right)
+            return fn(left, right)
+        except Exception as e:
+            raise Exception(f"Math Error at Line {getattr(node, 'lineno', '?')} ({node.op}): {e}")
+
+    def invoke(node, func_node, args, hints):
+        if func_node is None:
+            return interpreter._call_builtin(node, args, hints)
+        return interpreter._invoke(node, func_node, args)
+
+    def probe(node, value):
+        interpreter._emit_probe(getattr(node, 'lineno', '?'), value)
+
+    return {"_apply": apply, "_invoke": invoke, "_resolve": interpreter.resolve, "_probe": probe,
+            "_genv": interpreter.global_env, "_undefined": _undefined, "_unassigned": _unassigned,
+            "_addr": _addr, "_iterate": _iterate, "_index": _index, "_array": np.array, "_matmul": np.matmul}
+
+
+# ==========================================
+#             COMPILER
+# ==========================================
+
+class FunctionCompiler:
+    """
+    Translates one function body into Python source specialized for one
+    argument signature. Quantel locals become Python locals. Kinds flow from
+    the arguments through assignments (repeated until they settle), and an
+    operator whose operand kinds show it cannot fail runs as the plain Python
+    operator; everything else goes through helpers that behave like the
+    interpreter. A local that may be unassigned (or released) falls back to
+    the global of that name, as in the interpreter.
+    """
+
+    def __init__(self, interpreter, func_node, key):
+        self.interpreter = interpreter
+        self.func = func_node
+        self.key = key
+        self.params = [p.name for p in func_node.params[:len(key)]]
+        self.locals = set(self.params)
+        self._collect_locals(func_node.body)
+        self.kinds = {}
+        self.identifiers = {}  # (prefix, Quantel name) -> Python name
+
+    def build(self):
+        for _ in range(MAX_INFERENCE_PASSES):
+            self.kinds = {name: self.kinds.get(name, BOTTOM) for name in self.locals}
+            for name, kind in zip(self.params, self.key):
+                self.kinds[name] = _join(self.kinds[name], kind)
+            self.changed = False
+            source = self._function()
+            if not self.changed:
+                break
+        else:
+            raise Unsupported("kinds did not settle")
+
+        namespace = _runtime(self.interpreter)
+        namespace.update(self.constants)
+        exec(compile(source, f"<jit {self.func.name}>", "exec"), namespace)
+        compiled = namespace["compiled"]
+        compiled.source = source
+        return compiled
+
+    def _collect_locals(self, node):
+        if isinstance(node, list):
+            for item in node:
+                self._collect_locals(item)
+            return
+        cls = node.__class__.__name__
+        if cls == 'VarDecl':
+            self.locals.add(node.name)
+        elif cls == 'Assignment' and node.target.__class__.__name__ == 'Identifier':
+            self.locals.add(node.target.name)
+        elif cls == 'ForStmt':
+            self.locals.add(node.loop_var)
+        for value in vars(node).values() if hasattr(node, '__dict__') else ():
+            if isinstance(value, list) or hasattr(value, '__dict__'):
+                self._collect_locals(value)
+
+    # ==========================================
+    #             STATEMENTS
+    # ==========================================
+
+    def _function(self):
+        self.lines = []
+        self.constants = {}
+        self.reads = set()  # Globals to fetch on entry; a call cannot rebind them
+        self.loops = []
+        self.counter = 0
+        bound = {name for name, kind in zip(self.params, self.key) if kind is not None}
+        self._block(self._statements(self.func.body), bound, 1)
+        if not self.lines[-1].startswith("    return "):
+            self.lines.append("    return None")
+
+        args = ", ".join(f"{self._local(name)}=None" for name in self.params)
+        header = [f"def compiled({args}):"]
+        header += [f"    {self._global(name)} = _genv.get({name!r})" for name in sorted(self.reads)]
+        others = sorted(self.locals - set(self.params))
+        if others:
+            header.append("    " + " = ".join(self._local(name) for name in others) + " = None")
+        return "\n".join(header + self.lines) + "\n"
+
+    def _statements(self, body):
+        return body.statements if body.__class__.__name__ == 'Block' else body
+
+    def _emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def _block(self, stmts, bound, depth):
+        """Emits the statements; 'bound' (updated in place) holds the locals known to be set and not None."""
+        start = len(self.lines)
+        if not isinstance(stmts, list):
+            stmts = [stmts]
+        for stmt in stmts:
+            if stmt is None or not hasattr(stmt, '__dict__'):
+                continue
+            self._statement(stmt, bound, depth)
+            for name in getattr(stmt, 'release', None) or ():
+                if name in self.locals:
+                    self._emit(depth, f"{self._local(name)} = None")
+                    bound.discard(name)
+        if len(self.lines) == start:
+            self._emit(depth, "pass")
+
+    def _statement(self, node, bound, depth):
+        cls = node.__class__.__name__
+        method = getattr(self, '_stmt_' + cls, None)
+        if method is None:
+            raise Unsupported(cls)
+        method(node, bound, depth)
+
+    def _store(self, name, code, kind, bound, depth):
+        self._emit(depth, f"{self._local(name)} = {code}")
+        self._assign_kind(name, kind)
+        if kind is None:
+            bound.discard(name)
+        else:
+            bound.add(name)
+
+    def _assign_kind(self, name, kind):
+        current = self.kinds.get(name, BOTTOM)
+        joined = _join(current, kind)
+        if joined is not current and joined != current:
+            self.kinds[name] = joined
+            self.changed = True
+
+    def _stmt_VarDecl(self, node, bound, depth):
+        value = getattr(node, 'value', None)
+        if value is None:
+            self._store(node.name, "None", None, bound, depth)
+            return
+        hints = None
+        if value.__class__.__name__ == 'FuncCall' and value.name == 'load':
+            # Raw binary files take their layout from the declaration
+            hints = {"dtype": node.dtype, "shape": getattr(node.shape, 'dims', None)}
+        code, kind = self._call(value, bound, hints) if hints else self._expr(value, bound)
+        self._store(node.name, code, kind, bound, depth)
+
+    def _stmt_Assignment(self, node, bound, depth):
+        if node.target.__class__.__name__ != 'Identifier':
+            raise Unsupported("assignment to an element or field")
+        name = node.target.name
+        code, kind = self._expr(node.value, bound)
+        if node.op == '=':
+            self._store(name, code, kind, bound, depth)
+            return
+        op = {'+=': '+', '-=': '-', '*=': '*', '/=': '/'}.get(node.op)
+        if op is None:
+            raise Unsupported(node.op)
+        if name in bound:
+            kind = binary_kind(op, self.kinds.get(name), kind)
+            self._store(name, f"{self._local(name)} {op} {code}", kind, bound, depth)
+            return
+        # The value comes first; only the local scope is searched for the target
+        value = self._temp()
+        self._emit(depth, f"{value} = {code}")
+        self._emit(depth, f"if {self._local(name)} is None: _unassigned({name!r})")
+        self._store(name, f"{self._local(name)} {op} {value}", None, bound, depth)
+
+    def _stmt_IfStmt(self, node, bound, depth):
+        code, _ = self._expr(node.condition, bound)
+        self._emit(depth, f"if {code}:")
+        then = set(bound)
+        self._block(self._statements(node.then_block), then, depth + 1)
+        otherwise = set(bound)
+        if node.else_block:
+            self._emit(depth, "else:")
+            self._block(self._statements(node.else_block), otherwise, depth + 1)
+        bound.intersection_update(then & otherwise)
+
+    def _stmt_WhileStmt(self, node, bound, depth):
+        bound -= self._killed(node.body)
+        code, _ = self._expr(node.condition, bound)
+        self._emit(depth, f"while {code}:")
+        self.loops.append('while')
+        self._block(self._statements(node.body), set(bound), depth + 1)
+        self.loops.pop()
+
+    def _stmt_RepeatUntilStmt(self, node, bound, depth):
+        if self._continues(node.body):
+            raise Unsupported("continue in repeat")  # Would skip the condition in a Python loop
+        bound -= self._killed(node.body)
+        self._emit(depth, "while True:")
+        self.loops.append('repeat')
+        body = set(bound)
+        self._block(self._statements(node.body), body, depth + 1)
+        self.loops.pop()
+        code, _ = self._expr(node.condition, body)
+        self._emit(depth + 1, f"if {code}: break")
+
+    def _stmt_ForStmt(self, node, bound, depth):
+        bound -= self._killed(node.body) | {node.loop_var}
+        iterable = node.range
+        if iterable.__class__.__name__ == 'Range':
+            parts = [f"int({self._expr(iterable.start, bound)[0]})", f"int({self._expr(iterable.end, bound)[0]})"]
+            if iterable.step:
+                parts.append(f"int({self._expr(iterable.step, bound)[0]})")
+            source, kind = f"range({', '.join(parts)})", int
+        else:
+            code, kind = self._expr(iterable, bound)
+            source = f"_iterate({code}, {node.lineno!r})"
+            kind = self._element_kind(kind)
+        self._assign_kind(node.loop_var, kind)
+        self._emit(depth, f"for {self._local(node.loop_var)} in {source}:")
+        body = set(bound)
+        if kind is not None:
+            body.add(node.loop_var)
+        self.loops.append('for')
+        self._block(self._statements(node.body), body, depth + 1)
+        self.loops.pop()
+
+    def _element_kind(self, kind):
+        # Iterating an array yields its rows: views, or numpy scalars for a vector
+        if not isinstance(kind, tuple) or kind[0] is not np.ndarray or not kind[2]:
+            return None
+        dtype, shape = kind[1], kind[2]
+        return (np.ndarray, dtype, shape[1:]) if len(shape) > 1 else (dtype.type, dtype, ())
+
+    def _stmt_Break(self, node, bound, depth):
+        if not self.loops:
+            raise Unsupported("break outside a loop")
+        self._emit(depth, "break")
+
+    def _stmt_Continue(self, node, bound, depth):
+        if not self.loops:
+            raise Unsupported("continue outside a loop")
+        self._emit(depth, "continue")
+
+    def _stmt_Return(self, node, bound, depth):
+        code = self._expr(node.value, bound)[0] if node.value else "None"
+        self._emit(depth, f"return {code}")
+
+    def _stmt_ExprStmt(self, node, bound, depth):
+        if node.expr:
+            self._emit(depth, self._expr(node.expr, bound)[0])
+
+    def _stmt_Probe(self, node, bound, depth):
+        self._emit(depth, f"_probe({self._constant(node)}, {self._expr(node.target, bound)[0]})")
+
+    def _stmt_Block(self, node, bound, depth):
+        self._block(node.statements, bound, depth)
+
+    def _killed(self, body):
+        """Locals a loop body may leave unset or None, so they are not known to be set at its start."""
+        killed = set()
+
+        def walk(node):
+            if isinstance(node, list):
+                for item in node:
+                    walk(item)
+                return
+            if not hasattr(node, '__dict__'):
+                return
+            killed.update(name for name in getattr(node, 'release', None) or () if name in self.locals)
+            cls = node.__class__.__name__
+            name = None
+            if cls == 'VarDecl':
+                name = node.name
+                if getattr(node, 'value', None) is None:
+                    killed.add(name)
+            elif cls == 'Assignment' and node.target.__class__.__name__ == 'Identifier':
+                name = node.target.name
+            elif cls == 'ForStmt':
+                name = node.loop_var
+            if name is not None and self.kinds.get(name, BOTTOM) in (None, BOTTOM):
+                killed.add(name)
+            for value in vars(node).values():
+                walk(value)
+
+        walk(body)
+        return killed
+
+    def _continues(self, body):
+        # A 'continue' that belongs to this loop rather than one nested in it
+        if isinstance(body, list):
+            return any(self._continues(item) for item in body)
+        cls = body.__class__.__name__
+        if cls == 'Continue':
+            return True
+        if cls in ('WhileStmt', 'RepeatUntilStmt', 'ForStmt') or not hasattr(body, '__dict__'):
+            return False
+        return any(self._continues(v) for v in vars(body).values() if isinstance(v, list) or hasattr(v, '__dict__'))
+
+    # ==========================================
+    #             EXPRESSIONS
+    # ==========================================
+
+    def _expr(self, node, bound, into_buffer=False):
+        """Python source for the expression and the kind of its value."""
+        if node is None:
+            return "None", None
+        if isinstance(node, (int, float, str, bool, np.number)):
+            return self._literal(node)
+        cls = node.__class__.__name__
+        if cls in ('BinOp', 'CompareOp'):
+            return self._binop(node, bound, into_buffer)
+        method = getattr(self, '_expr_' + cls, None)
+        if method is None:
+            raise Unsupported(cls)
+        return method(node, bound)
+
+    def _literal(self, value):
+        if type(value) in (bool, int, str) or type(value) is float and np.isfinite(value):
+            return repr(value), kind_of(value)
+        return self._constant(value), kind_of(value)
+
+    def _constant(self, value):
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def _local(self, name):
+        return self._identifier('v', name)
+
+    def _global(self, name):
+        return self._identifier('g', name)
+
+    def _identifier(self, prefix, name):
+        # Renamed and specialized names ('x$1', 'f$spec2') are not Python identifiers
+        key = (prefix, name)
+        ident = self.identifiers.get(key)
+        if ident is None:
+            ident = self.identifiers[key] = f"{prefix}{len(self.identifiers)}_{re.sub(r'[^0-9A-Za-z_]', '_', name)}"
+        return ident
+
+    def _temp(self):
+        self.counter += 1
+        return f"_t{self.counter}"
+
+    def _expr_Literal(self, node, bound):
+        return self._literal(node.value)
+
+    def _expr_Identifier(self, node, bound):
+        name = node.name
+        if name in bound:
+            return self._local(name), self.kinds.get(name)
+        self.reads.add(name)
+        missing = f"_undefined({name!r}, {getattr(node, 'lineno', '?')!r})"
+        fallback = f"{self._global(name)} if {self._global(name)} is not None else {missing}"
+        if name in self.locals:
+            return f"({self._local(name)} if {self._local(name)} is not None else {fallback})", None
+        return f"({fallback})", None
+
+    def _binop(self, node, bound, into_buffer):
+        fn, buffer_left, buffer_right = self.interpreter._plan_binop(node)
+        left, left_kind = self._expr(node.left, bound, buffer_left)
+        right, right_kind = self._expr(node.right, bound, buffer_right)
+        kind = binary_kind(node.op, left_kind, right_kind)
+        if not into_buffer and _inline(node.op, left_kind, right_kind, kind):
+            if node.op == '@':
+                return f"_matmul({left}, {right})", kind
+            return f"({left} {PY_OPS[node.op]} {right})", kind
+        fn = self._constant(fn) if fn is not None else "None"
+        flag = ", True" if into_buffer else ""
+        return f"_apply({self._constant(node)}, {fn}, {left}, {right}{flag})", kind
+
+    def _expr_UnaryOp(self, node, bound):
+        code, kind = self._expr(node.operand, bound)
+        result = unary_kind(node.op, kind)
+        if node.op == '-':
+            return f"(-{code})", result
+        if node.op == '!':
+            return f"(not {code})", result
+        if node.op == '&':
+            return f"_addr({code})", result
+        return code, result
+
+    def _expr_ArrayAccess(self, node, bound):
+        target, kind = self._expr(node.name, bound)
+        index = node.index
+        if hasattr(index, 'start'):  # It's a Slice node
+            code, _ = self._expr_Slice(index, bound)
+            return f"_index({self._constant(node)}, {target}, {code})", None
+        if isinstance(index, list):
+            parts = [self._expr(x, bound) for x in index]
+            code = "(" + "".join(f"{c}, " for c, _ in parts) + ")"
+        else:
+            parts = [self._expr(index, bound)]
+            code = parts[0][0]
+        return f"_index({self._constant(node)}, {target}, {code})", self._element_access(kind, [k for _, k in parts])
+
+    def _element_access(self, kind, indices):
+        # Integer indices into an array of known shape: a smaller array, or a numpy scalar
+        if not isinstance(kind, tuple) or kind[0] is not np.ndarray or len(indices) > len(kind[2]):
+            return None
+        for index in indices:
+            if index not in (int,) and not (isinstance(index, tuple) and index[2] == () and index[1].kind in 'iu'):
+                return None
+        dtype, shape = kind[1], kind[2][len(indices):]
+        return (np.ndarray, dtype, shape) if shape else (dtype.type, dtype, ())
+
+    def _expr_Slice(self, node, bound):
+        start = self._expr(node.start, bound)[0] if node.start is not None else "0"
+        end = self._expr(node.end, bound)[0] if node.end is not None else "None"
+        return f"slice(int({start}), int({end}))", None
+
+    def _expr_ArrayLiteral(self, node, bound):
+        return f"_array([{', '.join(self._expr(e, bound)[0] for e in node.elements)}])", None
+
+    def _expr_FuncCall(self, node, bound):
+        return self._call(node, bound, None)
+
+    def _call(self, node, bound, hints):
+        args = node.args
+        params = getattr(self.interpreter.global_env.get(node.name), 'params', None)
+        if params is not None and len(args) != len(params):
+            raise Unsupported("arity mismatch")  # The interpreter does not evaluate extra arguments
+        site = self._constant(node)
+        codes = "".join(f"{self._expr(a, bound)[0]}, " for a in args)
+        hints = self._constant(hints) if hints else "{}"
+        # The callee is looked up before its arguments are evaluated, as in the interpreter
+        return f"_invoke({site}, _resolve({site}), [{codes}], {hints})", None
@@ -1,3 +1,5 @@
+import sys
+
 from sly import Lexer
 
 class QuantelLexer(Lexer):
@@ -119,6 +121,8 @@ class QuantelLexer(Lexer):
     @_(r'[a-zA-Z_][a-zA-Z0-9_]*')
     def ID(self, t):
         t.type = self.keywords.get(t.value, 'ID')
+        if t.type == 'ID':
+            t.value = sys.intern(t.value)  # Symbol tables hash these on every lookup
         return t
 
     @_(r'\".*?\"')
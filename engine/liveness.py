@@ -0,0 +1,169 @@
+from engine.ast import Node
+from engine.cfg import CFGBuilder
+
+# Statements that run as one instruction; only these carry release lists
+SIMPLE_STATEMENTS = ('VarDecl', 'Assignment', 'ExprStmt', 'Probe')
+
+
+class LivenessResult:
+    def __init__(self):
+        self.dead = {}       # id(statement) -> statement whose stored value is never read
+        self.release = {}    # id(statement) -> (statement, names not live after it)
+
+
+class LiveVariables:
+    """
+    Backward strong liveness over the CFG of the program and of every function.
+    A variable is live where a later read may still see its current value.
+    Reads made by a store that is itself dead do not count, so a chain of
+    stores that only feed each other dies as a whole.
+
+    Functions write locals only, so nothing they assign is live when they
+    return. At the end of the program the globals in 'exit_live' stay live;
+    None keeps every global, for callers that inspect global_env afterwards.
+    """
+
+    def __init__(self, removable, external=(), exit_live=None):
+        self.removable = removable  # Instr -> True if the store may be deleted when dead
+        self.external = set(external)
+        self.exit_live = exit_live
+
+    def analyze(self, program):
+        result = LivenessResult()
+        # Live sets are ints with one bit per name, so a block costs one int however many globals are live
+        self.bits = {}
+        graphs = CFGBuilder(self.external).build(program)
+        # A call may run any function, and functions read globals directly
+        self.call_reads = set()
+        for stmt in program.statements:
+            if stmt.__class__.__name__ == 'FuncDecl':
+                self.call_reads |= self._names_read(stmt.body, with_calls=False)
+
+        for n, cfg in enumerate(graphs):
+            self.reads = {}
+            if n > 0:
+                at_exit = set()
+            elif self.exit_live is None:
+                # Every global this program touches, including ones an earlier REPL input defined
+                at_exit = self._names_read(program.statements, with_calls=False) | self.external
+                at_exit |= {i.name for b in cfg.blocks for i in b.instrs if i.kind in ('def', 'kill')}
+            else:
+                at_exit = set(self.exit_live)
+            self._collect(cfg, self._solve(cfg, self._mask(at_exit)), result)
+        return result
+
+    # ==========================================
+    #             DATAFLOW
+    # ==========================================
+
+    def _solve(self, cfg, at_exit):
+        """Returns live-out per block index, as a bit mask."""
+        live_in = {}
+        work = list(cfg.blocks)
+        pending = {block.index for block in work}
+        while work:
+            block = work.pop()
+            pending.discard(block.index)
+            new_in = self._transfer(block, self._live_out(block, cfg, at_exit, live_in), None)
+            if new_in != live_in.get(block.index):
+                live_in[block.index] = new_in
+                for pred in block.preds:
+                    if pred.index not in pending:
+                        pending.add(pred.index)
+                        work.append(pred)
+        return {block.index: self._live_out(block, cfg, at_exit, live_in) for block in cfg.blocks}
+
+    def _live_out(self, block, cfg, at_exit, live_in):
+        live = at_exit if block is cfg.exit else 0
+        for succ in block.succs:
+            live |= live_in.get(succ.index, 0)
+        return live
+
+    def _transfer(self, block, live_out, visit):
+        """
+        Walks the block backwards from live_out. 'visit(instr, live_after)' is
+        called for every instruction on the final walk.
+        """
+        live = live_out
+        if block.cond is not None:
+            live |= self._mask(self._names_read(block.cond))
+        for instr in reversed(block.instrs):
+            if visit is not None:
+                visit(instr, live)
+            if instr.kind == 'def':
+                bit = self._bit(instr.name)
+                if not live & bit and self.removable(instr):
+                    continue  # Dead store: what it reads is not needed for it
+                live &= ~bit
+            # Kills keep the variable live: x[i] = v leaves the rest of x in place
+            live |= self._mask(self._instr_reads(instr))
+        return live
+
+    def _collect(self, cfg, live_out, result):
+        def visit(instr, live_after):
+            node = instr.node
+            if node is None:
+                return
+            if instr.kind == 'def' and not live_after & self._bit(instr.name) and self.removable(instr):
+                result.dead[id(node)] = node
+                return
+            if node.__class__.__name__ not in SIMPLE_STATEMENTS:
+                return
+            touched = set(self._instr_reads(instr))
+            if instr.kind in ('def', 'kill'):
+                touched.add(instr.name)
+            names = {name for name in touched if not live_after & self._bit(name)}
+            if names:
+                _, previous = result.release.get(id(node), (node, set()))
+                result.release[id(node)] = (node, previous | names)
+
+        for block in cfg.blocks:
+            self._transfer(block, live_out[block.index], visit)
+
+    # ==========================================
+    #             READS
+    # ==========================================
+
+    def _bit(self, name):
+        bit = self.bits.get(name)
+        if bit is None:
+            bit = self.bits[name] = 1 << len(self.bits)
+        return bit
+
+    def _mask(self, names):
+        mask = 0
+        for name in names:
+            mask |= self._bit(name)
+        return mask
+
+    def _instr_reads(self, instr):
+        key = id(instr)
+        if key not in self.reads:
+            names = self._names_read(instr.expr) if instr.expr is not None else set()
+            if instr.kind == 'def' and instr.op != '=':
+                names.add(instr.name)
+            if instr.node.__class__.__name__ == 'PointerDecl':
+                names.add(instr.node.target)
+            self.reads[key] = names
+        return self.reads[key]
+
+    def _names_read(self, node, with_calls=True):
+        """Every name an expression reads, '&x' included (it reads x's current value)."""
+        names = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, Node):
+                continue
+            cls = node.__class__.__name__
+            if cls == 'Identifier':
+                names.add(node.name)
+            elif cls == 'PointerDecl':
+                names.add(node.target)
+            elif cls == 'FuncCall' and with_calls:
+                names |= self.call_reads
+            stack.extend(v for v in vars(node).values() if isinstance(v, (list, Node)))
+        return names
@@ -0,0 +1,115 @@
+import sys
+
+import numpy as np
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+def sizeof_value(val):
+    """Bytes owned by a runtime value (array buffers, record fields, strings)."""
+    if isinstance(val, np.ndarray):
+        # File-backed arrays do not live on the interpreter heap
+        if isinstance(val, np.memmap):
+            return 0
+        return val.nbytes
+    if isinstance(val, dict):
+        return sys.getsizeof(val) + sum(sizeof_value(v) for v in val.values())
+    if isinstance(val, (list, tuple)):
+        return sys.getsizeof(val) + sum(sizeof_value(v) for v in val)
+    if isinstance(val, (int, float, str, bool, np.generic)):
+        return sys.getsizeof(val)
+    return 0
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+
+class MemoryTracker:
+    """
+    Accounts for the values bound to interpreter variables.
+
+    Objects are counted once no matter how many variables refer to them, so
+    'auto b = a;' does not double the live total. Temporaries that are never
+    stored in a variable are not tracked.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget        # Hard limit in bytes, or None
+        self.current = 0
+        self.peak = 0
+        self.peak_line = None
+        self.vars = {}              # (scope, name) -> id(value)
+        self.objects = {}           # id(value) -> [value, bytes, refs]
+        self.line_allocs = {}       # lineno -> [count, bytes]
+
+    def store(self, scope, name, value, lineno=None):
+        key = (scope, name)
+        new_id = id(value)
+        old_id = self.vars.get(key)
+        if old_id == new_id:
+            return
+
+        entry = self.objects.get(new_id)
+        if entry is None:
+            size = sizeof_value(value)
+            self.objects[new_id] = [value, size, 1]
+            self.current += size
+            if size and lineno is not None:
+                stats = self.line_allocs.setdefault(lineno, [0, 0])
+                stats[0] += 1
+                stats[1] += size
+        else:
+            entry[2] += 1
+        self.vars[key] = new_id
+
+        if old_id is not None:
+            self._unref(old_id)
+
+        if self.current > self.peak:
+            self.peak = self.current
+            self.peak_line = lineno
+
+        if self.budget is not None and self.current > self.budget:
+            # Drop the offending binding so the tracker stays consistent with the abort
+            self.release(scope, name)
+            raise MemoryBudgetExceeded(
+                f"Memory Error (Line {lineno if lineno is not None else '?'}): storing '{name}' "
+                f"exceeds the memory budget of {format_bytes(self.budget)}")
+
+    def release(self, scope, name):
+        old_id = self.vars.pop((scope, name), None)
+        if old_id is not None:
+            self._unref(old_id)
+
+    def release_scope(self, scope):
+        for key in [k for k in self.vars if k[0] == scope]:
+            self._unref(self.vars.pop(key))
+
+    def _unref(self, obj_id):
+        entry = self.objects[obj_id]
+        entry[2] -= 1
+        if entry[2] == 0:
+            self.current -= entry[1]
+            del self.objects[obj_id]
+
+    # ==========================================
+    #             REPORTING
+    # ==========================================
+    def variable_bytes(self, scope):
+        """name -> bytes for every variable bound in the given scope."""
+        return {name: self.objects[obj_id][1] for (s, name), obj_id in self.vars.items() if s == scope}
+
+    def report(self):
+        return {
+            "current": self.current,
+            "peak": self.peak,
+            "peak_line": self.peak_line,
+            "budget": self.budget,
+            "line_allocs": dict(sorted(self.line_allocs.items())),
+        }
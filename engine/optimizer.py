@@ -1,23 +1,479 @@
 import copy
-from engine.ast import Literal, Assignment, Identifier, Block, VarDecl
+import math
+import sys
+import time
+
+import numpy as np
+
+from engine.ast import (Node, Literal, Assignment, Identifier, Block, VarDecl, ExprStmt, ForStmt, Range,
+                        BinOp, IfStmt, structural_key)
+from engine.def_use import DefUseIndex, assignment_base
+from engine.sccp import SparseConditionalConstants
+from engine.liveness import LiveVariables
+from engine.partial_eval import PartialEvaluator, pure_functions
+from engine import const_eval, shapes
+from engine.const_eval import ConstantFoldError
+from engine.tracer import trace_span
+from engine.value_kinds import ValueKinds, ArrayKind, SCALAR_KINDS
+
+
+class OptimizationPass:
+    def __init__(self, name, method, requires, summary):
+        self.name = name
+        self.method = method        # Name of the QuantelOptimizer method that runs it
+        self.requires = requires    # Passes that must run before this one
+        self.summary = summary
+
+
+# name -> OptimizationPass, in pipeline order. A pass may only require passes
+# registered before it, so registration order is always a valid schedule.
+PASSES = {}
+
+
+def optimization_pass(name, requires=(), summary=""):
+    def register(method):
+        for dep in requires:
+            if dep not in PASSES:
+                raise ValueError(f"Pass '{name}' requires '{dep}', which is not registered before it")
+        PASSES[name] = OptimizationPass(name, method.__name__, tuple(requires), summary)
+        return method
+    return register
+
+
+OPT_LEVELS = {
+    0: (),
+    1: ("fold", "dce", "propagate", "simplify", "dse"),
+    2: ("inline", "fold", "unroll", "ipcp", "dce", "sccp", "propagate", "simplify", "cse", "licm", "dse"),
+    3: ("inline", "fold", "unroll", "ipcp", "dce", "sccp", "propagate", "simplify", "cse", "licm", "dse"),
+}
+DEFAULT_OPT_LEVEL = 2
+
+# -O3 runs the same passes as -O2 with larger size limits: more code, fewer calls and loops
+OPT_LEVEL_LIMITS = {
+    3: {"inline_node_limit": 120, "unroll_limit": 32, "unroll_body_limit": 120,
+        "unroll_growth_limit": 960, "unroll_budget": 8000, "partial_eval_budget": 20000,
+        "partial_eval_total": 200000, "specialize_limit": 32},
+}
+
+
+def resolve_passes(names):
+    """Adds the passes 'names' depend on and returns them all in pipeline order."""
+    selected, stack = set(), list(names)
+    while stack:
+        name = stack.pop()
+        if name not in PASSES:
+            raise ValueError(f"Unknown optimization pass '{name}' (available: {', '.join(PASSES)})")
+        if name not in selected:
+            selected.add(name)
+            stack.extend(PASSES[name].requires)
+    return [name for name in PASSES if name in selected]
 
 
 class QuantelOptimizer:
-    def __init__(self):
+    """
+    Runs the passes selected by an optimization level (or an explicit list),
+    each exactly once, in the order they are registered:
+
+      inline     Substitutes small non-recursive functions at their call sites.
+      fold       One structural walk: constant folding and straight-line
+                 constant propagation.
+      unroll     Replaces for loops with a few constant iterations by copies of
+                 the body, each folded with the loop variable known.
+      ipcp       Runs pure calls with constant arguments at compile time, and
+                 calls with some constant arguments into specialized clones.
+      dce        Removes branches and loops whose constant condition never lets them run.
+      sccp       Sparse conditional constant propagation on an SSA-form CFG:
+                 finds constants that survive branches and loops.
+      propagate  Def-use worklist: substitutes variables with a single constant
+                 definition and refolds only the expressions that contained them.
+      simplify   Algebraic identities and strength reduction (x * 1, x ^ 2 -> x * x),
+                 guarded by the value kinds of the operands.
+      cse        Value numbering: identical pure expressions are computed once
+                 into a temporary, within a block and in the blocks it dominates.
+      licm       Hoists loop-invariant pure expressions into temporaries
+                 computed once before the loop; those that may raise only
+                 behind a while loop's own condition.
+      dse        Liveness: deletes pure stores that are never read and marks where
+                 each variable is used for the last time, so it can be released.
+
+    Every pass reports its wall time, the nodes it visited and the rewrites it applied.
+    """
+
+    INLINE_NODE_LIMIT = 40     # Bodies larger than this are cheaper to call than to copy
+    UNROLL_LIMIT = 10          # Most iterations a loop may have to be fully unrolled
+    UNROLL_BODY_LIMIT = 60     # Bodies larger than this are never copied
+    UNROLL_GROWTH_LIMIT = 240  # Nodes unrolling one loop may add
+    UNROLL_BUDGET = 2000       # Nodes the whole unroll pass may add
+    UNROLL_FACTORS = (4, 2)    # Partial unrolling factors, best first
+    PARTIAL_EVAL_BUDGET = 5000   # Nodes one compile-time call may visit before it is left to run time
+    PARTIAL_EVAL_TOTAL = 50000   # Nodes all compile-time calls together may visit
+    SPECIALIZE_LIMIT = 8         # Specialized function clones per program
+    SPECIALIZE_NODE_LIMIT = 200  # Larger functions are never cloned
+
+    def __init__(self, tracer=None, external=(), level=DEFAULT_OPT_LEVEL, passes=None, analyzer=None,
+                 exit_live=None):
+        if level not in OPT_LEVELS:
+            raise ValueError(f"Unknown optimization level {level} (use 0-{max(OPT_LEVELS)})")
         self.changed = False
         self.constants = {}  # Tracks variable name -> constant value
+        self.tracer = tracer
+        self.external = set(external)  # Globals bound at run time; their initializers are not propagated
+        # Tensor file headers SemanticAnalyzer read, so loaded arrays have a known dtype and shape
+        self.load_headers = analyzer.load_headers if analyzer is not None else {}
+        # Globals still needed once the program ends (None: all of them, e.g. for the REPL or batch output)
+        self.exit_live = exit_live
+        self.level = level
+        self.passes = resolve_passes(OPT_LEVELS[level] if passes is None else passes)
+        self.inline_node_limit = self.INLINE_NODE_LIMIT
+        self.unroll_limit = self.UNROLL_LIMIT
+        self.unroll_body_limit = self.UNROLL_BODY_LIMIT
+        self.unroll_growth_limit = self.UNROLL_GROWTH_LIMIT
+        self.unroll_budget = self.UNROLL_BUDGET
+        self.partial_eval_budget = self.PARTIAL_EVAL_BUDGET
+        self.partial_eval_total = self.PARTIAL_EVAL_TOTAL
+        self.specialize_limit = self.SPECIALIZE_LIMIT
+        self.specialize_node_limit = self.SPECIALIZE_NODE_LIMIT
+        for attr, value in OPT_LEVEL_LIMITS.get(level, {}).items():
+            setattr(self, attr, value)
+        self.pass_stats = []
+        self.rewrites = 0
+        self.visited = 0
+        self.details = {}  # Pass-specific counters, merged into that pass's stats
+        self.temp_counter = 0
 
     def optimize(self, node):
-        iteration = 0
-        while True:
-            self.changed = False
-            self.constants = {}  # Reset for each pass
-            node = self.visit(node)
-            iteration += 1
-            if not self.changed or iteration > 10:
-                break
+        self.changed = False
+        self.pass_stats = []
+        for name in self.passes:
+            node = self._run_pass(name, getattr(self, PASSES[name].method), node)
         return node
 
+    def _run_pass(self, name, run, node):
+        self.rewrites = 0
+        self.visited = 0
+        self.details = {}
+        with trace_span(self.tracer, name, "optimizer") as result:
+            start = time.perf_counter()
+            node = run(node)
+            elapsed = time.perf_counter() - start
+            result["visited"] = self.visited
+            result["rewrites"] = self.rewrites
+            result.update(self.details)
+        stats = {"pass": name, "ms": round(elapsed * 1000.0, 3), "visited": self.visited, "rewrites": self.rewrites}
+        stats.update(self.details)
+        self.pass_stats.append(stats)
+        if self.rewrites:
+            self.changed = True
+        return node
+
+    def _rewrote(self):
+        self.rewrites += 1
+
+    # ==========================================
+    #       PASS 0: INLINING
+    # ==========================================
+
+    @optimization_pass("inline", summary="substitute small non-recursive functions at call sites")
+    def _inline_pass(self, tree):
+        self.details = {"inlined": 0}
+        if tree.__class__.__name__ != 'Program':
+            return tree
+        funcs = {s.name: s for s in tree.statements if s.__class__.__name__ == 'FuncDecl'}
+        if not funcs:
+            return tree
+
+        calls = {name: self._called_functions(func.body) & funcs.keys() for name, func in funcs.items()}
+        self.inline_funcs = funcs
+        self.inline_info = {}
+        self.inline_recursive = {name for name in funcs if self._reaches(name, name, calls)}
+
+        # Callees first, so a body is already flattened when it gets copied
+        for name in self._callee_order(calls):
+            func = funcs[name]
+            locals_ = self._function_locals(func)
+            func.body.statements = self._inline_statements(func.body.statements, locals_)
+        tree.statements = self._inline_statements(tree.statements, None)
+        return tree
+
+    def _called_functions(self, node):
+        names = set()
+        if isinstance(node, list):
+            for item in node: names |= self._called_functions(item)
+        elif hasattr(node, '__dict__'):
+            if node.__class__.__name__ == 'FuncCall':
+                names.add(node.name)
+            for value in vars(node).values():
+                if isinstance(value, list) or hasattr(value, '__dict__'):
+                    names |= self._called_functions(value)
+        return names
+
+    def _reaches(self, start, target, calls):
+        seen, stack = set(), list(calls[start])
+        while stack:
+            name = stack.pop()
+            if name == target:
+                return True
+            if name not in seen:
+                seen.add(name)
+                stack.extend(calls.get(name, ()))
+        return False
+
+    def _callee_order(self, calls):
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen: return
+            seen.add(name)
+            for callee in calls[name]: visit(callee)
+            order.append(name)
+
+        for name in calls: visit(name)
+        return order
+
+    def _function_locals(self, func):
+        names = {p.name for p in func.params}
+        return names | self._assigned_names(func.body)
+
+    def _inline_statements(self, statements, caller_locals):
+        result = []
+        for stmt in statements:
+            self.visited += 1
+            cls = stmt.__class__.__name__
+            if cls == 'FuncDecl':
+                result.append(stmt)
+                continue
+            if cls == 'Block':
+                stmt.statements = self._inline_statements(stmt.statements, caller_locals)
+            for value in vars(stmt).values():
+                if value.__class__.__name__ == 'Block':
+                    value.statements = self._inline_statements(value.statements, caller_locals)
+
+            if cls == 'ExprStmt' and stmt.expr.__class__.__name__ == 'FuncCall':
+                # A bare call statement keeps no value, so any function shape can be spliced in
+                args_pre, blocked = [], [False]
+                stmt.expr.args = [self._inline_expr(arg, caller_locals, args_pre, blocked) for arg in stmt.expr.args]
+                inlined = None if blocked[0] else self._inline_call(stmt.expr, caller_locals, want_value=False)
+                result.extend(args_pre)
+                if inlined is not None:
+                    result.extend(inlined[0])
+                else:
+                    result.append(stmt)
+                continue
+
+            pre = []
+            if cls != 'WhileStmt':  # A while condition runs again on every iteration
+                for owner, attr in self._expression_slots(stmt):
+                    setattr(owner, attr, self._inline_expr(getattr(owner, attr), caller_locals, pre))
+            result.extend(pre)
+            result.append(stmt)
+        return result
+
+    def _inline_expr(self, expr, caller_locals, pre, blocked=None):
+        """
+        Inlines calls in evaluation order. A call is only inlined while every
+        call evaluated before it (outside its own arguments) was inlined too,
+        so side effects keep their order once the bodies move ahead of the statement.
+        """
+        blocked = blocked if blocked is not None else [False]
+
+        def walk(node):
+            if not hasattr(node, '__dict__') or (node.__class__.__name__ == 'UnaryOp' and node.op == '&'):
+                return node
+            self.visited += 1
+            if node.__class__.__name__ == 'FuncCall':
+                blocked_before = blocked[0]
+                node.args = [walk(arg) for arg in node.args]
+                inlined = None if blocked_before else self._inline_call(node, caller_locals, want_value=True)
+                if inlined is None:
+                    blocked[0] = True
+                    return node
+                blocked[0] = blocked_before
+                pre.extend(inlined[0])
+                return Identifier(inlined[1], lineno=node.lineno)
+            for attr, value in vars(node).items():
+                if isinstance(value, list):
+                    setattr(node, attr, [walk(item) for item in value])
+                elif hasattr(value, '__dict__'):
+                    setattr(node, attr, walk(value))
+            return node
+
+        return walk(expr)
+
+    def _inline_call(self, call, caller_locals, want_value):
+        """Returns (statements, result variable) replacing 'call', or None if it must stay a call."""
+        func = self.inline_funcs.get(call.name)
+        if func is None or call.name in self.inline_recursive or len(call.args) != len(func.params):
+            return None
+        if call.name not in self.inline_info:
+            self.inline_info[call.name] = self._inline_candidate(func)
+        info = self.inline_info[call.name]
+        if info is None or (want_value and not info['returns_value']):
+            return None
+        # The callee reads these from globals; a caller local of the same name would capture them
+        if caller_locals is not None and info['free'] & caller_locals:
+            return None
+
+        prefix = self._new_temp("inl")
+        rename = {name: f"{prefix}_{name}" for name in info['locals']}
+        result = f"{prefix}_ret"
+
+        statements = [VarDecl(p.dtype, p.shape, rename[p.name], arg, lineno=call.lineno)
+                      for p, arg in zip(func.params, call.args)]
+        body = self._clone(func.body.statements)
+        self._rename_locals(body, rename)
+        statements.extend(self._tail_returns(body, result if want_value else None))
+
+        self.details["inlined"] += 1
+        self._rewrote()
+        return statements, result
+
+    def _inline_candidate(self, func):
+        """Facts needed to inline 'func', or None when it is too big or has an unsupported shape."""
+        body = func.body.statements
+        if self._count_nodes(body) > self.inline_node_limit:
+            return None
+        if self._contains(body, ('FuncDecl', 'RecordDecl')):
+            return None
+        # Every return must be the last thing on its path, so it can become an assignment
+        if self._count_class(body, 'Return') != self._tail_return_count(body):
+            return None
+
+        params = {p.name for p in func.params}
+        locals_ = params | self._assigned_names(body)
+        declared = set(params)
+        reads = set()
+        if not self._scan_locals(body, locals_, declared, reads):
+            return None
+        return {'locals': locals_, 'free': reads - locals_, 'returns_value': self._always_returns(body)}
+
+    def _scan_locals(self, node, locals_, declared, reads):
+        """
+        Walks in source order. Fails when a local is read before its declaration
+        (it would have read the global) or a name is assigned without being declared
+        (the interpreter makes it a local, renaming would not).
+        """
+        if isinstance(node, list):
+            return all(self._scan_locals(item, locals_, declared, reads) for item in node)
+        if not hasattr(node, '__dict__'):
+            return True
+        cls = node.__class__.__name__
+        if cls == 'Identifier':
+            reads.add(node.name)
+            return node.name not in locals_ or node.name in declared
+        if cls == 'Assignment':
+            base = assignment_base(node.target)
+            if not self._scan_locals(node.value, locals_, declared, reads):
+                return False
+            return base in declared and self._scan_locals(node.target, locals_, declared, reads)
+        if cls == 'PointerDecl':
+            reads.add(node.target)
+            if node.target in locals_ and node.target not in declared:
+                return False
+            declared.add(node.name)
+            return True
+        if cls == 'VarDecl':
+            ok = self._scan_locals(node.value, locals_, declared, reads)
+            declared.add(node.name)
+            return ok
+        if cls == 'ForStmt':
+            ok = self._scan_locals(node.range, locals_, declared, reads)
+            declared.add(node.loop_var)
+            return ok and self._scan_locals(node.body, locals_, declared, reads)
+        return all(self._scan_locals(value, locals_, declared, reads) for value in vars(node).values()
+                   if isinstance(value, list) or hasattr(value, '__dict__'))
+
+    def _rename_locals(self, node, rename):
+        if isinstance(node, list):
+            for item in node: self._rename_locals(item, rename)
+            return
+        if not hasattr(node, '__dict__'):
+            return
+        cls = node.__class__.__name__
+        if cls in ('Identifier', 'VarDecl', 'PointerDecl') and node.name in rename:
+            node.name = rename[node.name]
+        if cls == 'PointerDecl' and node.target in rename:
+            node.target = rename[node.target]
+        if cls == 'ForStmt' and node.loop_var in rename:
+            node.loop_var = rename[node.loop_var]
+        for value in vars(node).values():
+            if isinstance(value, list) or hasattr(value, '__dict__'):
+                self._rename_locals(value, rename)
+
+    def _tail_returns(self, statements, result):
+        """Rewrites tail 'return e;' into 'result = e;' (or just 'e;' when the value is unused)."""
+        if not statements:
+            return statements
+        last = statements[-1]
+        cls = last.__class__.__name__
+        if cls == 'Return':
+            if last.value is None:
+                replacement = []
+            elif result is None:
+                replacement = [ExprStmt(last.value, lineno=last.lineno)]
+            else:
+                replacement = [Assignment(Identifier(result, lineno=last.lineno), '=', last.value, lineno=last.lineno)]
+            return statements[:-1] + replacement
+        if cls == 'IfStmt':
+            for branch in (last.then_block, last.else_block):
+                if branch is not None:
+                    branch.statements = self._tail_returns(branch.statements, result)
+        elif cls == 'Block':
+            last.statements = self._tail_returns(last.statements, result)
+        return statements
+
+    def _tail_return_count(self, statements):
+        if not statements:
+            return 0
+        last = statements[-1]
+        cls = last.__class__.__name__
+        if cls == 'Return':
+            return 1
+        if cls == 'IfStmt':
+            return sum(self._tail_return_count(b.statements) for b in (last.then_block, last.else_block) if b)
+        if cls == 'Block':
+            return self._tail_return_count(last.statements)
+        return 0
+
+    def _always_returns(self, statements):
+        if not statements:
+            return False
+        last = statements[-1]
+        cls = last.__class__.__name__
+        if cls == 'Return':
+            return last.value is not None
+        if cls == 'IfStmt':
+            return (last.else_block is not None and self._always_returns(last.then_block.statements)
+                    and self._always_returns(last.else_block.statements))
+        if cls == 'Block':
+            return self._always_returns(last.statements)
+        return False
+
+    def _count_nodes(self, node):
+        if isinstance(node, list):
+            return sum(self._count_nodes(item) for item in node)
+        if not hasattr(node, '__dict__'):
+            return 0
+        return 1 + sum(self._count_nodes(value) for value in vars(node).values()
+                       if isinstance(value, list) or hasattr(value, '__dict__'))
+
+    def _count_class(self, node, name):
+        if isinstance(node, list):
+            return sum(self._count_class(item, name) for item in node)
+        if not hasattr(node, '__dict__'):
+            return 0
+        return int(node.__class__.__name__ == name) + sum(
+            self._count_class(value, name) for value in vars(node).values()
+            if isinstance(value, list) or hasattr(value, '__dict__'))
+
+    # ==========================================
+    #       PASS 1: FOLD (single walk)
+    # ==========================================
+
+    @optimization_pass("fold", summary="fold constant expressions and propagate straight-line constants")
+    def _fold_pass(self, node):
+        self.constants = {}
+        return self.visit(node)
+
     def visit(self, node):
         if isinstance(node, list):
             res_list = []
@@ -31,6 +487,7 @@ class QuantelOptimizer:
             return res_list
 
         if hasattr(node, '__dict__'):
+            self.visited += 1
             method_name = 'visit_' + node.__class__.__name__
             visitor = getattr(self, method_name, self.generic_visit)
             return visitor(node)
@@ -49,32 +506,51 @@ class QuantelOptimizer:
     def visit_VarDecl(self, node):
         node.value = self.visit(node.value)
         # If we declare 'var x = 50', remember it
-        if self._is_constant(node.value):
+        if self._is_constant(node.value) and node.name not in self.external:
             self.constants[node.name] = node.value.value
+        else:
+            self.constants.pop(node.name, None)
+        return node
+
+    def visit_PointerDecl(self, node):
+        self.constants.pop(node.name, None)
         return node
 
     def visit_Assignment(self, node):
         node.value = self.visit(node.value)
-        target_name = getattr(node.target, 'name', None)
+        target_name = assignment_base(node.target)
 
         if target_name:
-            if self._is_constant(node.value):
+            if node.op == '=' and node.target.__class__.__name__ == 'Identifier' and self._is_constant(node.value):
                 # Update constant map: i = 0
                 self.constants[target_name] = node.value.value
             else:
                 # If variable is assigned something non-constant, forget previous value
-                if target_name in self.constants:
-                    del self.constants[target_name]
+                self.constants.pop(target_name, None)
         return node
 
     def visit_Identifier(self, node):
         # Swap 'i' for '0' if we know 'i' is 0
         if node.name in self.constants:
-            self.changed = True
+            self._rewrote()
             val = self.constants[node.name]
             return Literal(val, lineno=node.lineno)
         return node
 
+    def visit_UnaryOp(self, node):
+        # '&x' takes the address of the variable itself, never of a propagated literal
+        if node.op != '&':
+            node.operand = self.visit(node.operand)
+        return self._try_fold(node)
+
+    def visit_FuncDecl(self, node):
+        # The body runs at call time, when the caller's straight-line constants no longer hold
+        saved = self.constants
+        self.constants = {}
+        node.body = self.visit(node.body)
+        self.constants = saved
+        return node
+
     # --- Structural Optimizations ---
 
     def visit_Block(self, node):
@@ -94,68 +570,1090 @@ class QuantelOptimizer:
         node.statements = new_statements
         return node
 
+    def visit_ArrayLiteral(self, node):
+        node.elements = [self.visit(el) for el in node.elements]
+        if all(self._is_constant(el) for el in node.elements):
+            # Built once here instead of by np.array(...) on every evaluation
+            try:
+                value = const_eval.array_literal(el.value for el in node.elements)
+            except ConstantFoldError:
+                return node
+            self._rewrote()
+            return Literal(value, lineno=node.lineno)
+        return node
+
     def visit_BinOp(self, node):
         node.left = self.visit(node.left)
         node.right = self.visit(node.right)
-        if self._is_constant(node.left) and self._is_constant(node.right):
-            val = self._evaluate_binop(node.op, node.left.value, node.right.value)
-            self.changed = True
-            return Literal(val, lineno=node.lineno)
-        return node
+        return self._try_fold(node)
 
     def visit_CompareOp(self, node):
         return self.visit_BinOp(node)
 
     def visit_IfStmt(self, node):
         node.condition = self.visit(node.condition)
-        # Visit blocks even if we don't DCE yet to propagate constants inside them
+
+        before = self.constants
+        self.constants = dict(before)
         node.then_block = self.visit(node.then_block)
+        after_then = self.constants
+        self.constants = dict(before)
         node.else_block = self.visit(node.else_block)
+        after_else = self.constants
 
-        if self._is_constant(node.condition):
-            self.changed = True
-            return node.then_block if node.condition.value else node.else_block
+        truth = self._constant_truth(node.condition)
+        if truth is not None:
+            # Only the taken branch runs, so its constants flow on unchanged ('dce' removes the other)
+            self.constants = after_then if truth else after_else
+        else:
+            # Only facts that hold on both paths survive the join
+            self.constants = {k: v for k, v in after_then.items()
+                              if k in after_else and self._same_constant(after_else[k], v)}
+        return node
+
+    def visit_WhileStmt(self, node):
+        self._forget(self._assigned_names([node.condition, node.body]))
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        self._forget(self._assigned_names(node.body))
+        return node
+
+    def visit_RepeatUntilStmt(self, node):
+        self._forget(self._assigned_names([node.body, node.condition]))
+        node.body = self.visit(node.body)
+        node.condition = self.visit(node.condition)
+        self._forget(self._assigned_names(node.body))
         return node
 
     def visit_ForStmt(self, node):
-        node.range.start = self.visit(node.range.start)
-        node.range.end = self.visit(node.range.end)
-
-        def get_val(n):
-            if hasattr(n, 'value'): return n.value
-            return n
-
-        start_val = get_val(node.range.start)
-        end_val = get_val(node.range.end)
-
-        if isinstance(start_val, int) and isinstance(end_val, int):
-            iterations = end_val - start_val
-            if 0 < iterations <= 10:
-                self.changed = True
-                unrolled = []
-                for i in range(start_val, end_val):
-                    iter_assign = Assignment(
-                        target=Identifier(node.loop_var, lineno=node.lineno),
-                        op='=',
-                        value=Literal(i, lineno=node.lineno),
-                        lineno=node.lineno
-                    )
-                    unrolled.append(iter_assign)
-                    unrolled.append(copy.deepcopy(node.body))
-                # Note: Unrolled list will be processed by visit_Block's next pass
-                return unrolled
+        node.range = self.visit(node.range)
+        return self._visit_loop_body(node)
 
+    def _visit_loop_body(self, node):
+        # Anything the body writes may differ between iterations (and after the loop)
+        assigned = self._assigned_names(node.body) | {node.loop_var}
+        self._forget(assigned)
         node.body = self.visit(node.body)
+        self._forget(assigned)
         return node
 
+    def _has_loop_exit(self, node):
+        """True if a break/continue would leave this loop body (not a nested loop)."""
+        if isinstance(node, list):
+            return any(self._has_loop_exit(item) for item in node)
+        cls = node.__class__.__name__
+        if cls in ('Break', 'Continue'):
+            return True
+        if cls in ('WhileStmt', 'RepeatUntilStmt', 'ForStmt', 'FuncDecl') or not hasattr(node, '__dict__'):
+            return False
+        return any(self._has_loop_exit(v) for v in vars(node).values()
+                   if isinstance(v, list) or hasattr(v, '__dict__'))
+
+    def _assigned_names(self, node):
+        names = set()
+        if isinstance(node, list):
+            for item in node: names |= self._assigned_names(item)
+            return names
+        if not hasattr(node, '__dict__'):
+            return names
+        cls = node.__class__.__name__
+        if cls == 'Assignment':
+            base = assignment_base(node.target)
+            if base: names.add(base)
+        elif cls in ('VarDecl', 'PointerDecl'):
+            names.add(node.name)
+        elif cls == 'ForStmt':
+            names.add(node.loop_var)
+        for value in vars(node).values():
+            if isinstance(value, list) or hasattr(value, '__dict__'):
+                names |= self._assigned_names(value)
+        return names
+
+    def _forget(self, names):
+        for name in names:
+            self.constants.pop(name, None)
+
+    # ==========================================
+    #       PASS 2: LOOP UNROLLING
+    # ==========================================
+
+    @optimization_pass("unroll", requires=("fold",), summary="unroll for loops with constant bounds under a cost model")
+    def _unroll_pass(self, tree):
+        self.details = {"unrolled": 0, "partial": 0, "growth": 0}
+        self.unroll_remaining = self.unroll_budget
+        if tree.__class__.__name__ == 'Program':
+            tree.statements = self._unroll_statements(tree.statements)
+        return tree
+
+    def _unroll_statements(self, statements):
+        result = []
+        for stmt in statements:
+            self.visited += 1
+            # Inner loops go first; an outer loop is only considered once its body is loop-free
+            self._rewrite_nested(stmt, self._unroll_statements)
+            unrolled = self._unroll_loop(stmt) if stmt.__class__.__name__ == 'ForStmt' else None
+            if unrolled is None:
+                result.append(stmt)
+            else:
+                result.extend(unrolled)
+        return result
+
+    def _unroll_loop(self, node):
+        """
+        Statements replacing the loop, or None when it must stay a loop. The cost
+        model weighs the body size against the code each copy adds: a loop is
+        fully unrolled when it has few iterations and the copies fit the growth
+        limits, otherwise unrolled by a factor with a remainder loop.
+        """
+        rng = node.range
+        if rng.__class__.__name__ != 'Range':
+            return None  # Runtime iterables are never unrolled
+
+        bounds = [b.value if self._is_constant(b) else b for b in (rng.start, rng.end, rng.step)]
+        if not all(isinstance(b, int) for b in bounds) or bounds[2] == 0 or self._has_loop_exit(node.body):
+            return None
+        if self._contains(node.body, ('WhileStmt', 'RepeatUntilStmt', 'ForStmt')):
+            return None  # The inner loop dominates; unrolling around it only adds code
+
+        iterations = range(*bounds)
+        body_nodes = self._count_nodes(node.body.statements)
+        if body_nodes > self.unroll_body_limit:
+            return None
+        allowed = min(self.unroll_growth_limit, self.unroll_remaining)
+
+        if 0 < len(iterations) <= self.unroll_limit and (len(iterations) - 1) * body_nodes <= allowed:
+            self._spend_unroll(len(iterations) - 1, body_nodes)
+            self.details["unrolled"] += 1
+            return self._unroll_fully(node, iterations)
+
+        if node.loop_var in self._assigned_names(node.body):
+            return None  # Copies step the loop variable themselves
+        for factor in self.UNROLL_FACTORS:
+            if len(iterations) >= 2 * factor and (factor - 1) * body_nodes <= allowed:
+                self._spend_unroll(factor - 1, body_nodes)
+                self.details["partial"] += 1
+                return self._unroll_by(node, iterations, factor)
+        return None
+
+    def _spend_unroll(self, copies, body_nodes):
+        self.unroll_remaining -= copies * body_nodes
+        self.details["growth"] += copies * body_nodes
+        self._rewrote()
+
+    def _unroll_fully(self, node, iterations):
+        unrolled = []
+        # The copies run in sequence, so constants found in one hold at the start of the next
+        self.constants = {}
+        last = len(iterations) - 1
+        for n, i in enumerate(iterations):
+            iter_assign = Assignment(Identifier(node.loop_var, lineno=node.lineno), '=',
+                                     Literal(i, lineno=node.lineno), lineno=node.lineno)
+            unrolled.append(self.visit(iter_assign))
+            # Each copy is folded with the loop variable known; the last one reuses the original body
+            body = node.body.statements if n == last else self._clone(node.body.statements)
+            unrolled.extend(self.visit(body))
+        return unrolled
+
+    def _unroll_by(self, node, iterations, factor):
+        """
+        for i in a..b step s  ->  for i in a..m step s*factor { body; i += s; body; ... }
+                                  for i in m..b step s { body }   (the remainder, when there is one)
+        """
+        step = iterations.step
+        remainder = len(iterations) % factor
+        split = iterations.start + (len(iterations) - remainder) * step
+        lineno = node.lineno
+
+        body = []
+        for n in range(factor):
+            if n:
+                body.append(Assignment(Identifier(node.loop_var, lineno=lineno), '+=',
+                                       Literal(step, lineno=lineno), lineno=lineno))
+            body.extend(self._clone(node.body.statements))
+        main = ForStmt(node.loop_var,
+                       Range(Literal(iterations.start, lineno=lineno), Literal(split, lineno=lineno),
+                             Literal(step * factor, lineno=lineno), lineno=lineno),
+                       Block(body, lineno=lineno), lineno=lineno)
+        if not remainder:
+            return [main]
+        node.range = Range(Literal(split, lineno=lineno), Literal(iterations.stop, lineno=lineno),
+                           Literal(step, lineno=lineno), lineno=lineno)
+        return [main, node]
+
+    # Expressions no pass rewrites in place once they read no variable
+    SHAREABLE = ('Literal', 'BinOp', 'CompareOp', 'UnaryOp', 'FuncCall', 'ArrayLiteral',
+                 'ArrayAccess', 'Slice', 'RecordAccess')
+
+    def _clone(self, node):
+        """
+        Copies statements and every expression that reads a variable, since
+        later passes rewrite those in place. Expressions that read no variable
+        are shared between the copies instead of being duplicated.
+        """
+        return self._clone_node(node)[0]
+
+    def _clone_node(self, node):
+        """Returns (clone, whether it reads a variable)."""
+        if isinstance(node, list):
+            items = [self._clone_node(item) for item in node]
+            return [c for c, _ in items], any(r for _, r in items)
+        if not isinstance(node, Node):
+            return node, False
+
+        cls = node.__class__.__name__
+        children = {key: (value, self._clone_node(value)) for key, value in vars(node).items()
+                    if isinstance(value, (list, Node))}
+        reads = cls == 'Identifier' or any(r for _, (_, r) in children.items())
+        if not reads and cls in self.SHAREABLE and all(c is v for v, (c, _) in children.values()):
+            return node, False
+
+        new = copy.copy(node)
+        for key, (_, (clone, _)) in children.items():
+            setattr(new, key, clone)
+        return new, reads
+
+    def _rewrite_nested(self, stmt, rewrite):
+        """Applies 'rewrite' to the statement list of every block directly inside 'stmt'."""
+        if stmt.__class__.__name__ == 'Block':
+            stmt.statements = rewrite(stmt.statements)
+            return
+        for value in vars(stmt).values():
+            if value.__class__.__name__ == 'Block':
+                value.statements = rewrite(value.statements)
+
+    # ==========================================
+    #       PASS 3: INTERPROCEDURAL CONSTANTS
+    # ==========================================
+
+    @optimization_pass("ipcp", requires=("fold",),
+                       summary="evaluate pure calls with constant arguments; specialize functions on constants")
+    def _ipcp_pass(self, tree):
+        """
+        A call to a pure function whose arguments are all constant is run at
+        compile time and replaced by its result. Otherwise, when some arguments
+        are scalar constants, the call is redirected to a clone of the function
+        with those parameters bound, kept only if folding the clone shrinks it.
+        """
+        self.details = {"evaluated": 0, "specialized": 0, "steps": 0}
+        if tree.__class__.__name__ != 'Program':
+            return tree
+        funcs = {s.name: s for s in tree.statements if s.__class__.__name__ == 'FuncDecl'}
+        if not funcs:
+            return tree
+
+        self.ipcp_funcs = funcs
+        self.ipcp_pure = pure_functions(funcs)
+        self.ipcp_evaluator = PartialEvaluator(funcs, self.partial_eval_budget)
+        self.ipcp_steps = self.partial_eval_total
+        self.ipcp_results = {}  # (name, argument keys) -> constant result, or None if it cannot be computed
+        self.ipcp_clones = {}   # (name, bound arguments) -> clone, or None if binding them does not pay off
+        self.ipcp_sources = {}  # Function name -> clones made from it, in creation order
+        self.ipcp_pending = []  # Clones whose bodies are still to be walked
+
+        tree.statements = self._ipcp_walk(tree.statements)
+        while self.ipcp_pending:
+            clone = self.ipcp_pending.pop()
+            clone.body = self._ipcp_walk(clone.body)
+
+        if self.ipcp_sources:
+            # A clone is declared right after its original, so it exists wherever the original can be called
+            statements = []
+            for stmt in tree.statements:
+                statements.append(stmt)
+                if stmt.__class__.__name__ == 'FuncDecl':
+                    statements.extend(self._ipcp_declared(stmt.name))
+            tree.statements = statements
+        return tree
+
+    def _ipcp_declared(self, name):
+        """The clones of 'name' and, after each, the clones specialized from it."""
+        result = []
+        for clone in self.ipcp_sources.pop(name, ()):
+            result.append(clone)
+            result.extend(self._ipcp_declared(clone.name))
+        return result
+
+    def _ipcp_walk(self, node):
+        if isinstance(node, list):
+            return [self._ipcp_walk(item) for item in node]
+        if not isinstance(node, Node) or (node.__class__.__name__ == 'UnaryOp' and node.op == '&'):
+            return node
+        self.visited += 1
+        for attr, value in vars(node).items():
+            if isinstance(value, (list, Node)):
+                setattr(node, attr, self._ipcp_walk(value))
+        cls = node.__class__.__name__
+        if cls == 'FuncCall':
+            return self._ipcp_call(node)
+        if cls in ('BinOp', 'CompareOp', 'UnaryOp'):
+            return self._try_fold(node)  # A call just replaced by its result may complete a constant
+        return node
+
+    def _ipcp_call(self, call):
+        func = self.ipcp_funcs.get(call.name)
+        if func is None or len(call.args) != len(func.params):
+            return call
+        if all(self._is_constant(arg) for arg in call.args) and call.name in self.ipcp_pure:
+            value = self._ipcp_evaluate(call)
+            if value is not None:
+                self.details["evaluated"] += 1
+                self._rewrote()
+                return Literal(value, lineno=call.lineno)
+
+        bound = tuple((i, type(arg.value).__name__, arg.value) for i, arg in enumerate(call.args)
+                      if self._is_constant(arg) and type(arg.value) in (bool, int, float, str))
+        if not bound:
+            return call
+        key = (call.name, bound)
+        if key not in self.ipcp_clones:
+            self.ipcp_clones[key] = self._specialize(func, bound)
+        clone = self.ipcp_clones[key]
+        if clone is None:
+            return call
+        positions = {i for i, _, _ in bound}
+        call.name = clone.name
+        call.args = [arg for i, arg in enumerate(call.args) if i not in positions]
+        self._rewrote()
+        return call
+
+    def _ipcp_evaluate(self, call):
+        # Arrays are keyed by identity: equal-looking arrays may still differ in dtype
+        key = (call.name, tuple(('array', id(arg.value)) if const_eval.is_array(arg.value)
+                                else (type(arg.value).__name__, arg.value) for arg in call.args))
+        if key in self.ipcp_results:
+            return self.ipcp_results[key]
+        if self.ipcp_steps <= 0:
+            return None
+        evaluator = self.ipcp_evaluator
+        evaluator.budget = min(self.partial_eval_budget, self.ipcp_steps)
+        try:
+            value = evaluator.call(call)
+        except ConstantFoldError:
+            value = None
+        self.ipcp_steps -= evaluator.steps
+        self.details["steps"] += evaluator.steps
+        self.ipcp_results[key] = value
+        return value
+
+    def _specialize(self, func, bound):
+        """A clone of 'func' with the 'bound' parameters fixed, or None when folding it gains nothing."""
+        if self.details["specialized"] >= self.specialize_limit:
+            return None
+        if self._count_nodes(func.body.statements) > self.specialize_node_limit:
+            return None
+
+        clone = self._clone(func)
+        positions = {i: value for i, _, value in bound}
+        params = clone.params
+        clone.params = [p for i, p in enumerate(params) if i not in positions]
+        decls = [VarDecl(params[i].dtype, params[i].shape, params[i].name, Literal(value, lineno=func.lineno),
+                         lineno=func.lineno) for i, value in positions.items()]
+        clone.body.statements = decls + clone.body.statements
+
+        rewrites, saved = self.rewrites, self.constants
+        self.constants = {}
+        clone.body = self.visit(clone.body)
+        self.constants = saved
+        clone.body.statements = self._dce_statements(clone.body.statements)
+        if self._count_nodes(clone.body.statements[len(decls):]) >= self._count_nodes(func.body.statements):
+            self.rewrites = rewrites  # Nothing folded away; the trial rewrites do not count
+            return None
+
+        clone.name = f"{func.name}{self._new_temp('spec')}"
+        self.details["specialized"] += 1
+        self.ipcp_funcs[clone.name] = clone  # Shared with the evaluator, so calls to the clone can run too
+        if func.name in self.ipcp_pure:
+            self.ipcp_pure.add(clone.name)
+        self.ipcp_sources.setdefault(func.name, []).append(clone)
+        self.ipcp_pending.append(clone)
+        return clone
+
+    # ==========================================
+    #       PASS 4: DEAD CODE ELIMINATION
+    # ==========================================
+
+    @optimization_pass("dce", requires=("fold",), summary="drop branches and loops that never run")
+    def _dce_pass(self, tree):
+        if tree.__class__.__name__ == 'Program':
+            tree.statements = self._dce_statements(tree.statements)
+        return tree
+
+    def _dce_statements(self, statements):
+        result = []
+        for stmt in statements:
+            self.visited += 1
+            self._rewrite_nested(stmt, self._dce_statements)
+            cls = stmt.__class__.__name__
+            truth = self._constant_truth(stmt.condition) if cls in ('IfStmt', 'WhileStmt') else None
+            if cls == 'IfStmt' and truth is not None:
+                # Blocks do not open scopes, so the taken branch is spliced in directly
+                taken = stmt.then_block if truth else stmt.else_block
+                result.extend(taken.statements if taken is not None else ())
+                self._rewrote()
+            elif cls == 'WhileStmt' and truth is False:
+                self._rewrote()
+            else:
+                result.append(stmt)
+        return result
+
+    # ==========================================
+    #       PASS 5: SCCP
+    # ==========================================
+
+    @optimization_pass("sccp", summary="sparse conditional constant propagation over SSA")
+    def _sccp_pass(self, tree):
+        """
+        Substitutes every read SCCP proves constant, then refolds upward so
+        branches it proved one-sided collapse to the side that runs.
+        """
+        if tree.__class__.__name__ != 'Program':
+            return tree
+        result = SparseConditionalConstants(self._evaluate_binop, self.external).analyze(tree)
+        self.details = {"blocks": result.blocks, "unreachable": result.unreachable}
+        self.visited += result.visited
+        if not result.constants:
+            return tree
+
+        index = DefUseIndex(tree)
+        self.visited += index.nodes
+        for uses in index.uses.values():
+            for use in uses:
+                if id(use) not in result.constants or self._is_address_of(index.slot(use)[0]):
+                    continue
+                literal = index.replace(use, Literal(result.constants[id(use)], lineno=use.lineno))
+                self._rewrote()
+                self._refold(literal, index)
+        return tree
+
+    # ==========================================
+    #       PASS 6: DEF-USE WORKLIST
+    # ==========================================
+
+    @optimization_pass("propagate", summary="substitute single-definition constants via def-use chains")
+    def _propagate_pass(self, tree):
+        """
+        Substitutes every read of a variable whose only definition is a
+        constant declaration. Each substitution refolds just the chain of
+        enclosing expressions; a declaration that folds to a constant joins
+        the worklist, so the work is proportional to the uses touched.
+        """
+        index = DefUseIndex(tree)
+        self.visited += index.nodes
+
+        worklist = [decl for decl in (index.single_def(name) for name in index.defs)
+                    if self._is_propagatable(decl)]
+        while worklist:
+            decl = worklist.pop()
+            value = decl.value.value
+            for use in index.uses.get(decl.name, []):
+                parent = index.slot(use)
+                if parent is None or self._is_address_of(parent[0]):
+                    continue
+                literal = index.replace(use, Literal(value, lineno=use.lineno))
+                self._rewrote()
+                worklist.extend(self._refold(literal, index))
+        return tree
+
+    def _is_propagatable(self, decl):
+        return (decl is not None and decl.__class__.__name__ == 'VarDecl'
+                and decl.name not in self.external and self._is_constant(decl.value))
+
+    def _is_address_of(self, node):
+        return node.__class__.__name__ == 'UnaryOp' and node.op == '&'
+
+    def _refold(self, node, index):
+        """Folds upward from a new literal; returns declarations that became constant."""
+        while True:
+            self.visited += 1
+            parent, attr, _ = index.slot(node)
+            cls = parent.__class__.__name__
+            if cls in ('BinOp', 'CompareOp', 'UnaryOp'):
+                folded = self._try_fold(parent)
+                if folded is parent:
+                    return []
+                node = index.replace(parent, folded)
+                continue
+            if cls == 'VarDecl' and attr == 'value' and index.single_def(parent.name) is parent \
+                    and self._is_propagatable(parent):
+                return [parent]
+            if cls == 'IfStmt' and attr == 'condition':
+                # Swap in the taken branch; nested blocks run in the same scope
+                truth = self._constant_truth(node)
+                if truth is None:
+                    return []
+                taken = parent.then_block if truth else parent.else_block
+                index.replace(parent, taken or Block([], lineno=parent.lineno))
+                self._rewrote()
+            elif cls == 'WhileStmt' and attr == 'condition' and self._constant_truth(node) is False:
+                index.replace(parent, Block([], lineno=parent.lineno))
+                self._rewrote()
+            return []
+
+    # ==========================================
+    #       PASS 7: ALGEBRAIC SIMPLIFICATION
+    # ==========================================
+
+    @optimization_pass("simplify", requires=("fold",), summary="algebraic identities and strength reduction")
+    def _simplify_pass(self, tree):
+        """
+        Rewrites operations into cheaper ones with the same result: identities
+        (x + 0, x - 0, x * 1, x / 1, x * 0, I @ x), strength reductions (x ^ 2,
+        x * 2, x / 2^k) and double negations. Each rewrite is guarded by the
+        kind of its operand, since true * 1, -0.0 + 0 and !!5 all change the value.
+        """
+        self.details = {"simplified": 0}
+        self.kinds = ValueKinds(tree, self.external, self.load_headers)
+        return self._simplify(tree)
+
+    def _simplify(self, node):
+        if isinstance(node, list):
+            return [self._simplify(item) for item in node]
+        if not hasattr(node, '__dict__') or (node.__class__.__name__ == 'UnaryOp' and node.op == '&'):
+            return node
+        self.visited += 1
+        cls = node.__class__.__name__
+        for key, value in vars(node).items():
+            if cls == 'Assignment' and key == 'target':
+                continue
+            if isinstance(value, list) or hasattr(value, '__dict__'):
+                setattr(node, key, self._simplify(value))
+
+        if cls == 'BinOp':
+            rewritten = self._simplify_binop(node)
+        elif cls == 'UnaryOp':
+            rewritten = self._simplify_unary(node)
+        else:
+            return node
+        if rewritten is not node:
+            self.details["simplified"] += 1
+            self._rewrote()
+        return rewritten
+
+    def _simplify_binop(self, node):
+        op, left, right = node.op, node.left, node.right
+        for x, c in ((left, right), (right, left)):
+            if not self._is_constant(c) or self._is_constant(x):
+                continue
+            kind = self.kinds.kind_of(x)
+            commutes = x is left or op in ('+', '*')
+
+            if op == '+' and commutes and self._is_number(c, 0) and self._keeps_kind(kind, c, 'i'):
+                return x  # Not for floats: -0.0 + 0 is 0.0
+            if op == '-' and x is left and self._is_number(c, 0) and self._keeps_kind(kind, c, 'if'):
+                return x
+            if op == '*' and self._is_number(c, 1) and self._keeps_kind(kind, c, 'if'):
+                return x
+            if op == '/' and x is left and self._is_number(c, 1) and self._keeps_kind(kind, c, 'f'):
+                return x
+            if op == '*' and kind == 'int' and self._is_number(c, 0, (int,)) \
+                    and x.__class__.__name__ == 'Identifier':
+                return Literal(0, lineno=node.lineno)  # Not for floats: inf * 0 is nan
+            if op == '*' and self._is_number(c, 2) and self._keeps_kind(kind, c, 'if') \
+                    and x.__class__.__name__ == 'Identifier':
+                return BinOp(x, '+', Identifier(x.name, lineno=x.lineno), lineno=node.lineno)
+            if op == '^' and x is left and self._is_number(c, 2, (int,)) and self._keeps_kind(kind, c, 'if') \
+                    and x.__class__.__name__ == 'Identifier':
+                # Same value, except a float too large to square gives inf instead of OverflowError
+                return BinOp(x, '*', Identifier(x.name, lineno=x.lineno), lineno=node.lineno)
+            if op == '/' and x is left and self._keeps_kind(kind, c, 'f'):
+                reciprocal = self._exact_reciprocal(c.value)
+                if reciprocal is not None:
+                    return BinOp(x, '*', Literal(reciprocal, lineno=c.lineno), lineno=node.lineno)
+            if op == '@' and self._is_identity_matmul(kind, c.value, x is left):
+                return x
+        return node
+
+    def _simplify_unary(self, node):
+        inner = node.operand
+        if inner.__class__.__name__ != 'UnaryOp' or inner.op != node.op:
+            return node
+        kind = self.kinds.kind_of(inner.operand)
+        if node.op == '-' and (kind in ('int', 'float') or
+                               (isinstance(kind, ArrayKind) and kind.dtype.kind in 'iuf')):
+            return inner.operand
+        if node.op == '!' and kind == 'bool':
+            return inner.operand
+        return node
+
+    def _is_number(self, node, value, types=(int, float)):
+        return type(node.value) in types and node.value == value
+
+    def _keeps_kind(self, kind, constant, allowed):
+        """
+        True when combining a value of 'kind' with 'constant' gives the same type
+        back: 'i' allows ints and integer arrays with an int constant, 'f' floats
+        and float arrays with an int or float constant.
+        """
+        if kind in ('int', 'float'):
+            family = kind[0]
+        elif isinstance(kind, ArrayKind) and kind.dtype.kind in 'iuf':
+            family = 'f' if kind.dtype.kind == 'f' else 'i'
+        else:
+            return False
+        if family not in allowed:
+            return False
+        return type(constant.value) is int or (family == 'f' and type(constant.value) is float)
+
+    def _exact_reciprocal(self, value):
+        """1/value when it is exactly representable (value is a power of two), else None."""
+        if type(value) not in (int, float) or value == 0:
+            return None
+        try:
+            if abs(math.frexp(value)[0]) != 0.5:
+                return None
+            reciprocal = 1.0 / value
+        except (OverflowError, ValueError):
+            return None  # inf, nan, or an int too large for a float
+        return reciprocal if sys.float_info.min <= abs(reciprocal) < math.inf else None
+
+    def _is_identity_matmul(self, kind, matrix, on_right):
+        """x @ I and I @ x for an identity matrix; exact only for integer and bool tensors."""
+        if not isinstance(kind, ArrayKind) or kind.dtype.kind not in 'iub' or not kind.shape:
+            return False
+        if not const_eval.is_array(matrix) or matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            return False
+        if np.result_type(kind.dtype, matrix.dtype) != kind.dtype:
+            return False
+        n = matrix.shape[0]
+        dim = kind.shape[-1] if on_right else kind.shape[0]
+        if dim != n or (not on_right and len(kind.shape) > 2):
+            return False
+        return bool(np.array_equal(matrix, np.eye(n, dtype=matrix.dtype)))
+
+    # ==========================================
+    #       PASS 8: VALUE NUMBERING (CSE)
+    # ==========================================
+
+    CSE_CANDIDATES = ('BinOp', 'CompareOp', 'UnaryOp', 'RecordAccess', 'ArrayAccess')
+
+    @optimization_pass("cse", requires=("fold",), summary="compute identical pure expressions once")
+    def _cse_pass(self, tree):
+        """
+        Numbers every pure expression by its structural key. An expression whose
+        number is already available (computed earlier in the same block, or in
+        a block that dominates this one, with none of its operands written since)
+        reads a temporary instead. Temporaries are only created for numbers that
+        are actually reused.
+        """
+        self.details = {"eliminated": 0}
+        if tree.__class__.__name__ != 'Program':
+            return tree
+        self.cse_keys = {}
+        self.cse_reads = {}
+        self.cse_versions = {}   # name -> times it has been written so far
+        self.cse_classes = []
+        self._cse_region(tree.statements, [])
+        self._cse_apply()
+        return tree
+
+    def _cse_region(self, statements, chain):
+        chain = chain + [{}]
+        for stmt in statements:
+            self.visited += 1
+            cls = stmt.__class__.__name__
+            if cls != 'WhileStmt':  # A while condition is re-evaluated after the body runs
+                for owner, attr in self._expression_slots(stmt):
+                    self._cse_expr(getattr(owner, attr), (owner, attr, None), chain, statements, stmt)
+
+            if cls == 'Block':
+                self._cse_region(stmt.statements, chain)
+            elif cls == 'IfStmt':
+                for branch in (stmt.then_block, stmt.else_block):
+                    if branch is not None:
+                        self._cse_region(branch.statements, chain)
+            elif cls in ('WhileStmt', 'RepeatUntilStmt', 'ForStmt'):
+                # Values the loop overwrites are stale from the first iteration on
+                assigned = self._assigned_names(stmt.body)
+                if cls == 'ForStmt':
+                    assigned.add(stmt.loop_var)
+                self._cse_kill(assigned)
+                self._cse_region(stmt.body.statements, chain)
+            elif cls == 'FuncDecl':
+                self._cse_region(stmt.body.statements, [])
+
+            if cls != 'FuncDecl':
+                self._cse_kill(self._assigned_names(stmt))
+
+    def _cse_kill(self, names):
+        for name in names:
+            self.cse_versions[name] = self.cse_versions.get(name, 0) + 1
+
+    def _cse_expr(self, node, slot, chain, statements, stmt):
+        if not hasattr(node, '__dict__') or (node.__class__.__name__ == 'UnaryOp' and node.op == '&'):
+            return
+        self.visited += 1
+
+        key = None
+        if node.__class__.__name__ in self.CSE_CANDIDATES:
+            key = structural_key(node, self.cse_keys)
+            reads = self._cse_names(node)
+            if key is not None and reads:
+                for table in reversed(chain):
+                    entry = table.get(key)
+                    if entry is not None and all(self.cse_versions.get(n, 0) == v for n, v in entry['reads']):
+                        entry['reuses'].append(slot)
+                        return
+            else:
+                key = None
+
+        for attr, value in vars(node).items():
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    self._cse_expr(item, (node, attr, i), chain, statements, stmt)
+            elif hasattr(value, '__dict__'):
+                self._cse_expr(value, (node, attr, None), chain, statements, stmt)
+
+        if key is not None:
+            entry = {'node': node, 'slot': slot, 'statements': statements, 'stmt': stmt, 'reuses': [],
+                     'reads': tuple((n, self.cse_versions.get(n, 0)) for n in reads)}
+            chain[-1][key] = entry
+            self.cse_classes.append(entry)
+
+    def _cse_names(self, node):
+        """Variables an expression reads, cached by node id."""
+        if id(node) in self.cse_reads:
+            return self.cse_reads[id(node)]
+        cls = node.__class__.__name__
+        if cls == 'Identifier':
+            names = frozenset([node.name])
+        elif not hasattr(node, '__dict__'):
+            names = frozenset()
+        else:
+            names = frozenset()
+            for value in vars(node).values():
+                for item in (value if isinstance(value, list) else [value]):
+                    if hasattr(item, '__dict__'):
+                        names |= self._cse_names(item)
+        self.cse_reads[id(node)] = names
+        return names
+
+    def _cse_apply(self):
+        inserts = {}  # id(statement list) -> (list, {id(stmt): [temp assignments]})
+        for entry in self.cse_classes:
+            if not entry['reuses']:
+                continue
+            temp = self._new_temp("cse")
+            node = entry['node']
+            for owner, attr, index in [entry['slot']] + entry['reuses']:
+                ident = Identifier(temp, lineno=node.lineno)
+                if index is None:
+                    setattr(owner, attr, ident)
+                else:
+                    getattr(owner, attr)[index] = ident
+            self.details["eliminated"] += len(entry['reuses'])
+            self._rewrote()
+
+            statements = entry['statements']
+            _, before = inserts.setdefault(id(statements), (statements, {}))
+            before.setdefault(id(entry['stmt']), []).append(
+                Assignment(Identifier(temp, lineno=node.lineno), '=', node, lineno=node.lineno))
+
+        for statements, before in inserts.values():
+            rebuilt = []
+            for stmt in statements:
+                rebuilt.extend(before.get(id(stmt), ()))
+                rebuilt.append(stmt)
+            statements[:] = rebuilt
+
+    # ==========================================
+    #       PASS 9: LOOP-INVARIANT CODE MOTION
+    # ==========================================
+
+    @optimization_pass("licm", requires=("fold",), summary="hoist loop-invariant expressions out of loops")
+    def _licm_pass(self, tree):
+        self.details = {"hoisted": 0, "guarded": 0}
+        if tree.__class__.__name__ == 'Program':
+            self.kinds = ValueKinds(tree, self.external, self.load_headers)
+            tree.statements = self._licm_statements(tree.statements)
+        return tree
+
+    def _new_temp(self, prefix):
+        # '$' cannot start a Quantel identifier, so temporaries never collide with user names
+        name = f"${prefix}{self.temp_counter}"
+        self.temp_counter += 1
+        return name
+
+    def _licm_statements(self, statements):
+        result = []
+        for stmt in statements:
+            self.visited += 1
+            # Inner loops go first, so their temporaries can move further out
+            self._rewrite_nested(stmt, self._licm_statements)
+            if stmt.__class__.__name__ in ('WhileStmt', 'RepeatUntilStmt', 'ForStmt'):
+                preheader, guarded = self._hoist_invariants(stmt)
+                result.extend(preheader)
+                if guarded:
+                    # Runs only when the loop is entered, as the expressions it holds would
+                    lineno = stmt.lineno
+                    stmt = IfStmt(copy.deepcopy(stmt.condition), Block(guarded + [stmt], lineno=lineno),
+                                  lineno=lineno)
+            result.append(stmt)
+        return result
+
+    def _hoist_invariants(self, loop):
+        """
+        Moves invariant expressions that run on every iteration into temporaries
+        assigned just before the loop. Returns those assignments, and those of
+        expressions that may raise: a while loop runs them behind its own
+        condition, so they only run when the first iteration would have.
+        """
+        cls = loop.__class__.__name__
+        assigned = self._assigned_names(loop.body)
+        if cls == 'ForStmt':
+            assigned.add(loop.loop_var)
+
+        preheader, guarded = [], []
+        if cls == 'WhileStmt':
+            # The condition is evaluated on entry anyway, so all of it may move
+            self._hoist_slot(loop, 'condition', assigned, preheader, loop.lineno, may_raise=True)
+        # A pure condition can be evaluated once more, ahead of the loop, to guard the rest
+        can_guard = cls == 'WhileStmt' and not self._contains(loop.condition, ('FuncCall',))
+        exits = False
+        for stmt in loop.body.statements:
+            if self._contains(stmt, ('Break', 'Continue', 'Return')):
+                exits = True
+                break
+            for owner, attr in self._expression_slots(stmt):
+                self._hoist_slot(owner, attr, assigned, preheader, loop.lineno)
+                if can_guard:
+                    self._hoist_slot(owner, attr, assigned, guarded, loop.lineno, may_raise=True)
+            # An error raised ahead of output the body prints first would change what is seen
+            if self._contains(stmt, ('FuncCall', 'Probe')):
+                can_guard = False
+        if cls == 'RepeatUntilStmt' and not exits:
+            self._hoist_slot(loop, 'condition', assigned, preheader, loop.lineno)
+        self.details["guarded"] += len(guarded)
+        return preheader, guarded
+
+    def _hoist_slot(self, owner, attr, assigned, preheader, lineno, may_raise=False):
+        value = getattr(owner, attr)
+        invariant = {}
+        self._mark_invariant(value, assigned, invariant, may_raise)
+        setattr(owner, attr, self._hoist_expr(value, invariant, preheader, lineno))
+
+    def _expression_slots(self, stmt):
+        """Expressions a statement evaluates before any of its nested blocks run."""
+        cls = stmt.__class__.__name__
+        if cls in ('VarDecl', 'Assignment') and stmt.value is not None:
+            return [(stmt, 'value')]
+        if cls == 'ExprStmt':
+            return [(stmt, 'expr')]
+        if cls == 'Probe':
+            return [(stmt, 'target')]
+        if cls == 'Return' and stmt.value is not None:
+            return [(stmt, 'value')]
+        if cls in ('IfStmt', 'WhileStmt'):
+            return [(stmt, 'condition')]
+        if cls == 'ForStmt':
+            if stmt.range.__class__.__name__ == 'Range':
+                return [(stmt.range, 'start'), (stmt.range, 'end'), (stmt.range, 'step')]
+            return [(stmt, 'range')]
+        return []
+
+    def _mark_invariant(self, node, assigned, invariant, may_raise=False):
+        """
+        Records in 'invariant' (by id) whether each expression node is pure,
+        cannot raise (unless 'may_raise'), and reads nothing the loop writes.
+        """
+        self.visited += 1
+        cls = node.__class__.__name__
+        if cls == 'Literal' or not hasattr(node, '__dict__'):
+            result = True
+        elif cls == 'Identifier':
+            result = node.name not in assigned
+        elif cls in ('BinOp', 'CompareOp'):
+            left = self._mark_invariant(node.left, assigned, invariant, may_raise)
+            right = self._mark_invariant(node.right, assigned, invariant, may_raise)
+            result = left and right and (may_raise or not self._may_raise(node))
+        elif cls == 'UnaryOp' and node.op in const_eval.UNARY_OPS:
+            operand = self._mark_invariant(node.operand, assigned, invariant, may_raise)
+            result = operand and (may_raise or not self._may_raise(node))
+        elif cls == 'RecordAccess':
+            result = self._mark_invariant(node.record, assigned, invariant, may_raise)
+        else:
+            # Calls, indexing and array literals stay put; their operands may still move
+            for value in vars(node).values():
+                if isinstance(value, list):
+                    for item in value: self._mark_invariant(item, assigned, invariant, may_raise)
+                elif hasattr(value, '__dict__') and not (cls == 'UnaryOp' and node.op == '&'):
+                    self._mark_invariant(value, assigned, invariant, may_raise)
+            result = False
+        invariant[id(node)] = result
+        return result
+
+    def _may_raise(self, node):
+        # Hoisted code can run when the loop body would not; only ops proven not to fail move
+        if node.__class__.__name__ == 'UnaryOp':
+            kind = self.kinds.kind_of(node.operand)
+            if node.op == '!':
+                return kind not in SCALAR_KINDS + ('str',)  # Arrays have no single truth value
+            if kind in SCALAR_KINDS:
+                return False
+            if isinstance(kind, ArrayKind):
+                return kind.dtype.kind not in 'iuf'  # NumPy cannot negate bool arrays
+            return self._proven_shape(node.operand) is None or self._static_dtype(node.operand) in (None, 'bool')
+
+        op, right = node.op, node.right
+        left_kind, right_kind = self.kinds.kind_of(node.left), self.kinds.kind_of(right)
+        if op in ('&&', '||'):
+            return left_kind not in SCALAR_KINDS or right_kind not in SCALAR_KINDS
+        if op in ('/', '%') and self._constant_truth(right) is not True:
+            return True
+        if op == '^' and not (self._is_constant(right) and isinstance(right.value, int) and right.value >= 0):
+            return True
+        if left_kind in SCALAR_KINDS and right_kind in SCALAR_KINDS:
+            return False
+        # Arrays (or values of unknown kind) must have shapes the operator accepts
+        left_shape, right_shape = self._proven_shape(node.left), self._proven_shape(right)
+        if left_shape is None or right_shape is None:
+            return True
+        if op == '-' and (self._is_bool(node.left, left_kind) or self._is_bool(right, right_kind)):
+            return True
+        try:
+            if op == '@':
+                shapes.matmul(left_shape, right_shape)
+            elif op in shapes.ELEMENTWISE_OPS:
+                shapes.broadcast(left_shape, right_shape)
+            else:
+                return True
+        except shapes.ShapeError:
+            return True
+        return False
+
+    def _proven_shape(self, node):
+        """The shape of a numeric operand when every dimension is known, else None."""
+        kind = self.kinds.kind_of(node)
+        if isinstance(kind, ArrayKind):
+            return list(kind.shape) if kind.dtype.kind in 'biuf' else None
+        if kind in SCALAR_KINDS:
+            return []
+        static = getattr(node, 'static', None)
+        if static is None or static.shape is None or None in static.shape \
+                or static.dtype in ('unknown', 'string'):
+            return None
+        return static.shape
+
+    def _is_bool(self, node, kind):
+        if isinstance(kind, ArrayKind):
+            return kind.dtype.kind == 'b'
+        return kind == 'bool' or (kind is None and self._static_dtype(node) in (None, 'bool'))
+
+    def _static_dtype(self, node):
+        static = getattr(node, 'static', None)
+        return None if static is None or static.dtype == 'unknown' else static.dtype
+
+    def _hoist_expr(self, node, invariant, preheader, lineno):
+        if invariant.get(id(node)):
+            if node.__class__.__name__ in ('BinOp', 'CompareOp', 'UnaryOp', 'RecordAccess') \
+                    and self._contains(node, ('Identifier',)):
+                temp = self._new_temp("licm")
+                preheader.append(Assignment(Identifier(temp, lineno=lineno), '=', node, lineno=lineno))
+                self.details["hoisted"] += 1
+                self._rewrote()
+                return Identifier(temp, lineno=node.lineno)
+            return node
+        if not hasattr(node, '__dict__') or (node.__class__.__name__ == 'UnaryOp' and node.op == '&'):
+            return node
+        for key, value in vars(node).items():
+            if isinstance(value, list):
+                setattr(node, key, [self._hoist_expr(item, invariant, preheader, lineno) for item in value])
+            elif hasattr(value, '__dict__'):
+                setattr(node, key, self._hoist_expr(value, invariant, preheader, lineno))
+        return node
+
+    def _contains(self, node, classes):
+        if isinstance(node, list):
+            return any(self._contains(item, classes) for item in node)
+        if not hasattr(node, '__dict__'):
+            return False
+        if node.__class__.__name__ in classes:
+            return True
+        return any(self._contains(value, classes) for value in vars(node).values()
+                   if isinstance(value, list) or hasattr(value, '__dict__'))
+
+    # ==========================================
+    #       PASS 10: DEAD STORES AND EARLY RELEASE
+    # ==========================================
+
+    @optimization_pass("dse", summary="remove dead stores; release variables after their last use")
+    def _dse_pass(self, tree):
+        """
+        Deletes pure stores no later read can see, then marks every remaining
+        simple statement with the variables whose last use it is, so the
+        interpreter drops them (and the arrays they hold) right there.
+        """
+        self.details = {"removed": 0, "released": 0}
+        if tree.__class__.__name__ != 'Program':
+            return tree
+        result = LiveVariables(self._removable_store, self.external, self.exit_live).analyze(tree)
+        for node, names in result.release.values():
+            node.release = tuple(sorted(names))
+            self.details["released"] += len(names)
+        self.dead_stores = result.dead
+        tree.statements = self._dse_statements(tree.statements)
+        return tree
+
+    def _dse_statements(self, statements):
+        result = []
+        for stmt in statements:
+            self.visited += 1
+            if id(stmt) in self.dead_stores:
+                self.details["removed"] += 1
+                self._rewrote()
+                continue
+            self._rewrite_nested(stmt, self._dse_statements)
+            result.append(stmt)
+        return result
+
+    def _removable_store(self, instr):
+        node = instr.node
+        return (node.__class__.__name__ in ('VarDecl', 'Assignment') and instr.name not in self.external
+                and self._is_pure(instr.expr))
+
+    def _is_pure(self, node):
+        """No calls and nothing that can raise, so skipping the evaluation is unobservable."""
+        cls = node.__class__.__name__
+        if cls in ('Literal', 'Identifier') or not hasattr(node, '__dict__'):
+            return True
+        if cls in ('BinOp', 'CompareOp'):
+            return self._is_pure(node.left) and self._is_pure(node.right) and not self._may_raise(node)
+        if cls == 'UnaryOp':
+            return node.op == '&' or (node.op in const_eval.UNARY_OPS and self._is_pure(node.operand))
+        return False
+
+    # ==========================================
+    #       CONSTANT EVALUATION
+    # ==========================================
+
+    def _try_fold(self, node):
+        try:
+            if node.__class__.__name__ == 'UnaryOp':
+                if not self._is_constant(node.operand):
+                    return node
+                val = const_eval.evaluate_unary(node.op, node.operand.value)
+            elif self._is_constant(node.left) and self._is_constant(node.right):
+                val = const_eval.evaluate_binop(node.op, node.left.value, node.right.value)
+            else:
+                return node
+        except ConstantFoldError:
+            # Unknown operators, errors like 1/0 and oversized results are left to the interpreter
+            return node
+        self._rewrote()
+        return Literal(val, lineno=node.lineno)
+
     def _is_constant(self, node):
         return node.__class__.__name__ == 'Literal'
 
+    def _constant_truth(self, node):
+        """True/False for a scalar constant; None when unknown or an array (no single truth value)."""
+        if not self._is_constant(node) or const_eval.is_array(node.value):
+            return None
+        return bool(node.value)
+
+    def _same_constant(self, a, b):
+        if const_eval.is_array(a) or const_eval.is_array(b):
+            return a is b
+        return type(a) is type(b) and a == b
+
     def _evaluate_binop(self, op, left, right):
-        ops = {
-            '+': lambda a, b: a + b, '-': lambda a, b: a - b,
-            '*': lambda a, b: a * b, '/': lambda a, b: a // b,
-            '>': lambda a, b: a > b, '<': lambda a, b: a < b,
-            '==': lambda a, b: a == b
-        }
-        return ops.get(op, lambda a, b: 0)(left, right)
\ No newline at end of file
+        return const_eval.evaluate_binop(op, left, right)
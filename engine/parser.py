@@ -219,13 +219,18 @@ class QuantelParser(Parser):
     def control_flow(self, p):
         return ast.ForStmt(p.ID, p.range, p.block, lineno=p.lineno)
 
-    @_('NUMBER RANGE NUMBER')
+    # Iterates any runtime iterable: tensor rows, batches(...) generators, etc.
+    @_('FOR ID IN expr block')
+    def control_flow(self, p):
+        return ast.ForStmt(p.ID, p.expr, p.block, lineno=p.lineno)
+
+    @_('expr RANGE expr')
     def range(self, p):
-        return ast.Range(p.NUMBER0, p.NUMBER1, 1, lineno=p.lineno)
+        return ast.Range(p.expr0, p.expr1, 1, lineno=p.lineno)
 
-    @_('NUMBER RANGE NUMBER STEP expr')
+    @_('expr RANGE expr STEP expr')
     def range(self, p):
-        return ast.Range(p.NUMBER0, p.NUMBER1, p.expr, lineno=p.lineno)
+        return ast.Range(p.expr0, p.expr1, p.expr2, lineno=p.lineno)
 
     @_('target ASSIGN expr SEMICOLON',
        'target PLUS_ASSIGN expr SEMICOLON',
@@ -0,0 +1,122 @@
+from engine import const_eval
+from engine.ast import Node
+from engine.const_eval import ConstantFoldError
+from engine.interpreter import QuantelInterpreter
+
+# Integers are unbounded in Python, so repeated squaring could exhaust memory well within the step budget
+CONST_INT_BITS = 4096
+
+
+def pure_functions(funcs):
+    """
+    Names of the functions whose result depends on their arguments alone and
+    that have no effect besides it: no probes, no builtins (they touch files),
+    no addresses, and calls only to other pure functions. Reads of globals are
+    left to PartialEvaluator, which has none and so refuses them.
+    """
+    calls = {}
+    pure = set()
+    for name, func in funcs.items():
+        callees = set()
+        if _closed_body(func.body, funcs, callees):
+            pure.add(name)
+            calls[name] = callees
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if not calls[name] <= pure:
+                pure.discard(name)
+                changed = True
+    return pure
+
+
+def _closed_body(node, funcs, callees):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, Node):
+            continue
+        cls = node.__class__.__name__
+        if cls in ('Probe', 'PointerDecl', 'RecordDecl', 'FuncDecl'):
+            return False
+        if cls == 'UnaryOp' and node.op == '&':
+            return False
+        if cls == 'FuncCall':
+            if node.name not in funcs:
+                return False
+            callees.add(node.name)
+        stack.extend(v for v in vars(node).values() if isinstance(v, (list, Node)))
+    return True
+
+
+class PartialEvaluator(QuantelInterpreter):
+    """
+    Runs calls to pure functions at compile time. The global environment holds
+    the function declarations and nothing else, so a function that reads a
+    global variable fails here and keeps its call. Every operator goes through
+    const_eval, so evaluation obeys the same error and size limits as folding.
+    Each call may visit at most 'budget' nodes, which bounds loops and recursion.
+    """
+
+    def __init__(self, funcs, budget):
+        super().__init__(jit_threshold=None)  # Every node must pass through visit() to count against the budget
+        self.global_env = funcs  # Shared with the caller, which may add functions later
+        self.budget = budget
+        self.steps = 0
+
+    def call(self, call):
+        """The constant 'call' returns, or ConstantFoldError when it cannot be computed here."""
+        self.steps = 0
+        self.local_env = None
+        try:
+            value = self.visit_FuncCall(call)
+        except ConstantFoldError:
+            raise
+        except Exception as e:  # Undefined names, bad shapes, recursion depth: all left to run time
+            raise ConstantFoldError(str(e))
+        if value is None or not isinstance(value, const_eval.CONSTANT_TYPES):
+            raise ConstantFoldError("call returns no constant")
+        return const_eval.check_constant(value)
+
+    def visit(self, node):
+        self.steps += 1
+        if self.steps > self.budget:
+            raise ConstantFoldError(f"evaluation exceeds {self.budget} steps")
+        return super().visit(node)
+
+    def _call_builtin(self, node, args, hints):
+        raise ConstantFoldError(f"builtin '{node.name}' runs at run time")
+
+    def visit_Probe(self, node):
+        raise ConstantFoldError("probes run at run time")
+
+    def visit_BinOp(self, node):
+        return self._bounded(const_eval.evaluate_binop(node.op, self.visit(node.left), self.visit(node.right)))
+
+    def visit_UnaryOp(self, node):
+        return self._bounded(const_eval.evaluate_unary(node.op, self.visit(node.operand)))
+
+    def visit_ArrayLiteral(self, node):
+        return const_eval.array_literal(self.visit(el) for el in node.elements)
+
+    def visit_Assignment(self, node):
+        if node.op == '=' or node.target.__class__.__name__ != 'Identifier':
+            return super().visit_Assignment(node)
+        # Compound assignments go through const_eval too, so 's += s' cannot grow without limit
+        val = self.visit(node.value)
+        env = self.local_env if self.local_env is not None else self.global_env
+        current = env.get(node.target.name)
+        if current is None:
+            raise ConstantFoldError(f"Variable '{node.target.name}' not defined.")
+        self._store(env, node.target.name,
+                    self._bounded(const_eval.evaluate_binop(node.op[:-1], current, val)), node.lineno)
+        return val
+
+    def _bounded(self, value):
+        if isinstance(value, int) and not isinstance(value, bool) and value.bit_length() > CONST_INT_BITS:
+            raise ConstantFoldError("integer exceeds the fold limit")
+        return value
@@ -0,0 +1,184 @@
+import itertools
+import sys
+import threading
+from collections import deque
+
+import numpy as np
+
+
+# Arrays with more elements than this are summarized instead of printed in full
+SUMMARY_THRESHOLD = 64
+
+
+class ProbeEvent:
+    """
+    A single probe() hit. Holds a reference to the probed value plus cheap
+    metadata; the value is only converted to text when format() is called.
+    """
+    __slots__ = ('seq', 'lineno', 'value', 'kind', 'shape', 'dtype', 'stats')
+
+    def __init__(self, seq, lineno, value):
+        self.seq = seq
+        self.lineno = lineno
+        self.value = value
+        self.shape = None
+        self.dtype = None
+        self.stats = None
+
+        if isinstance(value, np.ndarray):
+            self.kind = 'tensor'
+            self.shape = tuple(value.shape)
+            self.dtype = str(value.dtype)
+            if value.size > 0 and (np.issubdtype(value.dtype, np.number) or value.dtype == np.bool_):
+                self.stats = (value.min(), value.max(), value.mean())
+        elif isinstance(value, str):
+            self.kind = 'String'
+        else:
+            self.kind = type(value).__name__
+
+    @property
+    def is_large(self):
+        return self.shape is not None and int(np.prod(self.shape)) > SUMMARY_THRESHOLD
+
+    def format_value(self, full=False):
+        if self.kind != 'tensor':
+            return str(self.value)
+        threshold = sys.maxsize if full else SUMMARY_THRESHOLD
+        return np.array2string(self.value, threshold=threshold, edgeitems=3)
+
+    def format(self, full=False):
+        lines = [f"\n   [PROBE TOOL @ Line {self.lineno}]", f"   Value: {self.format_value(full)}"]
+        if self.kind == 'tensor':
+            lines.append(f"   Shape: {self.shape}")
+            lines.append(f"   Dtype: {self.dtype}")
+            if self.stats is not None and self.is_large:
+                lo, hi, mean = self.stats
+                lines.append(f"   Stats: min={lo:.6g} max={hi:.6g} mean={mean:.6g}")
+        else:
+            lines.append(f"   Type:  {self.kind}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """JSON-friendly record; tensor values are included only when small."""
+        data = {"seq": self.seq, "line": self.lineno, "kind": self.kind}
+        if self.kind == 'tensor':
+            data["shape"] = list(self.shape)
+            data["dtype"] = self.dtype
+            if self.stats is not None:
+                lo, hi, mean = self.stats
+                data["stats"] = {"min": float(lo), "max": float(hi), "mean": float(mean)}
+            if not self.is_large:
+                data["value"] = self.value.tolist()
+        elif isinstance(self.value, (bool, int, float, str)):
+            data["value"] = self.value
+        elif isinstance(self.value, np.generic):
+            data["value"] = self.value.item()
+        else:
+            data["value"] = str(self.value)
+        return data
+
+    def summary(self):
+        """Short one-line description used by list views."""
+        if self.kind == 'tensor':
+            text = f"#{self.seq} L{self.lineno} {self.dtype}{list(self.shape)}"
+            if self.stats is not None:
+                lo, hi, mean = self.stats
+                text += f" min={lo:.4g} max={hi:.4g} mean={mean:.4g}"
+            return text
+        value = str(self.value)
+        if len(value) > 50:
+            value = value[:47] + "..."
+        return f"#{self.seq} L{self.lineno} {self.kind}: {value}"
+
+
+class ProbeStream:
+    """
+    Bounded ring buffer of ProbeEvents. emit() never blocks the interpreter:
+    when the buffer is full the oldest event is dropped. Other output to the
+    same stream calls sync() first so it lands after the probes before it.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.dropped = 0
+        self.closed = False
+        self.broken = False  # The printer's output went away; events are still consumed
+        self._events = deque()
+        self._printer = None
+        self._busy = False  # The printer is writing an event it has taken
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def emit(self, lineno, value):
+        event = ProbeEvent(next(self._seq), lineno, value)
+        with self._cond:
+            if len(self._events) >= self.capacity:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def __len__(self):
+        """Number of events waiting to be consumed."""
+        return len(self._events)
+
+    def drain(self, max_items=None):
+        """Removes and returns up to max_items pending events without waiting."""
+        with self._cond:
+            count = len(self._events) if max_items is None else min(max_items, len(self._events))
+            return [self._events.popleft() for _ in range(count)]
+
+    def sync(self):
+        """Waits until the printer thread, if any, has written every event emitted so far."""
+        with self._cond:
+            while self._printer is not None and (self._events or self._busy):
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __iter__(self):
+        """Blocking consumer: yields events until the stream is closed and empty."""
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                while not self._events and not self.closed:
+                    self._cond.wait()
+                if not self._events:
+                    return
+                event = self._events.popleft()
+                self._busy = True
+            yield event
+
+    def start_printer(self, out=None):
+        """Consumes events on a background thread, printing each as it arrives."""
+
+        def _run():
+            stream = out or sys.stdout
+            try:
+                for event in self:
+                    self._write(stream, event.format() + "\n")
+                if self.dropped:
+                    self._write(stream, f"[Probe] {self.dropped} events dropped (buffer full)\n")
+            finally:
+                with self._cond:
+                    self._printer = None
+                    self._busy = False
+                    self._cond.notify_all()
+
+        thread = threading.Thread(target=_run, name="quantel-probe-printer", daemon=True)
+        self._printer = thread
+        thread.start()
+        return thread
+
+    def _write(self, stream, text):
+        if self.broken:
+            return
+        try:
+            stream.write(text)
+        except OSError:  # BrokenPipeError included: the reader closed the pipe
+            self.broken = True
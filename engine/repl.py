@@ -0,0 +1,133 @@
+import contextlib
+import io
+
+import engine.ast as ast
+from engine.lexer import QuantelLexer
+from engine.parser import QuantelParser
+from engine.semantic_analyzer import SemanticAnalyzer
+from engine.optimizer import QuantelOptimizer
+from engine.interpreter import QuantelInterpreter
+
+
+class QuantelSession:
+    """
+    Keeps one analyzer scope chain and one interpreter alive across snippets.
+    Each snippet is compiled against the existing symbols and only the new
+    statements are executed.
+    """
+
+    def __init__(self, tracer=None, memory=None):
+        self.analyzer = SemanticAnalyzer()
+        self.interpreter = QuantelInterpreter(tracer=tracer, memory=memory)
+        self.tracer = tracer
+
+    def execute(self, source):
+        """Returns (value, errors). value is the result of a lone expression statement."""
+        lexer = QuantelLexer(print_errors=True)
+        tokens = list(lexer.tokenize(source))
+        if lexer.errors:
+            return None, list(lexer.errors)
+
+        parser = QuantelParser()
+        # The parser prints its own diagnostics; the REPL reports them once below
+        with contextlib.redirect_stdout(io.StringIO()):
+            tree = parser.parse(iter(tokens), source_text=source)
+        if parser.errors or tree is None:
+            return None, list(parser.errors) or ["Syntax Error: Incomplete input."]
+
+        errors = self._analyze(tree)
+        if errors:
+            return None, errors
+
+        # Decided before optimizing: inlining can expand one expression into several statements
+        is_expression = len(tree.statements) == 1 and isinstance(tree.statements[0], ast.ExprStmt)
+
+        # Globals may be reassigned by any later snippet, so their initializers are never propagated
+        declared = {s.name for s in tree.statements if isinstance(s, (ast.VarDecl, ast.PointerDecl))}
+        tree = QuantelOptimizer(tracer=self.tracer, external=declared, analyzer=self.analyzer).optimize(tree)
+
+        value = self.interpreter.visit(tree)
+        return (value if is_expression else None), []
+
+    def _analyze(self, tree):
+        analyzer = self.analyzer
+        saved_symbols, saved_history = analyzer.symbols.snapshot(), dict(analyzer.history)
+
+        # Re-entering a top-level declaration replaces the previous definition
+        for stmt in tree.statements:
+            if isinstance(stmt, (ast.VarDecl, ast.PointerDecl, ast.FuncDecl, ast.RecordDecl)):
+                analyzer.symbols.undefine_global(stmt.name)
+
+        analyzer.errors = []
+        analyzer.visit(tree)
+        errors = analyzer.errors
+        if errors:
+            # Roll back so a failed snippet leaves no half-defined symbols behind
+            analyzer.symbols.restore(saved_symbols)
+            analyzer.history = saved_history
+        analyzer.errors = []
+        return errors
+
+    def global_names(self):
+        # '$' names are optimizer temporaries
+        return [name for name, val in self.interpreter.global_env.items()
+                if not isinstance(val, ast.FuncDecl) and not str(name).startswith('$')]
+
+
+def _is_complete(source):
+    """A snippet is complete once its braces balance and it ends a statement."""
+    depth = 0
+    in_string = False
+    for ch in source:
+        if ch == '"':
+            in_string = not in_string
+        elif not in_string:
+            if ch == '{': depth += 1
+            elif ch == '}': depth -= 1
+    stripped = source.rstrip()
+    return depth <= 0 and (stripped.endswith(';') or stripped.endswith('}'))
+
+
+def run_repl(session=None):
+    session = session or QuantelSession()
+    print("Quantel REPL. Statements end with ';'. Commands: :vars, :help, :quit")
+    buffer = []
+
+    while True:
+        try:
+            line = input("...> " if buffer else "qtl> ")
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+
+        if not buffer:
+            command = line.strip()
+            if command in (':quit', ':q', ':exit'):
+                return
+            if command == ':help':
+                print("Enter Quantel statements; prior declarations stay in scope.\n"
+                      "  :vars  list global variables\n  :quit  leave the REPL")
+                continue
+            if command == ':vars':
+                for name in session.global_names():
+                    val = str(session.interpreter.global_env[name]).replace('\n', ' ')
+                    print(f"  {name} = {val[:60]}")
+                continue
+            if not command:
+                continue
+
+        buffer.append(line)
+        source = "\n".join(buffer)
+        if not _is_complete(source):
+            continue
+        buffer = []
+
+        try:
+            value, errors = session.execute(source)
+        except Exception as e:
+            print(f"Runtime Error: {e}")
+            continue
+        for err in errors:
+            print(err)
+        if value is not None:
+            print(value)
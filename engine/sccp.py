@@ -0,0 +1,177 @@
+from engine.cfg import CFGBuilder, Phi, BasicBlock, to_ssa
+from engine.const_eval import ConstantFoldError, evaluate_unary, is_array
+
+# Lattice: a missing entry is TOP (no value seen yet), a 1-tuple is a known
+# constant, OVERDEFINED means the value differs between executions.
+OVERDEFINED = object()
+
+
+class SCCPResult:
+    def __init__(self):
+        self.constants = {}      # id(Identifier) -> constant value read there
+        self.blocks = 0
+        self.unreachable = 0
+        self.visited = 0         # Phis, instructions and branches evaluated
+
+
+class SparseConditionalConstants:
+    """
+    Wegman-Zadeck sparse conditional constant propagation over the SSA form of
+    each graph. Branches are only followed once their condition can take that
+    direction, so constants flowing around loops and through ifs are found
+    without assuming code that never runs.
+    """
+
+    def __init__(self, evaluate, external=()):
+        self.evaluate = evaluate  # (op, left, right) -> value; raises ConstantFoldError if it cannot fold
+        self.external = external
+
+    def analyze(self, program):
+        result = SCCPResult()
+        for cfg in CFGBuilder(self.external).build(program):
+            to_ssa(cfg)
+            self._solve(cfg, result)
+        return result
+
+    def _solve(self, cfg, result):
+        self.cfg = cfg
+        self.values = {}
+        self.edges = set()
+        self.reached = set()
+        self.flow = [(None, cfg.entry)]
+        self.ssa = []
+        self.visited = 0
+
+        for value in cfg.entry_values.values():
+            self.values[value] = OVERDEFINED
+
+        while self.flow or self.ssa:
+            while self.flow:
+                pred, block = self.flow.pop()
+                self._visit_edge(pred, block)
+            while self.ssa:
+                user = self.ssa.pop()
+                block = user if isinstance(user, BasicBlock) else user.block
+                if block.index in self.reached:
+                    self._visit_user(user)
+
+        for ident_id, value in cfg.use_version.items():
+            lattice = self.values.get(value)
+            if lattice is not None and lattice is not OVERDEFINED:
+                result.constants[ident_id] = lattice[0]
+        result.visited += self.visited
+        result.blocks += len(cfg.blocks)
+        result.unreachable += len(cfg.blocks) - len(self.reached)
+
+    # ==========================================
+    #             PROPAGATION
+    # ==========================================
+
+    def _visit_edge(self, pred, block):
+        edge = (pred.index if pred else None, block.index)
+        if edge in self.edges:
+            return
+        self.edges.add(edge)
+
+        for phi in block.phis.values():
+            self._visit_phi(phi)
+        if block.index in self.reached:
+            return
+        self.reached.add(block.index)
+        for instr in block.instrs:
+            self._visit_instr(instr)
+        self._visit_branch(block)
+
+    def _visit_user(self, user):
+        if isinstance(user, Phi):
+            self._visit_phi(user)
+        elif isinstance(user, BasicBlock):
+            self._visit_branch(user)
+        else:
+            self._visit_instr(user)
+
+    def _visit_phi(self, phi):
+        self.visited += 1
+        merged = None
+        for pred_index, value in phi.args.items():
+            if (pred_index, phi.block.index) not in self.edges:
+                continue
+            merged = self._meet(merged, self.values.get(value))
+        self._set(phi, merged)
+
+    def _visit_instr(self, instr):
+        self.visited += 1
+        if instr.kind == 'kill':
+            self._set(instr, OVERDEFINED)
+        elif instr.kind == 'def':
+            value = self._eval(instr.expr)
+            if instr.op != '=':
+                value = self._combine(instr.op[:-1], self.values.get(instr.prev), value)
+            self._set(instr, value)
+
+    def _visit_branch(self, block):
+        self.visited += 1
+        if len(block.succs) == 1:
+            self.flow.append((block, block.succs[0]))
+        elif len(block.succs) == 2:
+            cond = self._eval(block.cond) if block.cond is not None else OVERDEFINED
+            if cond is OVERDEFINED:
+                self.flow.extend((block, succ) for succ in block.succs)
+            elif cond is not None:
+                self.flow.append((block, block.succs[0] if cond[0] else block.succs[1]))
+
+    def _set(self, value, lattice):
+        if lattice is None or self._same(self.values.get(value), lattice):
+            return
+        self.values[value] = lattice
+        self.ssa.extend(self.cfg.users.get(value, ()))
+
+    def _meet(self, a, b):
+        if a is None: return b
+        if b is None: return a
+        return a if self._same(a, b) else OVERDEFINED
+
+    def _same(self, a, b):
+        if a is None or b is None or a is OVERDEFINED or b is OVERDEFINED:
+            return a is b
+        # 1, 1.0 and True are different constants to the interpreter
+        return type(a[0]) is type(b[0]) and a[0] == b[0]
+
+    # ==========================================
+    #             EVALUATION
+    # ==========================================
+
+    def _eval(self, node):
+        cls = node.__class__.__name__
+        if cls == 'Literal':
+            # The lattice tracks scalars only; arrays have no single truth value or equality
+            return OVERDEFINED if is_array(node.value) else (node.value,)
+        if isinstance(node, (int, float)):
+            return (node,)
+        if cls == 'Identifier':
+            value = self.cfg.use_version.get(id(node))
+            return self.values.get(value) if value is not None else OVERDEFINED
+        if cls in ('BinOp', 'CompareOp'):
+            return self._combine(node.op, self._eval(node.left), self._eval(node.right))
+        if cls == 'UnaryOp' and node.op != '&':
+            operand = self._eval(node.operand)
+            if operand is None or operand is OVERDEFINED:
+                return operand
+            try:
+                return self._scalar(evaluate_unary(node.op, operand[0]))
+            except ConstantFoldError:
+                return OVERDEFINED
+        return OVERDEFINED
+
+    def _combine(self, op, left, right):
+        if left is OVERDEFINED or right is OVERDEFINED:
+            return OVERDEFINED
+        if left is None or right is None:
+            return None
+        try:
+            return self._scalar(self.evaluate(op, left[0], right[0]))
+        except ConstantFoldError:
+            return OVERDEFINED
+
+    def _scalar(self, value):
+        return OVERDEFINED if is_array(value) else (value,)
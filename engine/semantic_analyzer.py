@@ -1,3 +1,19 @@
+import os
+
+from engine.ast import Node, StaticType
+from engine.builtins import BUILTINS
+from engine.symbol_table import SymbolTable
+from engine import shapes, tensor_io
+
+# Expressions annotated with their StaticType as the analyzer reaches them
+EXPRESSIONS = ('Literal', 'Identifier', 'BinOp', 'CompareOp', 'UnaryOp', 'FuncCall',
+               'ArrayAccess', 'ArrayLiteral', 'RecordAccess')
+
+
+def format_error(lineno, message, hint):
+    return f"\n[!] SEMANTIC ERROR | Line {lineno}\n    Error:    {message}\n    Hint:     {hint}"
+
+
 class Symbol:
     def __init__(self, name, symbol_type, category, shape=None, is_initialized=False, params_count=None):
         self.name = name
@@ -10,40 +26,43 @@ class Symbol:
 
 class SemanticAnalyzer:
     def __init__(self):
-        self.scopes = [{}]
-        self.history = {}
+        self.symbols = SymbolTable()
+        self.history = {}  # name -> last symbol declared under it (record types are found here)
         self.errors = []
+        self.diagnostics = []  # (lineno, message, hint) behind each entry of 'errors'
         self.current_function = None
+        self.load_headers = {}  # id(load call) -> (dtype, shape) or None
+        self.static = {}        # id(expression) -> StaticType
+        self.type_checked = set()  # ids of expressions whose operand types were checked
 
     def _report_error(self, node, message, hint):
         lineno = getattr(node, 'lineno', '??')
-        self.errors.append(f"\n[!] SEMANTIC ERROR | Line {lineno}\n    Error:    {message}\n    Hint:     {hint}")
+        self.diagnostics.append((lineno, message, hint))
+        self.errors.append(format_error(lineno, message, hint))
 
     # ==========================================
     #             SCOPE MANAGEMENT
     # ==========================================
-    def enter_scope(self):
-        self.scopes.append({})
+    def enter_scope(self, label):
+        self.symbols.enter_scope(label)
 
     def exit_scope(self):
-        if len(self.scopes) > 1: self.scopes.pop()
+        self.symbols.exit_scope()
 
     def define(self, node, name, symbol_type, category, shape=None, initialized=False, params_count=None):
-        if name in self.scopes[-1]:
+        if self.symbols.declared_here(name) is not None:
             self._report_error(node, f"Redeclaration of '{name}'", f"'{name}' is already defined in this block.")
             return None
 
         symbol = Symbol(name, symbol_type, category, shape, initialized, params_count)
-        self.scopes[-1][name] = symbol
+        self.symbols.define(name, symbol, getattr(node, 'lineno', None))
         # Use symbol_type as key for records to allow type-based lookup in visit_RecordAccess
         history_key = name if category != 'record' else name
         self.history[history_key] = symbol
         return symbol
 
     def lookup(self, name):
-        for scope in reversed(self.scopes):
-            if name in scope: return scope[name]
-        return None
+        return self.symbols.lookup(name)
 
     # ==========================================
     #             VISITOR CORE
@@ -58,8 +77,12 @@ class SemanticAnalyzer:
             for item in node: self.visit(item)
             return
 
-        method_name = f'visit_{node.__class__.__name__}'
-        visitor = getattr(self, method_name, self.generic_visit)
+        cls = node.__class__.__name__
+        if node.lineno:
+            self.symbols.note_line(node.lineno)
+        if cls in EXPRESSIONS:
+            self.infer(node)
+        visitor = getattr(self, f'visit_{cls}', self.generic_visit)
         return visitor(node)
 
     def generic_visit(self, node):
@@ -73,7 +96,9 @@ class SemanticAnalyzer:
 
     def visit_RecordDecl(self, node):
         field_map = {decl.name: decl.dtype for decl in node.fields}
-        self.define(node, node.name, node.name, 'record', initialized=True, params_count=field_map)
+        # A record's shape maps each field to its declared dims
+        field_shapes = {decl.name: getattr(decl.shape, 'dims', None) for decl in node.fields}
+        self.define(node, node.name, node.name, 'record', field_shapes, initialized=True, params_count=field_map)
         self.visit(node.fields)
 
     def visit_RecordAccess(self, node):
@@ -98,6 +123,9 @@ class SemanticAnalyzer:
         v_shape = getattr(node.shape, 'dims', []) if node.shape else []
         v_type = node.dtype
 
+        if node.value.__class__.__name__ == 'FuncCall' and node.value.name == 'load':
+            self._check_load(node, node.value, v_type, v_shape if node.shape else None)
+
         if v_type == 'auto' and node.value:
             v_type = self.get_type(node.value)
             v_shape = self.get_shape(node.value)
@@ -107,13 +135,14 @@ class SemanticAnalyzer:
 
     def visit_FuncDecl(self, node):
         p_count = len(node.params) if node.params else 0
-        self.define(node, node.name, node.ret_type, 'function', initialized=True, params_count=p_count)
+        ret_shape = getattr(node.ret_shape, 'dims', None)
+        self.define(node, node.name, node.ret_type, 'function', ret_shape, initialized=True, params_count=p_count)
 
         self.current_function = node
-        self.enter_scope()
+        self.enter_scope(node.name)
         if node.params:
             for p in node.params:
-                p_shape = getattr(p.shape_type, 'dims', []) if hasattr(p, 'shape_type') else []
+                p_shape = getattr(p.shape, 'dims', [])
                 self.define(p, p.name, p.dtype, 'variable', shape=p_shape, initialized=True)
         self.visit(node.body)
         self.exit_scope()
@@ -121,7 +150,13 @@ class SemanticAnalyzer:
 
     def visit_FuncCall(self, node):
         symbol = self.lookup(node.name)
-        if not symbol:
+        if not symbol and node.name in BUILTINS:
+            builtin = BUILTINS[node.name]
+            args_given = len(node.args) if node.args else 0
+            if not builtin.accepts(args_given):
+                self._report_error(node, "Argument mismatch",
+                                   f"Builtin '{node.name}' expects {builtin.arity_hint()} arguments, got {args_given}.")
+        elif not symbol:
             self._report_error(node, f"Undefined function '{node.name}'", "Check spelling.")
         else:
             if symbol.category != 'function':
@@ -143,13 +178,18 @@ class SemanticAnalyzer:
             self._report_error(node, f"Undefined identifier '{node.name}'", "Variable is out of scope.")
 
     def visit_ArrayAccess(self, node):
-        # Improved: Check both Identifier targets and expression targets
-        target_name = getattr(node.target, 'name', None) if hasattr(node, 'target') else None
-        if target_name:
-            s = self.lookup(target_name)
-            if s and s.shape == []:
-                self._report_error(node, "Invalid indexing", f"'{s.name}' is a scalar and cannot be indexed.")
-        self.visit(getattr(node, 'target', None))
+        target = node.name
+        shape = self.get_shape(target)
+        count = len(node.index) if isinstance(node.index, list) else 1
+        name = getattr(target, 'name', 'expression')
+        defined = target.__class__.__name__ != 'Identifier' or self.lookup(name)  # Else reported as undefined
+        if defined and self._type_of(target) != "string" and shape is not None and count > len(shape):
+            if shape == []:
+                self._report_error(node, "Invalid indexing", f"'{name}' is a scalar and cannot be indexed.")
+            else:
+                self._report_error(node, "Invalid indexing",
+                                   f"'{name}' has shape {shape} and cannot take {count} indices.")
+        self.visit(target)
         self.visit(node.index)
 
     def visit_Assignment(self, node):
@@ -163,49 +203,129 @@ class SemanticAnalyzer:
             self._report_error(node, "Assignment mismatch", f"Cannot assign {v_type} to {t_type}.")
 
         # [NEW] ADDED: Shape Mismatch Check
-        if t_shape != v_shape and t_shape is not None and v_shape is not None:
+        if t_shape is not None and v_shape is not None and not self._fits(node.target, t_shape, v_shape):
             self._report_error(node, "Dimension mismatch",
                                f"Target expects shape {t_shape}, but value has shape {v_shape}.")
 
         self.visit(node.value)
 
+    def _fits(self, target, t_shape, v_shape):
+        if t_shape == v_shape:
+            return True
+        # Storing into part of an array broadcasts the value to the part's shape
+        if target.__class__.__name__ != 'ArrayAccess':
+            return False
+        try:
+            return shapes.broadcast(t_shape, v_shape) == t_shape
+        except shapes.ShapeError:
+            return False
+
     # [NEW] ADDED: Explicit BinOp Visitor for Mathematical Logic
     def visit_BinOp(self, node):
         l_shape = self.get_shape(node.left)
         r_shape = self.get_shape(node.right)
 
         if node.op == '@':
-            if not l_shape or not r_shape:
-                self._report_error(node, "Invalid Matmul", "Matrix multiplication requires defined shapes.")
-            elif len(l_shape) < 1 or len(r_shape) < 1:
-                self._report_error(node, "Matmul Error", "Cannot multiply scalars with '@'.")
-            elif l_shape[-1] != r_shape[0]:
-                self._report_error(node, "Inner Dimension Mismatch",
-                                   f"Cannot multiply {l_shape} by {r_shape}. Inner dims {l_shape[-1]} and {r_shape[0]} must match.")
-
-        # Element-wise check for +, -, *, /
-        elif node.op in ['+', '-', '*', '/']:
-            if l_shape != r_shape and len(l_shape) > 0 and len(r_shape) > 0:
-                self._report_error(node, "Arithmetic Shape Mismatch",
-                                   f"Shapes {l_shape} and {r_shape} must be identical for '{node.op}'.")
+            if l_shape == [] or r_shape == []:
+                self._report_error(node, "Invalid Matmul", "Cannot multiply scalars with '@'.")
+            else:
+                try:
+                    shapes.matmul(l_shape, r_shape)
+                except shapes.ShapeError as e:
+                    self._report_error(node, "Inner Dimension Mismatch", str(e))
+
+        # Element-wise operators broadcast like NumPy
+        elif node.op in shapes.ELEMENTWISE_OPS:
+            try:
+                shapes.broadcast(l_shape, r_shape)
+            except shapes.ShapeError as e:
+                self._report_error(node, "Arithmetic Shape Mismatch", str(e))
 
         self.visit(node.left)
         self.visit(node.right)
 
+    def visit_CompareOp(self, node):
+        self.visit_BinOp(node)
+
+    # ==========================================
+    #           TENSOR FILE VALIDATION
+    # ==========================================
+    def _load_header(self, call):
+        """Reads (dtype, shape) from the file named by a load() call, or None if not checkable."""
+        if id(call) not in self.load_headers:
+            self.load_headers[id(call)] = self._read_load_header(call)
+        return self.load_headers[id(call)]
+
+    def _read_load_header(self, call):
+        args = call.args or []
+        if not args or args[0].__class__.__name__ != 'Literal' or not isinstance(args[0].value, str):
+            return None
+        path = args[0].value
+        key = args[1].value if len(args) > 1 and args[1].__class__.__name__ == 'Literal' else None
+        # Files written by save() earlier in the same program may not exist yet
+        if not os.path.exists(path):
+            return None
+        try:
+            return tensor_io.read_header(path, key)
+        except (tensor_io.TensorIOError, ValueError, OSError) as e:
+            self._report_error(call, "Unreadable tensor file", str(e))
+            return None
+
+    def _check_load(self, node, call, dtype, dims):
+        args = call.args or []
+        path = args[0].value if args and args[0].__class__.__name__ == 'Literal' else None
+        if not isinstance(path, str) or not os.path.exists(path):
+            return
+        try:
+            fmt = tensor_io.format_of(path)
+        except tensor_io.TensorIOError as e:
+            self._report_error(call, "Unsupported tensor file", str(e))
+            return
+
+        if fmt == 'raw':
+            if dtype == 'auto' or not dims:
+                self._report_error(node, "Untyped raw tensor",
+                                   f"'{path}' has no header; declare '{node.name}' with a dtype and shape.")
+            elif not tensor_io.raw_size_matches(path, dtype, dims):
+                self._report_error(node, "Tensor file size mismatch",
+                                   f"'{path}' is {os.path.getsize(path)} bytes, but {dtype} {dims} needs "
+                                   f"{tensor_io.raw_nbytes(dtype, dims)}.")
+            return
+
+        header = self._load_header(call)
+        if header is None:
+            return
+        f_dtype, f_shape = header
+        if dtype != 'auto' and dtype != f_dtype:
+            self._report_error(node, "Tensor file dtype mismatch",
+                               f"'{node.name}' is declared {dtype}, but '{path}' stores {f_dtype}.")
+        if dims is not None and list(dims) != f_shape:
+            self._report_error(node, "Tensor file shape mismatch",
+                               f"'{node.name}' is declared {list(dims)}, but '{path}' stores {f_shape}.")
+
     def visit_IfStmt(self, node):
         self.visit(node.condition)
-        self.enter_scope()
+        self.enter_scope('if')
         self.visit(node.then_block)
         self.exit_scope()
         if node.else_block:
-            self.enter_scope()
+            self.enter_scope('else')
             self.visit(node.else_block)
             self.exit_scope()
 
     def visit_ForStmt(self, node):
         self.visit(node.range)
-        self.enter_scope()
-        self.define(node, node.loop_var, 'int32', 'variable', shape=[], initialized=True)
+        if node.range.__class__.__name__ == 'Range':
+            var_type, var_shape = 'int32', []
+        else:
+            # Iterating a tensor yields its rows: the loop variable drops the leading dimension
+            var_type = self.get_type(node.range)
+            shape = self.get_shape(node.range)
+            var_shape = shape[1:] if shape else None
+            if shape == []:
+                self._report_error(node, "Invalid iteration", "A scalar cannot be iterated in a for loop.")
+        self.enter_scope('for')
+        self.define(node, node.loop_var, var_type, 'variable', shape=var_shape, initialized=True)
         self.visit(node.body)
         self.exit_scope()
 
@@ -219,39 +339,89 @@ class SemanticAnalyzer:
     # ==========================================
     #           TYPE INFERENCE SYSTEM
     # ==========================================
+    def infer(self, node):
+        """
+        Type and shape of an expression, computed once per node from the symbols
+        in scope where it appears and cached on it as 'node.static', for the
+        checks above and for the interpreter.
+        """
+        static = self.static.get(id(node))
+        if static is None:
+            static = StaticType(self._infer_type(node), self._infer_shape(node))
+            self.static[id(node)] = node.static = static
+        return static
+
     def get_type(self, node):
-        if node is None: return "unknown"
-        if isinstance(node, (int, float, str, bool)):
-            if isinstance(node, bool): return "bool"
-            if isinstance(node, int): return "int32"
-            if isinstance(node, float): return "float32"
-            return "string"
+        if not isinstance(node, Node):
+            return self._raw_type(node)
+        self._check_operand_types(node)
+        return self.infer(node).dtype
+
+    def get_shape(self, node):
+        if not isinstance(node, Node):
+            return []
+        return self.infer(node).shape
 
+    def _check_operand_types(self, node):
+        # Reported once per operator, the first time its type is asked for; operands first
+        if not isinstance(node, Node) or id(node) in self.type_checked:
+            return
+        self.type_checked.add(id(node))
         cls = node.__class__.__name__
-        if cls == 'Literal': return self.get_type(node.value)
+        if cls == 'BinOp':
+            self._check_operand_types(node.left)
+            self._check_operand_types(node.right)
+            lt, rt = self._type_of(node.left), self._type_of(node.right)
+            if lt != rt and "unknown" not in [lt, rt]:
+                self._report_error(node, "Incompatible types", f"Cannot operate on {lt} and {rt}.")
+        elif cls == 'ArrayAccess':
+            self._check_operand_types(getattr(node, 'target', None) or getattr(node, 'name', None))
+        elif cls == 'RecordAccess':
+            self._check_operand_types(node.record)
+        elif cls == 'FuncCall' and node.name == 'batches' and not self.lookup('batches') and node.args:
+            self._check_operand_types(node.args[0])
+
+    def _type_of(self, node):
+        return self.infer(node).dtype if isinstance(node, Node) else self._raw_type(node)
+
+    def _shape_of(self, node):
+        return self.infer(node).shape if isinstance(node, Node) else []
+
+    def _raw_type(self, value):
+        if isinstance(value, bool): return "bool"
+        if isinstance(value, int): return "int32"
+        if isinstance(value, float): return "float32"
+        if isinstance(value, str): return "string"
+        return "unknown"
+
+    def _infer_type(self, node):
+        cls = node.__class__.__name__
+        if cls == 'Literal': return self._raw_type(node.value)
         if cls == 'ArrayLiteral': return "float32"  # Defaulting to float for matrices
         if cls == 'Identifier':
             s = self.lookup(node.name)
             return s.symbol_type if s else "unknown"
         if cls == 'ArrayAccess':
             # Indexing usually reduces dimension but preserves base type
-            return self.get_type(getattr(node, 'target', None) or getattr(node, 'name', None))
+            return self._type_of(getattr(node, 'target', None) or getattr(node, 'name', None))
         if cls == 'RecordAccess':
-            target_type = self.get_type(node.record)
+            target_type = self._type_of(node.record)
             record_def = self.history.get(target_type)
             if record_def and record_def.category == 'record':
                 return record_def.params_count.get(node.field, "unknown")
             return "unknown"
+        if cls == 'FuncCall':
+            if node.name == 'load' and not self.lookup('load'):
+                header = self._load_header(node)
+                return header[0] if header else "unknown"
+            if node.name == 'batches' and not self.lookup('batches') and node.args:
+                return self._type_of(node.args[0])
+            return "unknown"
         if cls == 'BinOp':
-            lt, rt = self.get_type(node.left), self.get_type(node.right)
-            if lt != rt and "unknown" not in [lt, rt]:
-                self._report_error(node, "Incompatible types", f"Cannot operate on {lt} and {rt}.")
-            return lt
+            return self._type_of(node.left)
         return "unknown"
 
-    def get_shape(self, node):
-        if node is None: return []
-        if isinstance(node, (int, float, str, bool)): return []
+    def _infer_shape(self, node):
         cls = node.__class__.__name__
 
         if cls == 'Literal': return []
@@ -259,7 +429,7 @@ class SemanticAnalyzer:
         if cls == 'ArrayLiteral':
             # Recursive Detection: [ [1,2], [3,4] ] -> [2, 2]
             if len(node.elements) > 0:
-                return [len(node.elements)] + self.get_shape(node.elements[0])
+                return [len(node.elements)] + self._shape_of(node.elements[0])
             return [0]
 
         if cls == 'Identifier':
@@ -267,17 +437,63 @@ class SemanticAnalyzer:
             return s.shape if s else []
 
         if cls == 'ArrayAccess':
-            # Simplified: assuming full indexing results in a scalar for now
-            return []
+            return self._access_shape(node)
 
-        if cls == 'BinOp':
-            l_s = self.get_shape(node.left)
-            r_s = self.get_shape(node.right)
-            if node.op == '@':
-                # Matmul Shape Inference: (m,n) @ (n,p) -> (m,p)
-                res = l_s[:-1]
-                if len(r_s) > 1: res += r_s[1:]
-                return res
+        if cls == 'RecordAccess':
+            record_def = self.history.get(self._type_of(node.record))
+            if record_def and record_def.category == 'record':
+                return record_def.shape.get(node.field)
+            return None
+
+        if cls == 'FuncCall':
+            if node.name == 'load' and not self.lookup('load'):
+                header = self._load_header(node)
+                return header[1] if header else None
+            if node.name == 'batches' and not self.lookup('batches') and len(node.args) == 2:
+                # Sequence of [size, ...] slices; the final batch may be shorter
+                data_shape = self._shape_of(node.args[0])
+                size = node.args[1]
+                if not data_shape or size.__class__.__name__ != 'Literal':
+                    return None
+                return [None, size.value] + data_shape[1:]
+            symbol = self.lookup(node.name)
+            if symbol and symbol.category == 'function':
+                return symbol.shape
+            return None  # Builtin results are not tracked
+
+        if cls in ('BinOp', 'CompareOp'):
+            l_s = self._shape_of(node.left)
+            r_s = self._shape_of(node.right)
+            if l_s is None or r_s is None:
+                return None
+            try:
+                if node.op == '@':
+                    return shapes.matmul(l_s, r_s)
+                if node.op in shapes.ELEMENTWISE_OPS:
+                    return shapes.broadcast(l_s, r_s)
+            except shapes.ShapeError:
+                return None  # Reported by visit_BinOp
             return l_s
 
-        return []
\ No newline at end of file
+        return []
+
+    def _access_shape(self, node):
+        # Each integer index drops the leading dimension; a slice keeps it with its new length
+        if self._type_of(node.name) == "string":
+            return []  # A character is a string again
+        shape = self._shape_of(node.name)
+        index = node.index
+        try:
+            if isinstance(index, list):
+                return shapes.index(shape, len(index))
+            if index.__class__.__name__ == 'Slice':
+                if not shape:
+                    return None
+                bounds = [getattr(end, 'value', None) if end is not None else default
+                          for end, default in ((index.start, 0), (index.end, shape[0]))]
+                return [shapes.slice_length(shape[0], *bounds)] + shape[1:]
+            if self._shape_of(index) != []:
+                return None  # Indexing with an array gathers; its shape is not tracked
+            return shapes.index(shape, 1)
+        except shapes.ShapeError:
+            return None  # Reported by visit_ArrayAccess
@@ -0,0 +1,76 @@
+# Static shapes follow SemanticAnalyzer: a list of dimensions, [] for a scalar,
+# None when nothing is known. A dimension is an int, or None when only the rank is known.
+
+# Operators that apply element by element and broadcast their operands like NumPy
+ELEMENTWISE_OPS = ('+', '-', '*', '/', '%', '^', '==', '!=', '<', '>', '<=', '>=')
+
+
+class ShapeError(ValueError):
+    """Two shapes cannot be combined by the operator."""
+
+
+def broadcast(left, right):
+    """
+    The shape NumPy broadcasting gives two operands: dimensions are matched
+    from the right, and a dimension of 1 (or a missing one) stretches to the
+    other. An unknown dimension is assumed to fit.
+    """
+    if left is None or right is None:
+        return None
+    result = []
+    for n in range(1, max(len(left), len(right)) + 1):
+        a = left[-n] if n <= len(left) else 1
+        b = right[-n] if n <= len(right) else 1
+        result.append(_broadcast_dim(a, b, left, right))
+    return result[::-1]
+
+
+def _broadcast_dim(a, b, left, right):
+    if a == 1:
+        return b
+    if b == 1:
+        return a
+    if a is None or b is None:
+        return a if b is None else b  # The unknown one must be 1 or equal
+    if a != b:
+        raise ShapeError(f"Shapes {list(left)} and {list(right)} do not broadcast: {a} and {b} differ.")
+    return a
+
+
+def matmul(left, right):
+    """
+    The shape np.matmul gives: the last axis of the left operand contracts with
+    the first axis of a vector, or the second to last of a higher rank right
+    operand. A vector operand loses its added axis again, and the leading
+    (batch) axes of two stacks broadcast.
+    """
+    if left is None or right is None:
+        return None
+    if not left or not right:
+        raise ShapeError("Cannot multiply scalars with '@'.")
+    inner = right[0] if len(right) == 1 else right[-2]
+    if left[-1] is not None and inner is not None and left[-1] != inner:
+        raise ShapeError(f"Cannot multiply {list(left)} by {list(right)}. "
+                         f"Inner dims {left[-1]} and {inner} must match.")
+    batch = broadcast(left[:-2], right[:-2])
+    rows = list(left[-2:-1])
+    cols = list(right[-1:]) if len(right) > 1 else []
+    return batch + rows + cols
+
+
+def index(shape, count):
+    """The shape left after 'count' integer indices: the leading dimensions go."""
+    if shape is None:
+        return None
+    if count > len(shape):
+        raise ShapeError(f"{count} indices into a value of shape {list(shape)}.")
+    return list(shape[count:])
+
+
+def slice_length(dim, start, end):
+    """Length of [start..end] along a dimension of size 'dim'; None for anything not constant."""
+    if not isinstance(start, int) or not isinstance(end, int):
+        return None
+    if dim is None:
+        return max(end - start, 0) if 0 <= start <= end else None
+    return len(range(dim)[start:end])
@@ -0,0 +1,177 @@
+import sys
+
+
+class Scope:
+    __slots__ = ('id', 'parent', 'label', 'first_line', 'last_line')
+
+    def __init__(self, scope_id, parent, label):
+        self.id = scope_id
+        self.parent = parent  # Enclosing Scope, None for the global scope
+        self.label = label    # '<global>', a function name, 'if', 'else' or 'for'
+        self.first_line = None
+        self.last_line = None  # Lines the scope's code spans, for resolving a position
+
+    @property
+    def path(self):
+        return self.label if self.parent is None else f"{self.parent.path}/{self.label}"
+
+    def covers(self, line):
+        return self.first_line is not None and self.first_line <= line <= self.last_line
+
+
+class Declaration:
+    __slots__ = ('name', 'symbol', 'scope', 'lineno')
+
+    def __init__(self, name, symbol, scope, lineno):
+        self.name = name
+        self.symbol = symbol
+        self.scope = scope
+        self.lineno = lineno
+
+
+class SymbolTable:
+    """
+    Scoped symbols with O(1) lookup and O(1) scope exit per declaration. Each
+    name maps to a stack of (scope, symbol) entries, innermost last, and every
+    open scope keeps an undo log of the names it pushed, so leaving it pops
+    exactly those. Names are interned, so dict hits compare by identity.
+
+    Every declaration also goes into 'declarations', keyed by (scope id, name),
+    where it stays after its scope closes, so tools can resolve any name,
+    shadowed ones included, at any line once the analysis is done.
+    """
+
+    GLOBAL = 0
+
+    def __init__(self):
+        self.bindings = {}       # name -> [(Scope, Symbol), ...], innermost last
+        self.undo = [[]]         # Names pushed by each open scope, innermost last
+        self.open = [Scope(self.GLOBAL, None, '<global>')]
+        self.scopes = [self.open[0]]  # Every scope ever opened, in order; ids index this list
+        self.declarations = {}   # (scope id, name) -> Declaration
+        self.log = []            # Every Declaration, in the order it was made
+
+    @property
+    def current(self):
+        return self.open[-1]
+
+    def enter_scope(self, label):
+        scope = Scope(len(self.scopes), self.current, label)
+        self.scopes.append(scope)
+        self.open.append(scope)
+        self.undo.append([])
+
+    def exit_scope(self):
+        if len(self.open) == 1:
+            return
+        for name in self.undo.pop():
+            stack = self.bindings[name]
+            stack.pop()
+            if not stack:
+                del self.bindings[name]
+        scope = self.open.pop()
+        self._extend(self.current, scope.first_line, scope.last_line)
+
+    def lookup(self, name):
+        stack = self.bindings.get(name)
+        return stack[-1][1] if stack else None
+
+    def declared_here(self, name):
+        """The symbol 'name' has in the innermost scope itself, or None."""
+        stack = self.bindings.get(name)
+        if stack and stack[-1][0] is self.current:
+            return stack[-1][1]
+        return None
+
+    def define(self, name, symbol, lineno=None):
+        name = sys.intern(name)
+        scope = self.current
+        self.bindings.setdefault(name, []).append((scope, symbol))
+        self.undo[-1].append(name)
+        decl = self.declarations[(scope.id, name)] = Declaration(name, symbol, scope, lineno)
+        self.log.append(decl)
+        if lineno:
+            self.note_line(lineno)
+
+    def undefine_global(self, name):
+        """Drops a global so it can be declared again (the REPL replaces re-entered declarations)."""
+        stack = self.bindings.get(name)
+        if stack and stack[0][0].id == self.GLOBAL:
+            stack.pop(0)
+            if not stack:
+                del self.bindings[name]
+            self.undo[0].remove(name)
+
+    def note_line(self, lineno):
+        self._extend(self.current, lineno, lineno)
+
+    def _extend(self, scope, first, last):
+        if first is None:
+            return
+        if scope.first_line is None or first < scope.first_line:
+            scope.first_line = first
+        if scope.last_line is None or last > scope.last_line:
+            scope.last_line = last
+
+    # ==========================================
+    #             REPLAY (cached analyses)
+    # ==========================================
+
+    def restore_scope(self, parent, label, first_line, last_line):
+        """Re-creates a scope, already closed, that an earlier analysis of the same code opened."""
+        scope = Scope(len(self.scopes), parent, label)
+        self.scopes.append(scope)
+        self._extend(scope, first_line, last_line)
+        self._extend(parent, first_line, last_line)
+        return scope
+
+    def restore_declaration(self, scope, name, symbol, lineno):
+        decl = self.declarations[(scope.id, name)] = Declaration(name, symbol, scope, lineno)
+        self.log.append(decl)
+
+    # ==========================================
+    #             QUERIES (after analysis)
+    # ==========================================
+
+    def scope_at(self, line):
+        """The innermost scope whose code covers 'line' (the global scope otherwise)."""
+        best = self.scopes[0]
+        for scope in self.scopes[1:]:
+            if scope.covers(line) and self._depth(scope) > self._depth(best):
+                best = scope
+        return best
+
+    def resolve(self, name, line):
+        """The declaration 'name' refers to at 'line': the innermost one visible there, or None."""
+        scope = self.scope_at(line)
+        while scope is not None:
+            decl = self.declarations.get((scope.id, name))
+            # A name used above its declaration in the same scope still means the outer one
+            if decl is not None and (decl.lineno is None or decl.lineno <= line or scope.parent is None):
+                return decl
+            scope = scope.parent
+        return None
+
+    def _depth(self, scope):
+        depth = 0
+        while scope.parent is not None:
+            scope, depth = scope.parent, depth + 1
+        return depth
+
+    # ==========================================
+    #             SNAPSHOTS (REPL rollback)
+    # ==========================================
+
+    def snapshot(self):
+        """State to restore after a failed top-level analysis; only the global scope may be open."""
+        return ({name: list(stack) for name, stack in self.bindings.items()}, list(self.undo[0]),
+                len(self.scopes), dict(self.declarations), len(self.log))
+
+    def restore(self, state):
+        bindings, undo, scope_count, declarations, log_count = state
+        del self.log[log_count:]
+        self.bindings = bindings
+        self.undo = [undo]
+        self.open = [self.scopes[0]]
+        del self.scopes[scope_count:]
+        self.declarations = declarations
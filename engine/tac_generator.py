@@ -1,3 +1,361 @@
+import bisect
+import enum
+import heapq
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+from engine.ast import Node
+
+TAC_MAGIC = b"QTAC"
+TAC_VERSION = 1
+TAC_HEADER = "<4sHIIIB"
+# Operand encoding inside the code array: a pool index (>= 0), a register
+# r as -(r + 1), or NONE for an empty slot
+NONE = -2 ** 31
+
+
+class Opcode(enum.IntEnum):
+    LABEL = 0
+    FUNC = 1
+    ENDFUNC = 2
+    ALLOC = 3
+    COPY = 4
+    GOTO = 5
+    IF_FALSE = 6
+    IF_GE = 7
+    ITER = 8
+    NEXT = 9
+    PARAM = 10
+    CALL = 11
+    ARRAY = 12
+    RETURN = 13
+    PROBE = 14
+    INDEX = 15
+    STORE_INDEX = 16
+    SLICE = 17
+    FIELD = 18
+    STORE_FIELD = 19
+    # Unary operators
+    NEG = 20
+    NOT = 21
+    ADDR = 22
+    # Binary operators
+    ADD = 30
+    SUB = 31
+    MUL = 32
+    DIV = 33
+    MOD = 34
+    POW = 35
+    MATMUL = 36
+    EQ = 37
+    NE = 38
+    LT = 39
+    GT = 40
+    LE = 41
+    GE = 42
+    AND = 43
+    OR = 44
+
+
+BINARY_OPCODES = {'+': Opcode.ADD, '-': Opcode.SUB, '*': Opcode.MUL, '/': Opcode.DIV, '%': Opcode.MOD,
+                  '^': Opcode.POW, '@': Opcode.MATMUL, '==': Opcode.EQ, '!=': Opcode.NE, '<': Opcode.LT,
+                  '>': Opcode.GT, '<=': Opcode.LE, '>=': Opcode.GE, '&&': Opcode.AND, '||': Opcode.OR}
+UNARY_OPCODES = {'-': Opcode.NEG, '!': Opcode.NOT, '&': Opcode.ADDR}
+SYMBOLS = {code: op for table in (BINARY_OPCODES, UNARY_OPCODES) for op, code in table.items()}
+
+# Opcode -> (text form, whether slot 'a' is the result). Slots are a, b, c.
+FORMATS = {
+    Opcode.LABEL: ("{a}:", False),
+    Opcode.FUNC: ("FUNC {a}:", False),
+    Opcode.ENDFUNC: ("ENDFUNC", False),
+    Opcode.ALLOC: ("ALLOC {a} ({b})", True),
+    Opcode.COPY: ("{a} = {b}", True),
+    Opcode.GOTO: ("GOTO {a}", False),
+    Opcode.IF_FALSE: ("IF_FALSE {a} GOTO {b}", False),
+    Opcode.IF_GE: ("IF {a} >= {b} GOTO {c}", False),
+    Opcode.ITER: ("{a} = ITER {b}", True),
+    Opcode.NEXT: ("NEXT {a} {b} GOTO {c}", False),
+    Opcode.PARAM: ("PARAM {a}", False),
+    Opcode.CALL: ("{a} = CALL {b}, {c}", True),
+    Opcode.ARRAY: ("{a} = ARRAY {b}", True),
+    Opcode.RETURN: ("RETURN {a}", False),
+    Opcode.PROBE: ("PROBE {a}", False),
+    Opcode.INDEX: ("{a} = {b}[{c}]", True),
+    Opcode.STORE_INDEX: ("{a}[{b}] = {c}", False),
+    Opcode.SLICE: ("{a} = {b}..{c}", True),
+    Opcode.FIELD: ("{a} = {b}.{c}", True),
+    Opcode.STORE_FIELD: ("{a}.{b} = {c}", False),
+}
+for _code, _op in SYMBOLS.items():
+    FORMATS[_code] = ("{a} = {b} " + _op + " {c}", True) if _code >= Opcode.ADD else ("{a} = " + _op + "{b}", True)
+
+# Instructions whose last operand is a label they may jump to
+JUMPS = {Opcode.GOTO: 0, Opcode.IF_FALSE: 1, Opcode.IF_GE: 2, Opcode.NEXT: 2}
+
+# Pool entry kinds
+NAME = 0   # Variable, function, label or type name
+CONST = 1  # Literal value
+
+
+class TACInstr:
+    __slots__ = ('opcode', 'a', 'b', 'c')
+
+    def __init__(self, opcode, a, b, c):
+        self.opcode = Opcode(opcode)
+        self.a, self.b, self.c = a, b, c
+
+
+class TACProgram:
+    """
+    Three-address code as a flat int32 array, four slots per instruction:
+    the opcode and three operand ids. Names and constants live once each in
+    'pool'; temporaries are registers numbered from 0. Text is only built
+    when asked for, one line or table row per instruction.
+    """
+
+    def __init__(self):
+        self.code = array('i')
+        self.pool = []      # [(NAME or CONST, value)]
+        self.registers = 0  # Registers used after allocation
+        self.temps = 0      # Temporaries the generator created before allocation
+        self._interned = {}
+
+    def __len__(self):
+        return len(self.code) // 4
+
+    def __iter__(self):
+        code = self.code
+        for i in range(0, len(code), 4):
+            yield TACInstr(code[i], code[i + 1], code[i + 2], code[i + 3])
+
+    def __str__(self):
+        return "\n".join(self.lines())
+
+    def name(self, value):
+        return self._intern(NAME, value, (NAME, value))
+
+    def const(self, value):
+        try:
+            key = (CONST, type(value), value)
+            hash(key)
+        except TypeError:
+            key = (CONST, id(value))  # Arrays are not interned; the pool keeps the id from being reused
+        return self._intern(CONST, value, key)
+
+    def _intern(self, kind, value, key):
+        index = self._interned.get(key)
+        if index is None:
+            index = self._interned[key] = len(self.pool)
+            self.pool.append((kind, value))
+        return index
+
+    # ==========================================
+    #             TEXT
+    # ==========================================
+
+    def operand(self, operand):
+        if operand == NONE:
+            return ""
+        if operand < 0:
+            return f"r{-operand - 1}"
+        kind, value = self.pool[operand]
+        if kind == NAME:
+            return value
+        if isinstance(value, str):
+            return f'"{value}"'
+        if hasattr(value, 'shape') and value.shape:
+            dims = ",".join(str(d) for d in value.shape)
+            return f"<const {value.dtype}[{dims}]>"
+        return str(value)
+
+    def lines(self):
+        for instr in self:
+            text, _ = FORMATS[instr.opcode]
+            yield text.format(a=self.operand(instr.a), b=self.operand(instr.b), c=self.operand(instr.c)).rstrip()
+
+    def rows(self):
+        """[OP, ARG 1, ARG 2, RESULT] per instruction, for tabular views."""
+        for instr in self:
+            op = SYMBOLS.get(instr.opcode, "ASSIGN" if instr.opcode == Opcode.COPY else instr.opcode.name)
+            a, b, c = (self.operand(x) for x in (instr.a, instr.b, instr.c))
+            if FORMATS[instr.opcode][1]:
+                yield [op, b, c, a]
+            else:
+                yield [op, a, b, c]
+
+    # ==========================================
+    #             BINARY FORMAT
+    # ==========================================
+
+    def to_bytes(self):
+        """
+        Header ('QTAC', version, pool size, instruction count, registers,
+        operand width), the pool entries, one opcode byte per instruction, then
+        three operands per instruction as little-endian ints of that width:
+        2 bytes when every pool index and register fits, else 4.
+        """
+        narrow = len(self.pool) < 2 ** 15 and self.registers < 2 ** 15
+        parts = [struct.pack(TAC_HEADER, TAC_MAGIC, TAC_VERSION, len(self.pool), len(self), self.registers,
+                             2 if narrow else 4)]
+        for kind, value in self.pool:
+            parts.append(bytes((kind,)))
+            parts.append(_pack_value(value))
+        code = self.code
+        parts.append(array('B', code[0::4]).tobytes())
+        operands = array('i', code)
+        del operands[0::4]
+        if narrow:
+            operands = array('h', [-2 ** 15 if v == NONE else v for v in operands])
+        if sys.byteorder == 'big':
+            operands.byteswap()
+        parts.append(operands.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, pool_size, count, registers, width = struct.unpack_from(TAC_HEADER, data, 0)
+        if magic != TAC_MAGIC:
+            raise ValueError("Not a Quantel TAC file.")
+        if version != TAC_VERSION:
+            raise ValueError(f"TAC format version {version} is not supported (expected {TAC_VERSION}).")
+        program = cls()
+        program.registers = registers
+        offset = struct.calcsize(TAC_HEADER)
+        for _ in range(pool_size):
+            kind = data[offset]
+            value, offset = _unpack_value(data, offset + 1)
+            program.pool.append((kind, value))
+        opcodes = data[offset:offset + count]
+        offset += count
+        operands = array('h' if width == 2 else 'i', data[offset:offset + 3 * count * width])
+        if sys.byteorder == 'big':
+            operands.byteswap()
+        if width == 2:
+            operands = [NONE if v == -2 ** 15 else v for v in operands]
+        code = [0] * (4 * count)
+        code[0::4] = opcodes
+        code[1::4], code[2::4], code[3::4] = operands[0::3], operands[1::3], operands[2::3]
+        program.code = array('i', code)
+        return program
+
+
+def _pack_value(value):
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        dtype = value.dtype.str.encode()
+        header = struct.pack(f"<cB{len(dtype)}sB{value.ndim}Q", b'a', len(dtype), dtype, value.ndim, *value.shape)
+        return header + value.tobytes()
+    if isinstance(value, np.generic):
+        dtype = value.dtype.str.encode()
+        return struct.pack(f"<cB{len(dtype)}s", b'g', len(dtype), dtype) + value.tobytes()
+    if isinstance(value, bool):
+        return struct.pack("<c?", b'b', value)
+    if isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            return struct.pack("<cq", b'i', value)
+        text = str(value).encode()  # Folded integers may exceed 64 bits
+        return struct.pack("<cI", b'I', len(text)) + text
+    if isinstance(value, float):
+        return struct.pack("<cd", b'f', value)
+    if isinstance(value, str):
+        text = value.encode()
+        return struct.pack("<cI", b's', len(text)) + text
+    if value is None:
+        return b'n'
+    raise ValueError(f"Cannot serialize a TAC constant of type {type(value).__name__}.")
+
+
+def _unpack_value(data, offset):
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b'a' or tag == b'g':
+        size = data[offset]
+        dtype = np.dtype(bytes(data[offset + 1:offset + 1 + size]).decode())
+        offset += 1 + size
+        if tag == b'g':
+            return np.frombuffer(data, dtype, 1, offset)[0], offset + dtype.itemsize
+        ndim = data[offset]
+        shape = struct.unpack_from(f"<{ndim}Q", data, offset + 1)
+        offset += 1 + 8 * ndim
+        count = int(np.prod(shape))
+        value = np.frombuffer(data, dtype, count, offset).reshape(shape).copy()
+        return value, offset + count * dtype.itemsize
+    if tag == b'b':
+        return struct.unpack_from("<?", data, offset)[0], offset + 1
+    if tag == b'i':
+        return struct.unpack_from("<q", data, offset)[0], offset + 8
+    if tag == b'f':
+        return struct.unpack_from("<d", data, offset)[0], offset + 8
+    if tag == b'I' or tag == b's':
+        size = struct.unpack_from("<I", data, offset)[0]
+        text = bytes(data[offset + 4:offset + 4 + size]).decode()
+        return (int(text) if tag == b'I' else text), offset + 4 + size
+    if tag == b'n':
+        return None, offset
+    raise ValueError(f"Unknown TAC constant tag {tag!r}.")
+
+
+def allocate_registers(program):
+    """
+    Maps the generator's temporaries onto as few registers as possible. Each
+    temporary lives from its definition to its last use; one that is live at
+    the head of a loop stays live until the loop's backward jump. A linear
+    scan then hands out the lowest free register, reusing those of
+    temporaries that have died (an instruction reads before it writes).
+    """
+    values = program.code.tolist()
+    start, end = {}, {}
+    labels, jumps = {}, []
+    for pc in range(0, len(values), 4):
+        opcode = values[pc]
+        if opcode == Opcode.LABEL:
+            labels[values[pc + 1]] = pc
+        elif opcode in JUMPS:
+            jumps.append((pc, values[pc + 1 + JUMPS[opcode]]))
+    for i, operand in enumerate(values):
+        if NONE < operand < 0:  # Opcodes are never negative
+            if operand not in start:
+                start[operand] = i & ~3
+            end[operand] = i & ~3
+
+    headers = {}  # Loop head position -> position of its furthest backward jump
+    for pc, label in jumps:
+        head = labels.get(label)
+        if head is not None and head < pc:
+            headers[head] = max(pc, headers.get(head, pc))
+
+    heads = sorted(headers)
+    for temp, first in start.items():
+        last = end[temp]
+        i = bisect.bisect_right(heads, first)
+        while i < len(heads) and heads[i] <= last:
+            last = max(last, headers[heads[i]])
+            i += 1
+        end[temp] = last
+
+    assigned = {}
+    active = []  # (end, register) of the temporaries still live
+    free = []
+    registers = 0
+    for temp in sorted(start, key=start.get):
+        first = start[temp]
+        while active and active[0][0] <= first:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            register = heapq.heappop(free)
+        else:
+            register, registers = registers, registers + 1
+        assigned[temp] = register
+        heapq.heappush(active, (end[temp], register))
+
+    program.code = array('i', [-assigned[v] - 1 if NONE < v < 0 else v for v in values])
+    program.registers = registers
+    return registers
+
+
 class TACGenerator:
     """
     Converts AST into Three-Address Code (TAC) for debugging.
@@ -5,34 +363,50 @@ class TACGenerator:
 
     def __init__(self):
         self.temp_counter = 0
-        self.instructions = []
+        self.label_counter = 0
+        self.program = TACProgram()
+        self.loops = []  # (continue label, break label) of the enclosing loops
+        self.visitors = {}
 
     def new_temp(self):
         self.temp_counter += 1
-        return f"t{self.temp_counter}"
+        return -self.temp_counter
+
+    def new_label(self, kind, label_id):
+        return self.program.name(f"L_{kind}_{label_id}")
 
     def generate(self, node):
-        self.instructions = []
+        self.program = TACProgram()
         self.temp_counter = 0
+        self.label_counter = 0
         if node:
             self.visit(node)
-        return "\n".join(self.instructions)
+        self.program.temps = self.temp_counter
+        allocate_registers(self.program)
+        return self.program
+
+    def emit(self, opcode, a=NONE, b=NONE, c=NONE):
+        self.program.code.extend((opcode, a, b, c))
 
     def visit(self, node):
         if node is None:
-            return "null"
+            return NONE
 
         if isinstance(node, list):
             for stmt in node:
                 self.visit(stmt)
-            return
+            return NONE
 
-        method_name = 'visit_' + node.__class__.__name__
-        visitor = getattr(self, method_name, self.generic_visit)
+        visitor = self.visitors.get(node.__class__)
+        if visitor is None:
+            visitor = self.visitors[node.__class__] = getattr(self, 'visit_' + node.__class__.__name__,
+                                                              self.generic_visit)
         return visitor(node)
 
     def generic_visit(self, node):
-        return f"<{node.__class__.__name__}>"
+        if isinstance(node, Node):
+            return self.program.name(f"<{node.__class__.__name__}>")
+        return self.program.const(node)  # Raw values the optimizer left in place
 
     # --- Statements ---
 
@@ -40,111 +414,214 @@ class TACGenerator:
         self.visit(node.statements)
 
     def visit_FuncDecl(self, node):
-        # Crucial: This allows the generator to enter the 'main' function
-        self.instructions.append(f"FUNC {node.name}:")
-        # Check if your AST uses node.body or node.block
-        body = getattr(node, 'body', getattr(node, 'block', None))
-        self.visit(body)
-        self.instructions.append(f"ENDFUNC")
+        self.emit(Opcode.FUNC, self.program.name(node.name))
+        self.visit(node.body)
+        self.emit(Opcode.ENDFUNC)
+
+    def visit_RecordDecl(self, node):
+        return NONE
 
     def visit_Block(self, node):
         self.visit(node.statements)
 
     def visit_ExprStmt(self, node):
-        child = getattr(node, 'expr', getattr(node, 'expression', None))
-        if child:
-            self.visit(child)
+        if node.expr:
+            self.visit(node.expr)
 
     def visit_VarDecl(self, node):
+        name = self.program.name(node.name)
         if node.value:
-            val = self.visit(node.value)
-            self.instructions.append(f"{node.name} = {val}")
+            self.emit(Opcode.COPY, name, self.visit(node.value))
         else:
-            type_name = getattr(node, 'var_type', 'auto')
-            self.instructions.append(f"ALLOC {node.name} ({type_name})")
+            self.emit(Opcode.ALLOC, name, self.program.name(node.dtype))
+
+    def visit_PointerDecl(self, node):
+        self.emit(Opcode.ADDR, self.program.name(node.name), self.program.name(node.target))
 
     def visit_Assignment(self, node):
-        target = getattr(node.target, 'name', node.target if isinstance(node.target, str) else "unknown")
         val = self.visit(node.value)
-        self.instructions.append(f"{target} {node.op} {val}")
+        target = node.target
+        cls = target.__class__.__name__
+        if cls == 'ArrayAccess':
+            base, index = self.visit(target.name), self._index(target.index)
+            if node.op != '=':
+                current = self.new_temp()
+                self.emit(Opcode.INDEX, current, base, index)
+                val = self._binary(node.op[:-1], current, val)
+            self.emit(Opcode.STORE_INDEX, base, index, val)
+            return
+        if cls == 'RecordAccess':
+            record, field = self.visit(target.record), self.program.name(target.field)
+            if node.op != '=':
+                current = self.new_temp()
+                self.emit(Opcode.FIELD, current, record, field)
+                val = self._binary(node.op[:-1], current, val)
+            self.emit(Opcode.STORE_FIELD, record, field, val)
+            return
+        name = self.program.name(target.name)
+        if node.op == '=':
+            self.emit(Opcode.COPY, name, val)
+        else:
+            self.emit(BINARY_OPCODES[node.op[:-1]], name, name, val)
 
     def visit_Probe(self, node):
-        expr_node = getattr(node, 'expression', getattr(node, 'value', None))
+        self.emit(Opcode.PROBE, self.visit(node.target))
 
-        if expr_node is None:
-            attrs = [v for k, v in vars(node).items() if k != 'lineno']
-            expr_node = attrs[0] if attrs else None
+    def visit_Return(self, node):
+        self.emit(Opcode.RETURN, self.visit(node.value) if node.value else NONE)
 
-        val = self.visit(expr_node)
-        self.instructions.append(f"PROBE {val}")
+    def visit_Break(self, node):
+        if self.loops:
+            self.emit(Opcode.GOTO, self.loops[-1][1])
 
-    def visit_ReturnStmt(self, node):
-        val = self.visit(node.value) if node.value else "void"
-        self.instructions.append(f"RETURN {val}")
+    def visit_Continue(self, node):
+        if self.loops:
+            self.emit(Opcode.GOTO, self.loops[-1][0])
 
     def visit_IfStmt(self, node):
-        label_id = self.temp_counter  # unique ID for labels
-        self.temp_counter += 1
-
+        label_id = self._label_id()
         condition = self.visit(node.condition)
-        label_else = f"L_ELSE_{label_id}"
-        label_end = f"L_END_{label_id}"
+        label_else = self.new_label("ELSE", label_id)
+        label_end = self.new_label("END", label_id)
 
-        self.instructions.append(f"IF_FALSE {condition} GOTO {label_else}")
+        self.emit(Opcode.IF_FALSE, condition, label_else)
         self.visit(node.then_block)
-        self.instructions.append(f"GOTO {label_end}")
-        self.instructions.append(f"{label_else}:")
+        self.emit(Opcode.GOTO, label_end)
+        self.emit(Opcode.LABEL, label_else)
         if node.else_block:
             self.visit(node.else_block)
-        self.instructions.append(f"{label_end}:")
+        self.emit(Opcode.LABEL, label_end)
+
+    def visit_WhileStmt(self, node):
+        label_id = self._label_id()
+        loop_start = self.new_label("WHILE_START", label_id)
+        loop_end = self.new_label("WHILE_END", label_id)
+
+        self.emit(Opcode.LABEL, loop_start)
+        self.emit(Opcode.IF_FALSE, self.visit(node.condition), loop_end)
+        self._loop_body(node.body, loop_start, loop_end)
+        self.emit(Opcode.GOTO, loop_start)
+        self.emit(Opcode.LABEL, loop_end)
+
+    def visit_RepeatUntilStmt(self, node):
+        label_id = self._label_id()
+        loop_start = self.new_label("REPEAT_START", label_id)
+        loop_test = self.new_label("REPEAT_TEST", label_id)
+        loop_end = self.new_label("REPEAT_END", label_id)
+
+        self.emit(Opcode.LABEL, loop_start)
+        self._loop_body(node.body, loop_test, loop_end)
+        self.emit(Opcode.LABEL, loop_test)
+        self.emit(Opcode.IF_FALSE, self.visit(node.condition), loop_start)
+        self.emit(Opcode.LABEL, loop_end)
 
     def visit_ForStmt(self, node):
         # Fallback for loops that were NOT unrolled by the optimizer
-        label_id = self.temp_counter
-        self.temp_counter += 1
+        label_id = self._label_id()
+        loop_var = self.program.name(node.loop_var)
+        loop_start = self.new_label("FOR_START", label_id)
+        loop_end = self.new_label("FOR_END", label_id)
+
+        if node.range.__class__.__name__ != 'Range':
+            iterable = self.visit(node.range)
+            iterator = self.new_temp()
+            self.emit(Opcode.ITER, iterator, iterable)
+            self.emit(Opcode.LABEL, loop_start)
+            self.emit(Opcode.NEXT, loop_var, iterator, loop_end)
+            self._loop_body(node.body, loop_start, loop_end)
+            self.emit(Opcode.GOTO, loop_start)
+            self.emit(Opcode.LABEL, loop_end)
+            return
 
         start = self.visit(node.range.start)
         end = self.visit(node.range.end)
+        step = self.visit(node.range.step)
+        loop_next = self.new_label("FOR_NEXT", label_id)
+
+        self.emit(Opcode.COPY, loop_var, start)
+        self.emit(Opcode.LABEL, loop_start)
+        self.emit(Opcode.IF_GE, loop_var, end, loop_end)
+        self._loop_body(node.body, loop_next, loop_end)
+        self.emit(Opcode.LABEL, loop_next)
+        self.emit(Opcode.ADD, loop_var, loop_var, step)
+        self.emit(Opcode.GOTO, loop_start)
+        self.emit(Opcode.LABEL, loop_end)
+
+    def _loop_body(self, body, continue_label, break_label):
+        self.loops.append((continue_label, break_label))
+        self.visit(body)
+        self.loops.pop()
 
-        loop_start = f"L_FOR_START_{label_id}"
-        loop_end = f"L_FOR_END_{label_id}"
-
-        self.instructions.append(f"{node.loop_var} = {start}")
-        self.instructions.append(f"{loop_start}:")
-        self.instructions.append(f"IF {node.loop_var} >= {end} GOTO {loop_end}")
-
-        self.visit(node.body)
-
-        self.instructions.append(f"{node.loop_var} = {node.loop_var} + 1")
-        self.instructions.append(f"GOTO {loop_start}")
-        self.instructions.append(f"{loop_end}:")
+    def _label_id(self):
+        self.label_counter += 1
+        return self.label_counter - 1
 
     # --- Expressions ---
 
     def visit_BinOp(self, node):
         left = self.visit(node.left)
         right = self.visit(node.right)
+        return self._binary(node.op, left, right)
+
+    visit_CompareOp = visit_BinOp
+
+    def _binary(self, op, left, right):
         temp = self.new_temp()
-        self.instructions.append(f"{temp} = {left} {node.op} {right}")
+        self.emit(BINARY_OPCODES[op], temp, left, right)
         return temp
 
     def visit_UnaryOp(self, node):
         operand = self.visit(node.operand)
         temp = self.new_temp()
-        self.instructions.append(f"{temp} = {node.op}{operand}")
+        self.emit(UNARY_OPCODES[node.op], temp, operand)
         return temp
 
     def visit_Literal(self, node):
-        if isinstance(node.value, str):
-            return f'"{node.value}"'
-        return str(node.value)
+        return self.program.const(node.value)
 
     def visit_Identifier(self, node):
-        return node.name
+        return self.program.name(node.name)
+
+    def visit_ArrayAccess(self, node):
+        base = self.visit(node.name)
+        index = self._index(node.index)
+        temp = self.new_temp()
+        self.emit(Opcode.INDEX, temp, base, index)
+        return temp
+
+    def _index(self, index):
+        if isinstance(index, list):
+            return self._array(index)  # m[i, j] indexes with the tuple (i, j)
+        return self.visit(index)
+
+    def visit_Slice(self, node):
+        start = self.visit(node.start) if node.start is not None else self.program.const(0)
+        end = self.visit(node.end) if node.end is not None else NONE
+        temp = self.new_temp()
+        self.emit(Opcode.SLICE, temp, start, end)
+        return temp
+
+    def visit_RecordAccess(self, node):
+        record = self.visit(node.record)
+        temp = self.new_temp()
+        self.emit(Opcode.FIELD, temp, record, self.program.name(node.field))
+        return temp
+
+    def visit_ArrayLiteral(self, node):
+        return self._array(node.elements)
+
+    def _array(self, elements):
+        values = [self.visit(el) for el in elements]
+        for value in values:
+            self.emit(Opcode.PARAM, value)
+        temp = self.new_temp()
+        self.emit(Opcode.ARRAY, temp, self.program.const(len(values)))
+        return temp
 
     def visit_FuncCall(self, node):
-        args = [str(self.visit(arg)) for arg in (node.args or [])]
-        arg_str = ", ".join(args)
+        args = [self.visit(arg) for arg in (node.args or [])]
+        for arg in args:
+            self.emit(Opcode.PARAM, arg)
         temp = self.new_temp()
-        self.instructions.append(f"{temp} = CALL {node.name}({arg_str})")
-        return temp
\ No newline at end of file
+        self.emit(Opcode.CALL, temp, self.program.name(node.name), self.program.const(len(args)))
+        return temp
@@ -0,0 +1,133 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+
+RAW_EXTENSIONS = ('.bin', '.raw')
+
+
+class TensorIOError(Exception):
+    pass
+
+
+def format_of(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy': return 'npy'
+    if ext == '.npz': return 'npz'
+    if ext in RAW_EXTENSIONS: return 'raw'
+    raise TensorIOError(f"Unsupported tensor file '{path}'. Use .npy, .npz, .bin or .raw.")
+
+
+def _read_npy_header(f):
+    """Reads an .npy header at the current position; returns (dtype, shape, fortran_order)."""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    return dtype, shape, fortran_order
+
+
+def _npz_member(path, key):
+    """Returns (data_offset, dtype, shape, fortran_order) for an uncompressed npz member, else None."""
+    with zipfile.ZipFile(path) as zf:
+        try:
+            info = zf.getinfo(key + '.npy')
+        except KeyError:
+            raise TensorIOError(f"Key '{key}' not found in '{path}'. Available: {', '.join(n[:-4] for n in zf.namelist())}")
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+
+    with open(path, 'rb') as f:
+        # Local file header: fixed 30 bytes, then file name and extra field
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', local[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        dtype, shape, fortran_order = _read_npy_header(f)
+        return f.tell(), dtype, shape, fortran_order
+
+
+def read_header(path, key=None):
+    """
+    Returns (dtype_name, shape) stored in a tensor file without reading its data,
+    or None for raw binary files (which carry no header).
+    """
+    fmt = format_of(path)
+    if fmt == 'raw':
+        return None
+    if fmt == 'npy':
+        with open(path, 'rb') as f:
+            dtype, shape, _ = _read_npy_header(f)
+        return dtype.name, list(shape)
+
+    if key is None:
+        raise TensorIOError(f"Loading from '{path}' requires a key: load(\"{path}\", \"name\").")
+    member = _npz_member(path, key)
+    if member is None:
+        with np.load(path) as archive:
+            arr = archive[key]
+        return arr.dtype.name, list(arr.shape)
+    _, dtype, shape, _ = member
+    return dtype.name, list(shape)
+
+
+def load(path, key=None, dtype=None, shape=None):
+    """
+    Opens a tensor file as a read-only memory map. Raw binary files need the
+    dtype and shape from the variable declaration. Compressed .npz members
+    cannot be mapped and are read into memory instead.
+    """
+    if not os.path.exists(path):
+        raise TensorIOError(f"Tensor file '{path}' not found.")
+
+    fmt = format_of(path)
+    if fmt == 'npy':
+        return np.load(path, mmap_mode='r')
+
+    if fmt == 'npz':
+        if key is None:
+            raise TensorIOError(f"Loading from '{path}' requires a key: load(\"{path}\", \"name\").")
+        member = _npz_member(path, key)
+        if member is None:
+            with np.load(path) as archive:
+                return archive[key]
+        offset, m_dtype, m_shape, fortran_order = member
+        order = 'F' if fortran_order else 'C'
+        return np.memmap(path, dtype=m_dtype, mode='r', offset=offset, shape=m_shape, order=order)
+
+    if dtype is None or dtype == 'auto' or not shape:
+        raise TensorIOError(f"Raw tensor file '{path}' needs a declared dtype and shape.")
+    return np.memmap(path, dtype=np.dtype(dtype), mode='r', shape=tuple(shape))
+
+
+def save(path, value, key=None):
+    arr = np.asarray(value)
+    fmt = format_of(path)
+    if fmt == 'npy':
+        np.save(path, arr)
+    elif fmt == 'raw':
+        arr.tofile(path)
+    else:
+        if key is None:
+            raise TensorIOError(f"Saving to '{path}' requires a key: save(\"{path}\", value, \"name\").")
+        members = {}
+        if os.path.exists(path):
+            with np.load(path) as archive:
+                members = {name: archive[name] for name in archive.files}
+        members[key] = arr
+        # Stored (uncompressed) so members can be memory-mapped on load
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **members)
+        os.replace(tmp_path, path)
+    return None
+
+
+def raw_nbytes(dtype, shape):
+    return int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+
+def raw_size_matches(path, dtype, shape):
+    return os.path.getsize(path) == raw_nbytes(dtype, shape)
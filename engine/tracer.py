@@ -0,0 +1,98 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class QuantelTracer:
+    """
+    Records timeline spans into a bounded ring buffer and exports them as
+    Chrome trace JSON (loadable in chrome://tracing or Perfetto). A span is
+    stored as one complete ("X") event when it ends, so overflowing the
+    buffer drops whole spans and never leaves an end without its begin.
+    """
+
+    def __init__(self, capacity=200000):
+        self.events = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.recorded = 0
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._open = threading.local()  # Per-thread stack of (name, category, start, args)
+
+    def _now(self):
+        # Chrome traces use microsecond timestamps
+        return (time.perf_counter_ns() - self._origin) / 1000.0
+
+    def _stack(self):
+        stack = getattr(self._open, "spans", None)
+        if stack is None:
+            stack = self._open.spans = []
+        return stack
+
+    def begin(self, name, category="phase", **args):
+        self._stack().append((name, category, self._now(), args))
+
+    def end(self, name, category="phase", **args):
+        """Closes the innermost open span; its begin and end args are merged."""
+        stack = self._stack()
+        if not stack:
+            return
+        name, category, start, begin_args = stack.pop()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start,
+            "dur": self._now() - start,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+        }
+        if begin_args or args:
+            event["args"] = {**begin_args, **args}
+        self.events.append(event)
+        self.recorded += 1
+
+    @contextlib.contextmanager
+    def span(self, name, category="phase", **args):
+        """
+        Wraps a block in a span. The yielded dict is added to the span's args
+        when it ends, so callers can report results (e.g. a 'changed' flag).
+        """
+        end_args = {}
+        self.begin(name, category, **args)
+        try:
+            yield end_args
+        finally:
+            self.end(name, category, **end_args)
+
+    @property
+    def dropped(self):
+        return self.recorded - len(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self.recorded = 0
+
+    # ==========================================
+    #             EXPORT
+    # ==========================================
+    def to_chrome_trace(self):
+        return {
+            "traceEvents": list(self.events),
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def trace_span(tracer, name, category="phase", **args):
+    """Returns tracer.span(...) or a no-op context when tracing is off."""
+    if tracer is None:
+        return contextlib.nullcontext({})
+    return tracer.span(name, category, **args)
@@ -0,0 +1,175 @@
+import numpy as np
+
+from engine import const_eval, shapes
+from engine.def_use import DefUseIndex
+
+# A kind describes the run-time value an expression produces:
+#   'bool', 'int', 'float', 'str'        exactly that Python type
+#   ArrayKind(dtype, shape)              an ndarray with that dtype and shape
+#   None                                 unknown
+# Names start at TOP (no definition seen yet) while the kinds are being solved.
+TOP = object()
+SCALAR_KINDS = ('bool', 'int', 'float')  # Numeric Python scalars
+COMPARISONS = ('==', '!=', '<', '>', '<=', '>=')
+
+
+class ArrayKind:
+    __slots__ = ('dtype', 'shape')
+
+    def __init__(self, dtype, shape):
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayKind) and self.dtype == other.dtype and self.shape == other.shape
+
+    def __hash__(self):
+        return hash((self.dtype, self.shape))
+
+    def __repr__(self):
+        return f"{self.dtype.name}{list(self.shape)}"
+
+
+class ValueKinds:
+    """
+    Flow-insensitive value kinds for every variable: the join of what all of
+    its definitions (in any scope) can store. A kind is only reported when
+    every definition agrees, so declared dtypes, which the interpreter never
+    enforces, are not trusted; array dtypes and shapes come from constants
+    and from the tensor file headers SemanticAnalyzer already read.
+    """
+
+    def __init__(self, tree, external=(), load_headers=None):
+        self.external = set(external)
+        self.load_headers = load_headers or {}
+        self.names = {}
+        index = DefUseIndex(tree)
+        self.solving = set(index.defs)  # Names still TOP while solving
+        self._solve(index)
+        self.solving = set()
+
+    def _solve(self, index):
+        # Kinds only move TOP -> kind -> None, so this settles after a few rounds
+        changed = True
+        while changed:
+            changed = False
+            for name, defs in index.defs.items():
+                kind = TOP
+                for node in defs:
+                    kind = self._join(kind, self._def_kind(name, node))
+                    if kind is None:
+                        break
+                if kind is not TOP and self.names.get(name, TOP) != kind:
+                    self.names[name] = kind
+                    changed = True
+
+    def _def_kind(self, name, node):
+        cls = node.__class__.__name__
+        if cls == 'VarDecl':
+            if name in self.external or node.value is None:
+                return None
+            return self.kind_of(node.value)
+        if cls == 'PointerDecl':
+            return 'str'
+        if cls == 'ForStmt':
+            # range() bounds are passed through int() by the interpreter
+            return 'int' if node.range.__class__.__name__ == 'Range' else None
+        if cls == 'Assignment':
+            if node.target.__class__.__name__ != 'Identifier':
+                return None
+            value = self.kind_of(node.value)
+            if node.op == '=':
+                return value
+            return self._binop_kind(node.op[:-1], self.names.get(name, TOP), value)
+        return None  # Function parameters take whatever the caller passes
+
+    def _join(self, a, b):
+        if a is TOP: return b
+        if b is TOP: return a
+        return a if a == b else None
+
+    # ==========================================
+    #             EXPRESSIONS
+    # ==========================================
+
+    def kind_of(self, node):
+        cls = node.__class__.__name__
+        if cls == 'Literal':
+            return self.constant_kind(node.value)
+        if isinstance(node, bool): return 'bool'
+        if isinstance(node, int): return 'int'
+        if cls == 'Identifier':
+            return self.names.get(node.name, TOP if node.name in self.solving else None)
+        if cls in ('BinOp', 'CompareOp'):
+            return self._binop_kind(node.op, self.kind_of(node.left), self.kind_of(node.right))
+        if cls == 'UnaryOp':
+            return self._unary_kind(node.op, self.kind_of(node.operand))
+        if cls == 'FuncCall' and node.name == 'load':
+            header = self.load_headers.get(id(node))
+            return ArrayKind(header[0], header[1]) if header else None
+        return None
+
+    def constant_kind(self, value):
+        # Exact types only: numpy scalars (np.float64 subclasses float) behave differently
+        if type(value) in (bool, int, float, str):
+            return type(value).__name__
+        if isinstance(value, np.ndarray):
+            return ArrayKind(value.dtype, value.shape)
+        return None
+
+    def _binop_kind(self, op, left, right):
+        if left is TOP or right is TOP:
+            return TOP
+        if left is None or right is None:
+            return None
+        if isinstance(left, ArrayKind) or isinstance(right, ArrayKind):
+            return self._array_kind(op, left, right)
+        if op in COMPARISONS:
+            return 'bool'
+        if op in ('&&', '||'):
+            return left if left == right else None  # 'and'/'or' return one of the operands
+        if left == 'str' or right == 'str':
+            if op == '+' and left == right:
+                return 'str'
+            if op == '*' and {left, right} == {'str', 'int'}:
+                return 'str'
+            return None
+        if op == '/':
+            return 'float'
+        if op in ('+', '-', '*', '%'):
+            return 'float' if 'float' in (left, right) else 'int'
+        return None  # '^' depends on the sign of the exponent
+
+    def _array_kind(self, op, left, right):
+        if op not in ('+', '-', '*', '/', '%'):
+            return None
+        try:
+            shape = shapes.broadcast(*(list(k.shape) if isinstance(k, ArrayKind) else [] for k in (left, right)))
+        except shapes.ShapeError:
+            return None
+        samples = [self._sample(left), self._sample(right)]
+        if any(sample is None for sample in samples):
+            return None
+        # numpy decides the promoted dtype; one-element samples are enough to ask it
+        with np.errstate(all='ignore'):
+            dtype = const_eval.BINARY_OPS[op](*samples).dtype
+        return ArrayKind(dtype, shape)
+
+    def _sample(self, kind):
+        if isinstance(kind, ArrayKind):
+            return np.ones(1, dtype=kind.dtype)
+        return {'bool': True, 'int': 1, 'float': 1.0}.get(kind)
+
+    def _unary_kind(self, op, operand):
+        if operand is TOP:
+            return TOP
+        if op == '!':
+            return 'bool'
+        if op == '-':
+            if operand in ('bool', 'int'):
+                return 'int'
+            if operand == 'float':
+                return 'float'
+            if isinstance(operand, ArrayKind) and operand.dtype.kind in 'iuf':
+                return operand
+        return None
@@ -59,7 +59,7 @@ class EditorPanel(ctk.CTkFrame):
         index = self.textbox.index(f"@{event.x},{event.y}")
         word = self.textbox.get(f"{index} wordstart", f"{index} wordend").strip()
         if word and self.on_word_click:
-            self.on_word_click(word)
+            self.on_word_click(word, int(index.split('.')[0]))
 
     def highlight_line(self, line_number):
         """THE MISSING METHOD: Highlights the line and scrolls to it."""
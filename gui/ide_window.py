@@ -1,7 +1,6 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog
-import io
 import contextlib
 import re
 
@@ -14,6 +13,10 @@ from gui.utils import render_ast_tree
 
 # --- Engine Imports ---
 from engine.lexer import QuantelLexer
+from engine.tracer import QuantelTracer
+from engine.incremental import IncrementalAnalyzer
+from engine.probe import ProbeStream
+from engine.memory import MemoryTracker
 
 # Safe Import for Parser/Interpreter/Optimizer
 try:
@@ -41,6 +44,10 @@ class QuantelIDE(ctk.CTk):
         self.show_memory = True
         self.show_tac = True
         self.interpreter_instance = None
+        self.tracer = QuantelTracer()
+        self.memory_tracker = None
+        self.symbol_table = None  # SymbolTable of the last analyzed run, for jump-to-definition
+        self.incremental = IncrementalAnalyzer()  # Reuses each statement's analysis across runs
 
         # 2. Main Layout
         self.main_pane = tk.PanedWindow(self, orient=tk.VERTICAL, bg="#2b2b2b", bd=0, sashwidth=6)
@@ -84,9 +91,15 @@ class QuantelIDE(ctk.CTk):
     # BRIDGE METHODS
     # -------------------------------------------------------------------------
 
-    def jump_to_definition(self, word):
-        """Scans code for declarations or assignments of the given word."""
+    def jump_to_definition(self, word, line=None):
+        """Resolves the word through the last analysis' symbol table, or scans the code for a declaration."""
         if not word: return
+        if self.symbol_table is not None and line is not None:
+            decl = self.symbol_table.resolve(word, line)
+            if decl is not None and decl.lineno:
+                self.editor_panel.highlight_line(decl.lineno)
+                return
+
         code = self.editor_panel.get_text()
         patterns = [rf"func\s+{word}\b", rf"var\s+{word}\b", rf"auto\s+{word}\b", rf"\b{word}\s*="]
 
@@ -127,11 +140,14 @@ class QuantelIDE(ctk.CTk):
         self.output_panel.select_tab("Output")
 
         code = self.editor_panel.get_text()
+        tracer = self.tracer
+        tracer.clear()
 
         try:
             # --- PHASE 1: LEXER ---
             lexer = QuantelLexer()
-            tokens = list(lexer.tokenize(code))
+            with tracer.span("lex"):
+                tokens = list(lexer.tokenize(code))
             self.output_panel.update_lexer_tab(tokens)
 
             if lexer.errors:
@@ -147,7 +163,8 @@ class QuantelIDE(ctk.CTk):
                 return
 
             parser = QuantelParser()
-            ast_tree = parser.parse(iter(tokens), source_text=code)
+            with tracer.span("parse"):
+                ast_tree = parser.parse(iter(tokens), source_text=code)
 
             if parser.errors:
                 for err in parser.errors:
@@ -157,10 +174,11 @@ class QuantelIDE(ctk.CTk):
                 return
 
             # --- PHASE 2.1: SEMANTIC ANALYSIS ---
-            from engine.semantic_analyzer import SemanticAnalyzer
-            analyzer = SemanticAnalyzer()
-            analyzer.analyze(ast_tree)
+            with tracer.span("semantic") as span:
+                analyzer = self.incremental.analyze(ast_tree)
+                span.update(self.incremental.stats)
             semantic_errors = analyzer.errors
+            self.symbol_table = analyzer.symbols
 
             if semantic_errors:
                 for err in semantic_errors:
@@ -176,8 +194,9 @@ class QuantelIDE(ctk.CTk):
             if ast_tree:
                 # --- OPTIMIZER ---
                 if QuantelOptimizer:
-                    optimizer = QuantelOptimizer()
-                    ast_tree = optimizer.optimize(ast_tree)
+                    optimizer = QuantelOptimizer(tracer=tracer, analyzer=analyzer)
+                    with tracer.span("optimize"):
+                        ast_tree = optimizer.optimize(ast_tree)
                     if optimizer.changed:
                         self.output_panel.write("Output", "[Optimizer] Code optimized.\n", False)
 
@@ -185,20 +204,29 @@ class QuantelIDE(ctk.CTk):
                 self.output_panel.write("AST", render_ast_tree(ast_tree))
 
                 # --- INTEGRATED TAC VIEWING ---
-                self.tac_panel.generate_and_show(ast_tree)
+                with tracer.span("tac"):
+                    self.tac_panel.generate_and_show(ast_tree)
 
                 # --- INTERPRETER ---
                 if QuantelInterpreter:
                     self.output_panel.write("Output", "--- Running Program ---\n", False)
-                    self.interpreter_instance = QuantelInterpreter()
-                    f = io.StringIO()
+                    probes = ProbeStream()
+                    self.output_panel.attach_probe_stream(probes)
+                    self.memory_tracker = MemoryTracker()
+                    self.interpreter_instance = QuantelInterpreter(tracer=tracer, probes=probes,
+                                                                   memory=self.memory_tracker)
+                    output = self.output_panel.program_output()
                     try:
-                        with contextlib.redirect_stdout(f):
+                        with contextlib.redirect_stdout(output), tracer.span("execute"):
                             self.interpreter_instance.interpret(ast_tree)
-                        self.output_panel.write("Output", f.getvalue() + "\n[Finished]", False)
-                        self.memory_panel.update_map(self.interpreter_instance.global_env)
+                        output.flush()
+                        self.output_panel.flush_probes()
+                        self.output_panel.write("Output", "\n[Finished]", False)
+                        self.memory_panel.update_map(self.interpreter_instance.global_env, self.memory_tracker)
                     except Exception as e:
                         self.output_panel.show_error("Runtime Error", [str(e)])
+                    finally:
+                        probes.close()
 
         except Exception as e:
             self.output_panel.show_error("System Error", [str(e)])
@@ -227,6 +255,7 @@ class QuantelIDE(ctk.CTk):
         run_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Run", menu=run_menu)
         run_menu.add_command(label="Run Program", command=self.run_quantel_code, accelerator="F5")
+        run_menu.add_command(label="Export Trace...", command=self._export_trace)
 
         view_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="View", menu=view_menu)
@@ -288,6 +317,15 @@ class QuantelIDE(ctk.CTk):
             except Exception as e:
                 self.output_panel.show_error("File Error", [f"Could not save file: {e}"])
 
+    def _export_trace(self):
+        filepath = filedialog.asksaveasfilename(defaultextension=".json",
+                                                filetypes=[("Chrome Trace", "*.json"), ("All Files", "*.*")])
+        if filepath:
+            try:
+                self.tracer.export(filepath)
+            except Exception as e:
+                self.output_panel.show_error("File Error", [f"Could not write trace: {e}"])
+
     def _toggle_memory(self):
         if self.show_memory:
             self.memory_panel.grid_forget()
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 import tkinter as tk
 from tabulate import tabulate
+from engine.memory import format_bytes
 
 class MemoryMapPanel(ctk.CTkFrame):
     def __init__(self, parent, **kwargs):
@@ -18,9 +19,10 @@ class MemoryMapPanel(ctk.CTkFrame):
         self.text_area = ctk.CTkTextbox(self, state="disabled", font=("Courier New", 12), wrap="none")
         self.text_area.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
 
-    def update_map(self, environment):
+    def update_map(self, environment, memory=None):
         """
         Takes the Interpreter's global_env dictionary and formats it using tabulate.
+        When a MemoryTracker is given, per-variable sizes and heap totals are added.
         """
         self._clear()
 
@@ -29,6 +31,7 @@ class MemoryMapPanel(ctk.CTkFrame):
             return
 
         # 1. Prepare data rows for tabulate
+        sizes = memory.variable_bytes('global') if memory else {}
         table_data = []
         for name, val in environment.items():
             # Get Address
@@ -45,17 +48,26 @@ class MemoryMapPanel(ctk.CTkFrame):
             if len(val_str) > 50:
                 val_str = val_str[:47] + "..."
 
-            table_data.append([mem_addr, name, val_type, val_str])
+            row = [mem_addr, name, val_type, val_str]
+            if memory:
+                row.insert(3, format_bytes(sizes.get(name, 0)))
+            table_data.append(row)
 
         # 2. Generate the table using tabulate
         # 'github' format creates clean separators that look good in a terminal/textbox
+        headers = ["ADDRESS", "NAME", "TYPE", "SIZE", "VALUE"] if memory else ["ADDRESS", "NAME", "TYPE", "VALUE"]
         formatted_table = tabulate(
             table_data,
-            headers=["ADDRESS", "NAME", "TYPE", "VALUE"],
+            headers=headers,
             tablefmt="github",
             stralign="left"
         )
 
+        if memory:
+            report = memory.report()
+            formatted_table += (f"\n\nLive: {format_bytes(report['current'])}"
+                                f" | Peak: {format_bytes(report['peak'])} (Line {report['peak_line']})")
+
         self._write(formatted_table)
 
     def _write(self, content):
@@ -1,13 +1,17 @@
 import customtkinter as ctk
+import io
 import tkinter as tk
 from tabulate import tabulate
 import re
+from collections import deque
 
 class OutputPanel(ctk.CTkFrame):
     def __init__(self, parent, on_line_click=None, **kwargs):
         # Remove custom arg before passing to CTkFrame to avoid ValueError
         super().__init__(parent, **kwargs)
         self.on_line_click = on_line_click
+        self.probe_stream = None
+        self.probe_events = deque(maxlen=1000)  # Recent events, kept for on-demand full formatting
 
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -30,6 +34,8 @@ class OutputPanel(ctk.CTkFrame):
 
             if name == "Lexer":
                 tb.bind("<Button-1>", self._handle_click)
+            if name == "Debug":
+                tb.bind("<Button-1>", self._handle_probe_click)
 
         self.tabs["Lexer"].configure(text_color="#A9B7C6")
         self.tabs["Symbols"].configure(text_color="#58D68D")
@@ -44,6 +50,46 @@ class OutputPanel(ctk.CTkFrame):
         if match:
             self.on_line_click(int(match.group(1)))
 
+    def _handle_probe_click(self, event):
+        widget = event.widget
+        click_pos = widget.index(f"@{event.x},{event.y}")
+        line_content = widget.get(f"{click_pos} linestart", f"{click_pos} lineend")
+        match = re.match(r"#(\d+) ", line_content)
+        if not match: return
+        seq = int(match.group(1))
+        for probe in self.probe_events:
+            if probe.seq == seq:
+                self.write("Debug", probe.format(full=True), clear_first=False)
+                return
+
+    # -------------------------------------------------------------------------
+    # PROBE STREAM
+    # -------------------------------------------------------------------------
+
+    def attach_probe_stream(self, stream):
+        """Starts polling a ProbeStream; events are rendered in batches on the Tk thread."""
+        self.probe_stream = stream
+        self.probe_events.clear()
+        self.after(50, self._poll_probes, stream)
+
+    def _poll_probes(self, stream):
+        if stream is not self.probe_stream: return
+        self.flush_probes(max_items=200)
+        if not stream.closed:
+            self.after(50, self._poll_probes, stream)
+
+    def flush_probes(self, max_items=None):
+        if not self.probe_stream: return
+        events = self.probe_stream.drain(max_items)
+        if not events: return
+        self.probe_events.extend(events)
+        self.write("Output", "".join(e.format() for e in events), False)
+        self.write("Debug", "\n".join(e.summary() for e in events), False)
+
+    def program_output(self):
+        """File-like stdout for a running program; its text and the probes stay in program order."""
+        return _ProgramOutput(self)
+
     def write(self, tab_name, content, clear_first=True):
         if tab_name not in self.tabs: return
         widget = self.tabs[tab_name]
@@ -52,6 +98,14 @@ class OutputPanel(ctk.CTkFrame):
         widget.insert(tk.END, content + "\n")
         widget.configure(state="disabled")
 
+    def append(self, tab_name, content):
+        """Adds text as is, without the newline write() ends with."""
+        if tab_name not in self.tabs: return
+        widget = self.tabs[tab_name]
+        widget.configure(state="normal")
+        widget.insert(tk.END, content)
+        widget.configure(state="disabled")
+
     def write_table(self, tab_name, data, headers):
         if tab_name not in self.tabs: return
         table_output = tabulate(data, headers=headers, tablefmt="github", stralign="left")
@@ -62,11 +116,13 @@ class OutputPanel(ctk.CTkFrame):
         self.write_table("Lexer", rows, headers=["TOKEN TYPE", "VALUE", "LINE"])
 
     def update_symbols_tab(self, analyzer):
+        # Every declaration, shadowed ones included, with the scope it belongs to
         rows = []
-        if hasattr(analyzer, 'history'):
-            for name, sym in analyzer.history.items():
-                rows.append([name, getattr(sym, 'symbol_type', 'unknown'), getattr(sym, 'category', 'var')])
-        self.write_table("Symbols", rows, headers=["NAME", "TYPE", "CATEGORY"])
+        for decl in analyzer.symbols.declarations.values():
+            sym = decl.symbol
+            rows.append([decl.name, getattr(sym, 'symbol_type', 'unknown'), getattr(sym, 'category', 'var'),
+                         decl.scope.path, f"L{decl.lineno}" if decl.lineno else ""])
+        self.write_table("Symbols", rows, headers=["NAME", "TYPE", "CATEGORY", "SCOPE", "LINE"])
 
     def clear_all(self):
         for name in self.tabs: self.write(name, "", clear_first=True)
@@ -76,4 +132,28 @@ class OutputPanel(ctk.CTkFrame):
     def show_error(self, title, error_list):
         content = f"--- {title} ---\n" + "\n".join([str(e) for e in error_list])
         self.write("Errors", content)
-        self.select_tab("Errors")
\ No newline at end of file
+        self.select_tab("Errors")
+
+
+class _ProgramOutput(io.TextIOBase):
+    """Buffers printed text, rendering it into the Output tab whenever probes are waiting to go after it."""
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.pending = []
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        stream = self.panel.probe_stream
+        if stream is not None and len(stream):
+            self.flush()
+            self.panel.flush_probes()
+        self.pending.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.panel.append("Output", "".join(self.pending))
+            self.pending.clear()
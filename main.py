@@ -1,5 +1,6 @@
 import sys
 import argparse
+import contextlib
 import json
 import os
 
@@ -10,9 +11,14 @@ import engine.ast as ast
 
 # NEW: Import the modules
 from engine.semantic_analyzer import SemanticAnalyzer
-from engine.optimizer import QuantelOptimizer
+from engine.optimizer import QuantelOptimizer, PASSES, DEFAULT_OPT_LEVEL
 from engine.tac_generator import TACGenerator
 from engine.interpreter import QuantelInterpreter
+from engine.jit import JIT_THRESHOLD
+from engine.tracer import QuantelTracer, trace_span
+from engine.probe import ProbeStream
+from engine.memory import MemoryTracker, format_bytes
+from engine import batch, bytecode
 
 # --- GUI Import ---
 try:
@@ -29,13 +35,30 @@ def run_cli():
     parser = argparse.ArgumentParser(description="Quantel Language Tool (CLI)")
 
     # Arguments
-    parser.add_argument("file", nargs="?", help="Path to the .qtl file")
+    parser.add_argument("file", nargs="?", help="Path to the .qtl file, or 'repl' for an interactive session")
     parser.add_argument("-s", "--string", help="Process a raw code string directly")
     parser.add_argument("-g", "--gui", action="store_true", help="Launch the Quantel IDE")
     parser.add_argument("-p", "--parse", action="store_true", help="Parse and print AST (JSON)")
     parser.add_argument("-l", "--lex", action="store_true", help="Tokenize and print tokens")
     parser.add_argument("--lex-out", action="store_true", help="Output lexed tokens to output.txt")
     parser.add_argument("-t", "--tac", action="store_true", help="Show Optimized Three-Address Code")
+    parser.add_argument("--tac-out", metavar="OUT_BIN", help="Write the optimized Three-Address Code in binary form")
+    parser.add_argument("-O", dest="opt_level", type=int, choices=range(4), default=DEFAULT_OPT_LEVEL,
+                        metavar="LEVEL", help=f"Optimization level 0-3 (default: {DEFAULT_OPT_LEVEL})")
+    parser.add_argument("--passes", metavar="P1,P2,...",
+                        help=f"Run exactly these optimization passes (and their dependencies) "
+                             f"instead of a level: {', '.join(PASSES)}")
+    parser.add_argument("--trace", metavar="OUT_JSON", help="Write a Chrome trace of compiler phases and calls")
+    parser.add_argument("--mem-stats", action="store_true", help="Print heap usage statistics after execution")
+    parser.add_argument("--mem-budget", type=float, metavar="MB", help="Abort execution when live memory exceeds MB")
+    parser.add_argument("--batch", metavar="INPUTS_JSONL",
+                        help="Compile once, then run once per line of global bindings on a process pool")
+    parser.add_argument("--batch-out", metavar="OUT_JSONL", help="Write batch results here instead of stdout")
+    parser.add_argument("--workers", type=int, help="Worker processes for --batch (default: CPU count)")
+    parser.add_argument("--no-jit", action="store_true",
+                        help=f"Interpret every call instead of compiling functions called {JIT_THRESHOLD}+ times")
+    parser.add_argument("--compile", metavar="OUT_QTLB",
+                        help="Write the optimized program as bytecode instead of running it")
 
     args = parser.parse_args()
 
@@ -48,6 +71,12 @@ def run_cli():
             print(f"Error: Could not launch GUI.\nDetails: {GUI_ERROR}")
         return
 
+    # --- Interactive Session ---
+    if args.file == "repl":
+        from engine.repl import run_repl
+        run_repl()
+        return
+
     # --- Input Preparation ---
     code_input = ""
     source_name = "Input String"
@@ -58,6 +87,9 @@ def run_cli():
         if not os.path.exists(args.file):
             print(f"Error: File '{args.file}' not found.")
             return
+        if bytecode.is_bytecode(args.file):
+            _run_bytecode(args)
+            return
         source_name = args.file
         with open(args.file, 'r') as f:
             code_input = f.read()
@@ -65,14 +97,24 @@ def run_cli():
         parser.print_help()
         return
 
+    # Batch results are JSONL on stdout, so banners and diagnostics go to stderr
+    records = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr) if args.batch else contextlib.nullcontext():
+        _run_source(args, code_input, source_name, records)
+
+
+def _run_source(args, code_input, source_name, records):
     # =========================================================================
     #  COMPILATION PIPELINE
     # =========================================================================
 
+    tracer = QuantelTracer() if args.trace else None
+
     # --- 1. LEXING ---
     lexer = QuantelLexer(print_errors=args.lex_out)
     # We convert tokens to a list so we can check for errors before passing to parser
-    tokens = list(lexer.tokenize(code_input))
+    with trace_span(tracer, "lex"):
+        tokens = list(lexer.tokenize(code_input))
     lexer_errors = lexer.get_errors() if hasattr(lexer, 'get_errors') else []
 
     if args.lex:
@@ -95,15 +137,18 @@ def run_cli():
     # --- 2. PARSING ---
     print(f"\n--- Processing: {source_name} ---")
     quantel_parser = QuantelParser()
-    tree = quantel_parser.parse(iter(tokens))
+    with trace_span(tracer, "parse"):
+        tree = quantel_parser.parse(iter(tokens))
     parser_errors = quantel_parser.errors
 
     # --- 3. SEMANTIC ANALYSIS ---
     semantic_errors = []
+    analyzer = None
     if tree:
         analyzer = SemanticAnalyzer()
         # Ensure analyze() is calling the visit methods correctly
-        semantic_errors = analyzer.analyze(tree)
+        with trace_span(tracer, "semantic"):
+            semantic_errors = analyzer.analyze(tree)
 
     # =========================================================================
     #  GLOBAL ERROR SUMMARY
@@ -129,6 +174,7 @@ def run_cli():
 
         print("\n" + "!" * 60)
         print("Execution halted due to errors.")
+        _export_trace(tracer, args.trace)
         sys.exit(1)
 
     # =========================================================================
@@ -137,26 +183,163 @@ def run_cli():
 
     print("--- Analysis Successful (0 Errors) ---")
 
+    batch_inputs = None
+    if args.batch:
+        try:
+            batch_inputs = batch.read_inputs(args.batch)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read batch inputs.\nDetails: {e}")
+            sys.exit(1)
+
     # --- 4. OPTIMIZATION ---
-    print("\n--- Optimizing AST ---")
-    optimizer = QuantelOptimizer()
-    optimized_tree = optimizer.optimize(tree)
+    # Globals bound per batch run must not be constant-propagated from their initializers
+    external = batch.bound_names(batch_inputs) if batch_inputs else ()
+    passes = [p.strip() for p in args.passes.split(",") if p.strip()] if args.passes is not None else None
+    try:
+        # Batch results report every global; a plain run can release globals it no longer reads
+        optimizer = QuantelOptimizer(tracer=tracer, external=external, level=args.opt_level, passes=passes,
+                                     analyzer=analyzer, exit_live=None if batch_inputs is not None else ())
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"\n--- Optimizing AST (-O{args.opt_level}: {', '.join(optimizer.passes) or 'no passes'}) ---")
+    with trace_span(tracer, "optimize"):
+        optimized_tree = optimizer.optimize(tree)
+    for stat in optimizer.pass_stats:
+        extra = "  ".join(f"{k}={v}" for k, v in stat.items() if k not in ('pass', 'ms', 'visited', 'rewrites'))
+        print(f"  {stat['pass']:<12} {stat['ms']:>9.3f} ms  {stat['visited']:>7} visited  "
+              f"{stat['rewrites']:>6} rewrites  {extra}".rstrip())
 
     # --- 5. TAC GENERATION ---
-    if args.tac:
-        print("\n--- Three-Address Code (Optimized) ---")
+    if args.tac or args.tac_out:
         tac_gen = TACGenerator()
-        print(tac_gen.generate(optimized_tree))
+        with trace_span(tracer, "tac"):
+            tac_program = tac_gen.generate(optimized_tree)
+        if args.tac:
+            print("\n--- Three-Address Code (Optimized) ---")
+            print(tac_program)
+            print(f"  ({len(tac_program)} instructions, {tac_program.temps} temporaries in "
+                  f"{tac_program.registers} registers)")
+        if args.tac_out:
+            with open(args.tac_out, "wb") as f:
+                f.write(tac_program.to_bytes())
+            print(f"TAC written to {args.tac_out}")
+
+    if args.compile:
+        with trace_span(tracer, "compile"):
+            bytecode.save(optimized_tree, args.compile)
+        print(f"Bytecode written to {args.compile} ({os.path.getsize(args.compile)} bytes)")
+        _export_trace(tracer, args.trace)
+        return
+
+    if batch_inputs is not None:
+        _run_batch_mode(args, optimized_tree, batch_inputs, tracer, records)
+        return
+
+    _execute(args, optimized_tree, tracer)
+
+
+def _run_bytecode(args):
+    # Compiled programs were analyzed and optimized already; only execution is left
+    if args.batch:
+        print("Error: --batch needs the source program; globals may have been folded into the bytecode.")
+        sys.exit(1)
+    print(f"\n--- Loading: {args.file} ---")
+    tracer = QuantelTracer() if args.trace else None
+    try:
+        with trace_span(tracer, "load"):
+            tree, loader = bytecode.load(args.file)
+    except bytecode.BytecodeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    _execute(args, tree, tracer)
+    # A loader diagnostic: stdout stays the same as running the source
+    print(f"  ({len(loader.decoded)} of {loader.func_count} functions decoded)", file=sys.stderr)
 
+
+def _execute(args, optimized_tree, tracer):
     # --- 6. EXECUTION ---
     print("\n--- Executing Program ---")
-    interpreter = QuantelInterpreter()
+    # Probes are formatted on a consumer thread so the interpreter never blocks on output
+    probes = ProbeStream()
+    printer = probes.start_printer()
+    memory = None
+    if args.mem_stats or args.mem_budget:
+        budget = int(args.mem_budget * 1024 * 1024) if args.mem_budget else None
+        memory = MemoryTracker(budget=budget)
+    interpreter = QuantelInterpreter(tracer=tracer, probes=probes, memory=memory,
+                                     jit_threshold=None if args.no_jit else JIT_THRESHOLD)
     try:
-        interpreter.interpret(optimized_tree)
-        print("\n[Program Finished Successfully]")
+        with trace_span(tracer, "execute"):
+            interpreter.interpret(optimized_tree)
+        error = None
     except Exception as e:
-        print(f"\nRuntime Error: {e}")
+        error = e
+    finally:
+        probes.close()
+        printer.join()
+
+    if error is None:
+        print("\n[Program Finished Successfully]")
+    else:
+        print(f"\nRuntime Error: {error}")
+
+    if args.mem_stats:
+        _print_mem_stats(memory)
+
+    _export_trace(tracer, args.trace)
+
+
+def _run_batch_mode(args, tree, inputs, tracer, records):
+    print(f"\n--- Batch: {len(inputs)} runs ---")
+    out = open(args.batch_out, "w") if args.batch_out else records
+    try:
+        with trace_span(tracer, "batch", runs=len(inputs)):
+            stats = batch.run_batch(tree, inputs, out, workers=args.workers)
+    finally:
+        if out is not records:
+            out.close()
+
+    latency = stats["latency_ms"]
+    print(f"\n[Batch Finished] {stats['runs']} runs, {stats['failures']} failed, "
+          f"{stats['workers']} workers, {stats['wall_s']}s wall")
+    print(f"  Throughput: {stats['throughput_per_s']} runs/s")
+    print(f"  Latency ms: mean {latency['mean']} | p50 {latency['p50']} | "
+          f"p95 {latency['p95']} | max {latency['max']}")
+    _export_trace(tracer, args.trace)
+
+
+def _print_mem_stats(memory):
+    report = memory.report()
+    print("\n--- Memory Statistics ---")
+    print(f"  Live heap:  {format_bytes(report['current'])}")
+    print(f"  Peak heap:  {format_bytes(report['peak'])} (Line {report['peak_line']})")
+    if report['budget'] is not None:
+        print(f"  Budget:     {format_bytes(report['budget'])}")
+
+    variables = memory.variable_bytes('global')
+    if variables:
+        print("\n  [ Globals ]")
+        for name, size in sorted(variables.items(), key=lambda kv: -kv[1]):
+            print(f"    {name:<24} {format_bytes(size):>10}")
+
+    if report['line_allocs']:
+        print("\n  [ Allocations per Line ]")
+        for lineno, (count, size) in report['line_allocs'].items():
+            print(f"    L{lineno:<6} {count:>8} allocs {format_bytes(size):>10}")
+
+
+def _export_trace(tracer, path):
+    if tracer is None:
+        return
+    tracer.export(path)
+    print(f"Trace written to {path} ({len(tracer.events)} events, {tracer.dropped} dropped)")
 
 
 if __name__ == "__main__":
-    run_cli()
\ No newline at end of file
+    try:
+        run_cli()
+    except BrokenPipeError:
+        # The reader closed stdout (e.g. '| head'); point it at devnull so the exit-time flush stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
\ No newline at end of file